@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+事件循环延迟基准：阻塞操作在事件循环中执行 vs 放到线程池
+
+在事件循环中运行 LoopLagMonitor，依次执行 API 中典型的阻塞操作：
+- 停止一个忽略 SIGTERM 的任务（等待 5 秒后 SIGKILL）
+- 读取并折叠一个大日志文件的最后 500 行
+
+inline 模式直接在事件循环中调用（改造前的 API 行为），
+pool 模式通过 run_blocking() 交给线程池，比较两种模式下的最大延迟和卡顿时长。
+
+用法:
+    python benchmarks/bench_loop_lag.py --log-mb 200
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from multitaskflow.web.manager import TaskManager
+from multitaskflow.web.blocking import run_blocking
+from multitaskflow.web.loopmon import LoopLagMonitor
+from multitaskflow.web.logstore import iter_log_text
+from multitaskflow.web.termlog import collapse_tail
+
+
+# shell 和子进程都忽略 SIGTERM，停止时需等待 5 秒超时后 SIGKILL
+STUBBORN_TASK = "trap '' TERM; sleep 60"
+
+
+def make_log(path: Path, size_mb: int):
+    line = "epoch 1 | step {:>8} | loss 0.1234 | " + "x" * 60
+    chunk = []
+    written = 0
+    step = 0
+    with open(path, "w") as f:
+        while written < size_mb * 1024 * 1024:
+            chunk.append(line.format(step) + ("\r" if step % 10 else "\n"))
+            step += 1
+            if len(chunk) >= 10000:
+                text = "".join(chunk)
+                f.write(text)
+                written += len(text)
+                chunk = []
+
+
+async def run_mode(mode: str, workdir: Path, log_path: Path):
+    config = workdir / f"{mode}.yaml"
+    config.write_text("tasks: []\n")
+    manager = TaskManager(str(config), history_file=str(workdir / f"{mode}_history.json"))
+    task = manager.add_task("stubborn", STUBBORN_TASK)
+    manager.run_task(task.id)
+    time.sleep(0.5)  # 等待子进程设置信号处理
+
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.2)
+
+    async def call(func, *args):
+        if mode == "inline":
+            return func(*args)
+        return await run_blocking(func, *args)
+
+    start = time.perf_counter()
+    await call(manager.stop_task, task.id)
+    stop_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await call(lambda: collapse_tail(iter_log_text(str(log_path)), 500))
+    read_elapsed = time.perf_counter() - start
+
+    await asyncio.sleep(0.1)
+    await monitor.stop()
+    stats = monitor.stats()
+    print(f"{mode:>6}: stop {stop_elapsed:5.2f}s, read log {read_elapsed:5.2f}s | "
+          f"loop lag max {stats['max_ms']:8.1f} ms, p99 {stats['p99_ms']:8.1f} ms, "
+          f"stalls {stats['stalls']:3d} ({stats['stalled_seconds']:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="事件循环延迟基准")
+    parser.add_argument("--log-mb", type=int, default=100, help="日志文件大小（MB）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        log_path = workdir / "big.log"
+        make_log(log_path, args.log_mb)
+        for mode in ("inline", "pool"):
+            asyncio.run(run_mode(mode, workdir, log_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+进度条折叠微基准
+
+生成一个 tqdm 风格的日志（默认 1 GB），分别测量：
+- ProgressBarCollapser 按块流式折叠的吞吐和内存
+- 旧实现（split('\\n') + split('\\r')，对整块处理）的吞吐（--legacy）
+并在日志前缀上用随机块大小验证输出与切分方式无关。
+
+用法:
+    python benchmarks/bench_progress_collapse.py --size-mb 1024
+    python benchmarks/bench_progress_collapse.py --file /tmp/tqdm.log --legacy
+"""
+
+import os
+import sys
+import time
+import random
+import resource
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from multitaskflow.web.termlog import ProgressBarCollapser, collapse_progress
+
+
+def legacy_clean(content: str) -> str:
+    """旧版 ws.clean_progress_bar_output 实现（对照用）"""
+    if '\r' not in content:
+        return content
+    result = []
+    for line in content.split('\n'):
+        if '\r' not in line:
+            result.append(line)
+        else:
+            last_non_empty = ''
+            for part in reversed(line.split('\r')):
+                if part.strip():
+                    last_non_empty = part
+                    break
+            if last_non_empty:
+                result.append(last_non_empty)
+    return '\n'.join(result)
+
+
+def generate_log(path: Path, size_mb: int):
+    """生成 tqdm 风格日志：每个 epoch 若干普通行 + 上千个 \\r 帧"""
+    target = size_mb * 1024 * 1024
+    written = 0
+    epoch = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        while written < target:
+            epoch += 1
+            parts = [f"Epoch {epoch}: loading data, lr=1e-4\n"]
+            total = 1000
+            for step in range(0, total + 1, 2):
+                pct = step * 100 // total
+                bar = '█' * (pct // 4) + ' ' * (25 - pct // 4)
+                parts.append(f"\r\x1b[32m{pct:3d}%\x1b[0m|{bar}| {step}/{total} [00:{step % 60:02d}<00:30, 33.3it/s, loss=0.{step:04d}]")
+            parts.append(f"\nEpoch {epoch} done: val_acc=0.9{epoch % 10}\n")
+            block = ''.join(parts)
+            f.write(block)
+            written += len(block.encode('utf-8'))
+
+
+def iter_chunks(path: Path, chunk_size: int):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def bench_streaming(path: Path, chunk_size: int):
+    collapser = ProgressBarCollapser()
+    out_chars = 0
+    start = time.perf_counter()
+    for chunk in iter_chunks(path, chunk_size):
+        out_chars += len(collapser.feed(chunk))
+    out_chars += len(collapser.flush())
+    return time.perf_counter() - start, out_chars
+
+
+def bench_legacy(path: Path, chunk_size: int):
+    out_chars = 0
+    start = time.perf_counter()
+    for chunk in iter_chunks(path, chunk_size):
+        out_chars += len(legacy_clean(chunk))
+    return time.perf_counter() - start, out_chars
+
+
+def check_chunk_invariance(path: Path, prefix_chars: int, rounds: int):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        text = f.read(prefix_chars)
+    expected = collapse_progress(text)
+    rng = random.Random(0)
+    for _ in range(rounds):
+        collapser = ProgressBarCollapser()
+        out = []
+        pos = 0
+        while pos < len(text):
+            step = rng.randint(1, 4096)
+            out.append(collapser.feed(text[pos:pos + step]))
+            pos += step
+        out.append(collapser.flush())
+        if ''.join(out) != expected:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="进度条折叠微基准")
+    parser.add_argument("--file", help="日志文件路径（不存在时生成）")
+    parser.add_argument("--size-mb", type=int, default=1024, help="生成日志的大小 (MB)")
+    parser.add_argument("--chunk-kb", type=int, default=1024, help="读取块大小 (KB)")
+    parser.add_argument("--legacy", action="store_true", help="同时测量旧实现")
+    parser.add_argument("--keep", action="store_true", help="保留生成的日志文件")
+    args = parser.parse_args()
+
+    if args.file:
+        path = Path(args.file)
+    else:
+        path = Path(tempfile.gettempdir()) / f"mtf_bench_tqdm_{args.size_mb}mb.log"
+
+    if not path.exists():
+        print(f"生成日志: {path} ({args.size_mb} MB)...")
+        t0 = time.perf_counter()
+        generate_log(path, args.size_mb)
+        print(f"  生成耗时 {time.perf_counter() - t0:.1f}s")
+
+    size = path.stat().st_size
+    size_mb = size / 1024 / 1024
+    chunk_size = args.chunk_kb * 1024
+
+    ok = check_chunk_invariance(path, 4 * 1024 * 1024, 5)
+    print(f"块边界无关性校验（前 4 MB，5 种随机切分）: {'通过' if ok else '失败'}")
+
+    elapsed, out_chars = bench_streaming(path, chunk_size)
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"ProgressBarCollapser: {size_mb:.0f} MB in {elapsed:.2f}s = {size_mb / elapsed:.0f} MB/s, "
+          f"输出 {out_chars / 1024 / 1024:.1f} M 字符, 峰值 RSS {rss_mb:.0f} MB")
+
+    if args.legacy:
+        elapsed, out_chars = bench_legacy(path, chunk_size)
+        print(f"legacy (逐块 split): {size_mb:.0f} MB in {elapsed:.2f}s = {size_mb / elapsed:.0f} MB/s, "
+              f"输出 {out_chars / 1024 / 1024:.1f} M 字符（块边界处的帧会重复输出）")
+
+    if not args.file and not args.keep:
+        os.remove(path)
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
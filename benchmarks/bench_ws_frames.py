@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+WebSocket 日志帧吞吐基准
+
+模拟一个高频输出的任务和大量查看者（部分为慢速客户端），
+测量 LogFrameSender 的合并效果、背压下的队列峰值和跳过行数。
+
+用法:
+    python benchmarks/bench_ws_frames.py --viewers 200 --slow 50 --seconds 5
+"""
+
+import sys
+import time
+import json
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from multitaskflow.web.ws import LogFrameSender, CLEAR_LINE
+
+
+class FakeWebSocket:
+    """模拟客户端：每次发送耗时 latency 秒"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.frames = 0
+        self.bytes = 0
+
+    async def send_json(self, data):
+        payload = json.dumps(data)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        else:
+            await asyncio.sleep(0)
+        self.frames += 1
+        self.bytes += len(payload)
+
+
+async def run(viewers: int, slow: int, seconds: float, lines_per_tick: int, tick: float,
+              fast_latency: float, slow_latency: float):
+    sockets = []
+    senders = []
+    for i in range(viewers):
+        ws = FakeWebSocket(slow_latency if i < slow else fast_latency)
+        sender = LogFrameSender(ws)
+        sender.start()
+        sockets.append(ws)
+        senders.append(sender)
+
+    line = "epoch 1 | step {:>8} | loss 0.1234 | lr 1e-4 | " + "x" * 60 + "\n"
+    pushed_lines = 0
+    push_time = 0.0
+    step = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        chunk = ''.join(line.format(step + i) for i in range(lines_per_tick))
+        frame = f"{CLEAR_LINE}progress {step}/1000000 |{'#' * (step % 50):<50}|"
+        step += lines_per_tick
+        t0 = time.perf_counter()
+        for sender in senders:
+            sender.push_log(chunk)
+            sender.push_log(frame, progress=True)
+        push_time += time.perf_counter() - t0
+        pushed_lines += lines_per_tick
+        await asyncio.sleep(tick)
+
+    produce_elapsed = time.perf_counter() - start
+    await asyncio.gather(*(s.close(timeout=30) for s in senders))
+    total_elapsed = time.perf_counter() - start
+
+    def summarize(group):
+        frames = sum(sockets[i].frames for i in group)
+        sent = sum(sockets[i].bytes for i in group)
+        skipped = sum(senders[i].lines_skipped for i in group)
+        peak = max(senders[i].max_queued_chars for i in group)
+        n = len(group)
+        return (f"frames/viewer={frames / n:8.1f}  KB/viewer={sent / n / 1024:9.1f}  "
+                f"skipped lines/viewer={skipped / n:9.1f}  peak queue={peak / 1024:8.1f} KB")
+
+    print(f"viewers={viewers} (slow={slow})  duration={produce_elapsed:.2f}s  drain={total_elapsed - produce_elapsed:.2f}s")
+    print(f"produced lines={pushed_lines}  ({pushed_lines / produce_elapsed:,.0f} lines/s per viewer)")
+    print(f"producer push cost={push_time * 1e6 / max(pushed_lines // lines_per_tick * viewers, 1):.1f} us/push  "
+          f"total={push_time:.3f}s")
+    if slow < viewers:
+        print("fast: " + summarize(range(slow, viewers)))
+    if slow:
+        print("slow: " + summarize(range(0, slow)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket 日志帧吞吐基准")
+    parser.add_argument("--viewers", type=int, default=200, help="模拟查看者数量")
+    parser.add_argument("--slow", type=int, default=50, help="其中慢速客户端数量")
+    parser.add_argument("--seconds", type=float, default=5.0, help="生产持续时间")
+    parser.add_argument("--lines-per-tick", type=int, default=50, help="每次产生的日志行数")
+    parser.add_argument("--tick", type=float, default=0.01, help="生产间隔（秒）")
+    parser.add_argument("--fast-latency", type=float, default=0.0, help="快速客户端单帧耗时")
+    parser.add_argument("--slow-latency", type=float, default=0.5, help="慢速客户端单帧耗时")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.viewers, args.slow, args.seconds, args.lines_per_tick, args.tick,
+                    args.fast_latency, args.slow_latency))
+
+
+if __name__ == "__main__":
+    main()
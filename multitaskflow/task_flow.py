@@ -963,6 +963,11 @@ def main():
             # 启动 Web UI
             run_web_server(sys.argv[2:])
             sys.exit(0)
+        
+        # 检查是否是 simulate 子命令
+        if sys.argv[1] == 'simulate':
+            run_simulation(sys.argv[2:])
+            sys.exit(0)
             
         # 有参数但不是帮助参数，视为配置文件路径
         config_path = sys.argv[1]
@@ -1007,6 +1012,9 @@ def run_web_server(args: list):
     parser.add_argument('--host', default='0.0.0.0', help='服务器地址 (默认: 0.0.0.0)')
     parser.add_argument('--port', '-p', type=int, default=8080, help='服务器端口 (默认: 8080)')
     parser.add_argument('--reload', '-r', action='store_true', help='启用热重载（开发模式）')
+    parser.add_argument('--profiling', action='store_true', help='启用性能分析接口（CPU 采样、内存分配跟踪）')
+    parser.add_argument('--stall-threshold', type=float,
+                        help='事件循环阻塞超过该毫秒数时在日志中记录阻塞位置的调用栈 (默认: 100)')
     
     parsed = parser.parse_args(args)
     
@@ -1034,15 +1042,127 @@ def run_web_server(args: list):
         workspace_dir=workspace,
         host=parsed.host,
         port=parsed.port,
-        reload=parsed.reload
+        reload=parsed.reload,
+        profiling=parsed.profiling,
+        stall_threshold=parsed.stall_threshold / 1000 if parsed.stall_threshold else None
     )
 
+def run_simulation(args: list):
+    """
+    模拟 YAML 中的任务在不同调度策略下的执行（不实际运行任务）
+    
+    任务时长按同目录 logs/ 下执行历史中的中位时长估计。
+    
+    Args:
+        args: 命令行参数列表
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog='taskflow simulate',
+        description='模拟任务队列在不同调度策略下的完成时间和 GPU 利用率'
+    )
+    parser.add_argument('config', help='任务配置文件路径')
+    parser.add_argument('--gpus', '-g', type=int, help='GPU 总数（默认按任务用到的最大编号推断）')
+    parser.add_argument('--policy', '-p', default='all',
+                        help='调度策略，逗号分隔：serial,fifo,priority,sjf,packing,backfill（默认全部）')
+    parser.add_argument('--concurrency', '-c', type=int, help='最大并发任务数（默认只受 GPU 限制）')
+    parser.add_argument('--gpu-mode', choices=['pinned', 'count'], default='pinned',
+                        help='pinned: 使用命令指定的 GPU；count: 只看 GPU 数量（默认: pinned）')
+    parser.add_argument('--default-duration', type=float, default=3600,
+                        help='没有历史记录时的任务时长，秒（默认: 3600）')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    
+    parsed = parser.parse_args(args)
+    
+    try:
+        from .web.simulator import POLICIES, DurationEstimator, build_tasks, compare
+        from .web.history import HistoryManager
+        from .web.manager import parse_gpu_from_command
+    except ImportError as e:
+        print("\033[1;31m错误：未安装 Web UI 依赖！\033[0m")
+        print("请运行以下命令安装：")
+        print("  pip install multitaskflow[web]")
+        print(f"\n详细错误: {e}")
+        sys.exit(1)
+    
+    config_path = Path(parsed.config)
+    if not config_path.exists():
+        print(f"\033[1;31m错误：配置文件 '{config_path}' 不存在！\033[0m")
+        sys.exit(1)
+    
+    policies = list(POLICIES) if parsed.policy == 'all' else [p.strip() for p in parsed.policy.split(',') if p.strip()]
+    invalid = [p for p in policies if p not in POLICIES]
+    if invalid:
+        print(f"\033[1;31m错误：不支持的调度策略: {', '.join(invalid)}\033[0m")
+        sys.exit(1)
+    
+    with open(config_path, 'r', encoding='utf-8') as f:
+        task_list = yaml.safe_load(f) or []
+    specs = [
+        {
+            "id": f"task_{index}",
+            "name": item['name'],
+            "command": item['command'],
+            "gpu": parse_gpu_from_command(item['command']),
+        }
+        for index, item in enumerate(task_list, 1)
+        if item.get('status', 'pending') == 'pending'
+    ]
+    
+    # 执行历史（与 Web UI 使用同一个数据库；没有历史时全部使用默认时长）
+    rows = []
+    logs_dir = config_path.parent / "logs"
+    history_db = logs_dir / f".history_{config_path.stem}.db"
+    legacy_history = logs_dir / ".history.json"
+    if history_db.exists() or legacy_history.exists():
+        history = HistoryManager(str(history_db), legacy_file=str(legacy_history))
+        rows = history.aggregates()
+        history.close()
+    
+    estimator = DurationEstimator(rows, parsed.default_duration)
+    tasks = build_tasks(specs, estimator)
+    used = [gpu for task in tasks for gpu in task.gpu]
+    gpu_count = parsed.gpus or (max(used) + 1 if used else 1)
+    
+    started = time.perf_counter()
+    try:
+        result = compare(tasks, gpu_count, policies, parsed.concurrency, parsed.gpu_mode)
+    except ValueError as e:
+        print(f"\033[1;31m错误：{e}\033[0m")
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+    
+    sources = {}
+    for task in tasks:
+        sources[task.source] = sources.get(task.source, 0) + 1
+    
+    if parsed.json:
+        result.update({"tasks": len(tasks), "gpus": gpu_count, "estimates": sources})
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    
+    def hours(seconds):
+        return f"{seconds / 3600:.2f}h"
+    
+    print(f"\n\033[1m任务数:\033[0m {len(tasks)}  \033[1mGPU:\033[0m {gpu_count}  "
+          f"\033[1m时长来源:\033[0m 按名称 {sources.get('name', 0)} / 按命令模板 {sources.get('template', 0)} / "
+          f"默认 {sources.get('default', 0)}")
+    print(f"\n{'策略':<10}{'完成时间':>12}{'GPU 利用率':>12}{'平均等待':>12}{'最大并发':>10}")
+    for policy, item in result['results'].items():
+        utilization = f"{item['utilization'] * 100:.1f}%" if item['utilization'] is not None else "-"
+        marker = "  ← 最短" if policy == result['best'] else ""
+        print(f"{policy:<10}{hours(item['makespan']):>12}{utilization:>12}"
+              f"{hours(item['mean_wait']):>12}{item['max_concurrency']:>10}{marker}")
+    print(f"\n模拟耗时 {elapsed * 1000:.0f} ms\n")
+
 def print_help_message():
     """打印帮助信息"""
     print("\n\033[1;36m=== MultiTaskFlow 使用帮助 ===\033[0m")
     print("\033[1m用法:\033[0m")
     print("  taskflow <配置文件路径>           # CLI 模式：顺序执行任务")
     print("  taskflow web [选项]               # Web 模式：启动可视化管理界面")
+    print("  taskflow simulate <配置文件> [选项] # 模拟不同调度策略的完成时间和 GPU 利用率")
     print("\n\033[1m参数:\033[0m")
     print("  <配置文件路径>  YAML格式的任务配置文件路径")
     print("  -h, --help     显示此帮助信息并退出")
@@ -1069,6 +1189,15 @@ def print_help_message():
     print("  # 指定工作空间目录")
     print("  taskflow web -w /path/to/workspace")
     
+    print("\n\033[1;33m=== 调度模拟 ===\033[0m")
+    print("\033[1m用法:\033[0m taskflow simulate <配置文件> [选项]")
+    print("  -g, --gpus N           GPU 总数（默认按任务用到的最大编号推断）")
+    print("  -p, --policy P         serial,fifo,priority,sjf,packing,backfill（默认全部）")
+    print("  -c, --concurrency N    最大并发任务数")
+    print("  --gpu-mode MODE        pinned（使用命令指定的 GPU）或 count（只看 GPU 数量）")
+    print("  --default-duration S   没有历史记录时的任务时长（秒，默认 3600）")
+    print("  --json                 以 JSON 输出结果")
+    
     print("\n\033[1;33m=== CLI 模式 ===\033[0m")
     print("\033[1m命令行使用示例:\033[0m")
     print("  # 使用配置文件启动任务流")
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+执行历史统计
+
+HistoryManager 在每次 add() 时按 (日期, 任务名, 命令模板, GPU, 状态) 增量更新聚合表：
+记录数、时长总和 / 最小 / 最大值，以及按对数分箱的时长直方图。
+查询时只合并聚合行（数量与天数 × 任务种类成正比），不再扫描全部历史记录。
+
+- 命令模板：去掉开头的环境变量赋值，数字参数替换为 <n>，
+  ``CUDA_VISIBLE_DEVICES=0 python train.py --lr 0.01`` → ``python train.py --lr <n>``
+- 时长分箱：每个二倍程 BINS_PER_OCTAVE 个箱，箱内线性插值，百分位数相对误差约 4%
+- 时间粒度为天（按结束时间的本地日期），可再按周 / 月分桶
+
+任务生命周期阶段（Task.phases，Unix 时间戳）按同样的方式聚合为各延迟区间的分布（LATENCY_SEGMENTS）。
+"""
+
+import re
+import math
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 时长直方图：每个二倍程的分箱数
+BINS_PER_OCTAVE = 8
+
+# 可分组的维度
+GROUP_DIMENSIONS = ("name", "template", "queue", "gpu", "status")
+
+# 时间分桶
+BUCKETS = ("day", "week", "month")
+
+# 默认返回的百分位数
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+# 命令模板最大长度
+TEMPLATE_MAX_LENGTH = 200
+
+# 任务生命周期阶段（按发生顺序）
+#   enqueued      加入待执行队列
+#   eligible      轮到该任务：位于自动执行队列的队首且前面的任务已结束（手动运行时等于 admitted）
+#   gpu_blocked   第一次因 GPU 冲突而等待（没有冲突时不记录）
+#   admitted      调度器决定启动（通过状态和 GPU 冲突检查）
+#   spawned       进程已创建（Popen 返回）
+#   first_output  日志中出现第一个字节（精度为日志跟踪的轮询间隔）
+#   exited        进程退出或被停止
+#   notified      完成通知发送成功
+#   persisted     开始写入执行历史
+PHASES = ("enqueued", "eligible", "gpu_blocked", "admitted", "spawned",
+          "first_output", "exited", "notified", "persisted")
+
+# 延迟区间: (名称, 起点阶段, 终点阶段)
+LATENCY_SEGMENTS = (
+    ("queue_wait", "enqueued", "eligible"),        # 等待前面的任务运行
+    ("dispatch", "eligible", "admitted"),          # 队列轮询间隔 + GPU 冲突等待
+    ("gpu_wait", "gpu_blocked", "admitted"),       # 其中 GPU 冲突等待
+    ("spawn", "admitted", "spawned"),              # 创建日志文件、启动进程（和输出泵）
+    ("first_output", "spawned", "first_output"),   # shell 和程序启动到第一次输出
+    ("run", "spawned", "exited"),
+    ("notify", "exited", "notified"),
+    ("persist", "exited", "persisted"),            # 退出到写入历史（包括同步发送通知）
+)
+
+_ENV_PREFIX = re.compile(r'^(?:\s*[A-Za-z_][A-Za-z0-9_]*=\S*)+\s+')
+_NUMBER = re.compile(r'(?<![\w.])[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w.])')
+_SPACES = re.compile(r'\s+')
+
+
+def command_template(command: Optional[str]) -> str:
+    """把命令归一化为模板（去掉环境变量前缀、数字参数替换为 <n>）"""
+    if not command:
+        return ""
+    template = _ENV_PREFIX.sub('', command.strip())
+    template = _NUMBER.sub('<n>', template)
+    return _SPACES.sub(' ', template).strip()[:TEMPLATE_MAX_LENGTH]
+
+
+def record_day(record: Dict[str, Any]) -> str:
+    """记录所属日期（结束时间，没有时用开始时间；都没有时为空字符串）"""
+    timestamp = record.get('end_time') or record.get('start_time') or ""
+    return timestamp[:10]
+
+
+def duration_bin(seconds: float) -> int:
+    """时长所在的直方图分箱"""
+    return int(math.log2(1 + max(seconds, 0.0)) * BINS_PER_OCTAVE)
+
+
+def _bin_bounds(index: int) -> Tuple[float, float]:
+    return 2 ** (index / BINS_PER_OCTAVE) - 1, 2 ** ((index + 1) / BINS_PER_OCTAVE) - 1
+
+
+def bucket_of(day: str, bucket: Optional[str]) -> Optional[str]:
+    """
+    日期所在的时间桶
+
+    Args:
+        day: YYYY-MM-DD
+        bucket: day / week（该周周一的日期）/ month（YYYY-MM）/ None
+
+    Returns:
+        时间桶标识；不分桶时返回 None
+    """
+    if bucket is None or not day:
+        return None if bucket is None else ""
+    if bucket == "day":
+        return day
+    if bucket == "month":
+        return day[:7]
+    try:
+        parsed = date.fromisoformat(day)
+    except ValueError:
+        return day
+    return (parsed - timedelta(days=parsed.weekday())).isoformat()
+
+
+def parse_percentiles(value: Optional[str]) -> Tuple[float, ...]:
+    """
+    解析百分位数参数（如 "50,95,99.9"）
+
+    Raises:
+        ValueError: 格式无效或不在 (0, 100] 范围内
+    """
+    if not value:
+        return DEFAULT_PERCENTILES
+    result = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        q = float(part)
+        if not 0 < q <= 100:
+            raise ValueError(part)
+        result.append(q)
+    if not result:
+        raise ValueError(value)
+    return tuple(result)
+
+
+class _Group:
+    """一个分组的累加器"""
+
+    __slots__ = ("count", "statuses", "timed", "duration_sum", "duration_min", "duration_max", "bins")
+
+    def __init__(self):
+        self.count = 0
+        self.statuses: Dict[str, int] = {}
+        self.timed = 0
+        self.duration_sum = 0.0
+        self.duration_min: Optional[float] = None
+        self.duration_max: Optional[float] = None
+        self.bins: Dict[int, int] = {}
+
+    def merge(self, row: Dict[str, Any]):
+        self.count += row["count"]
+        status = row["status"]
+        self.statuses[status] = self.statuses.get(status, 0) + row["count"]
+        if row["timed"]:
+            self.timed += row["timed"]
+            self.duration_sum += row["duration_sum"]
+            if self.duration_min is None or row["duration_min"] < self.duration_min:
+                self.duration_min = row["duration_min"]
+            if self.duration_max is None or row["duration_max"] > self.duration_max:
+                self.duration_max = row["duration_max"]
+            for index, count in row["bins"].items():
+                self.bins[index] = self.bins.get(index, 0) + count
+
+    def percentile(self, q: float) -> float:
+        """按直方图估计百分位数（箱内线性插值，结果限制在最小 / 最大值之间）"""
+        rank = q / 100 * self.timed
+        seen = 0
+        for index in sorted(self.bins):
+            count = self.bins[index]
+            if seen + count >= rank:
+                low, high = _bin_bounds(index)
+                value = low + (high - low) * ((rank - seen) / count)
+                return min(max(value, self.duration_min), self.duration_max)
+            seen += count
+        return self.duration_max
+
+    def to_dict(self, percentiles: Sequence[float]) -> Dict[str, Any]:
+        completed = self.statuses.get("completed", 0)
+        failed = self.statuses.get("failed", 0)
+        result = {
+            "count": self.count,
+            "completed": completed,
+            "failed": failed,
+            "stopped": self.statuses.get("stopped", 0),
+            "success_rate": round(completed / self.count, 4) if self.count else None,
+            "failure_rate": round(failed / self.count, 4) if self.count else None,
+            "duration": None,
+        }
+        if self.timed:
+            duration = {
+                "count": self.timed,
+                "mean": round(self.duration_sum / self.timed, 3),
+                "min": round(self.duration_min, 3),
+                "max": round(self.duration_max, 3),
+            }
+            for q in percentiles:
+                duration[f"p{q:g}"] = round(self.percentile(q), 3)
+            result["duration"] = duration
+        return result
+
+
+def summarize(sources: Iterable[Tuple[str, str, List[Dict[str, Any]]]],
+              group_by: Sequence[str] = ("name",), bucket: Optional[str] = None,
+              percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+    """
+    合并聚合行并按维度分组
+
+    Args:
+        sources: [(队列ID, 队列名称, HistoryManager.aggregates() 返回的聚合行)]
+        group_by: 分组维度（GROUP_DIMENSIONS 的子集）
+        bucket: 时间分桶（BUCKETS 之一，None 表示不按时间分组）
+        percentiles: 要计算的时长百分位数
+
+    Returns:
+        {"groups": [{"key": {...}, 统计...}], "total": {统计...}}
+        按 GPU 分组时，使用多张 GPU 的任务计入每张 GPU；未指定 GPU 的任务 gpu 为 None
+    """
+    groups: Dict[Tuple, _Group] = {}
+    total = _Group()
+    queue_names: Dict[str, str] = {}
+
+    for queue_id, queue_name, rows in sources:
+        queue_names[queue_id] = queue_name
+        for row in rows:
+            total.merge(row)
+            values = []
+            for dimension in group_by:
+                if dimension == "queue":
+                    values.append((queue_id,))
+                elif dimension == "gpu":
+                    gpus = [int(g) for g in row["gpu"].strip(",").split(",") if g]
+                    values.append(tuple(gpus) or (None,))
+                else:
+                    values.append((row[dimension],))
+            if bucket is not None:
+                values.append((bucket_of(row["day"], bucket),))
+            for key in _product(values):
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = _Group()
+                group.merge(row)
+
+    dimensions = list(group_by) + (["bucket"] if bucket is not None else [])
+    result = []
+    for key, group in groups.items():
+        item_key = dict(zip(dimensions, key))
+        if "queue" in item_key:
+            item_key["queue_name"] = queue_names.get(item_key["queue"])
+        item = {"key": item_key}
+        item.update(group.to_dict(percentiles))
+        result.append(item)
+
+    # 时间桶升序，同一时间桶内记录数多的在前
+    result.sort(key=lambda item: (item["key"].get("bucket") or "", -item["count"]))
+    return {"groups": result, "total": total.to_dict(percentiles)}
+
+
+def duration_percentile(rows: Iterable[Dict[str, Any]], dimension: str, q: float = 50) -> Dict[str, float]:
+    """
+    按单个维度合并聚合行，返回各取值的时长百分位数
+
+    Args:
+        rows: HistoryManager.aggregates() 返回的聚合行
+        dimension: name / template / status 等聚合行中的字段
+        q: 百分位数
+
+    Returns:
+        {维度取值: 时长秒数}（没有时长记录的取值不包含在内）
+    """
+    groups: Dict[str, _Group] = {}
+    for row in rows:
+        group = groups.get(row[dimension])
+        if group is None:
+            group = groups[row[dimension]] = _Group()
+        group.merge(row)
+    return {key: group.percentile(q) for key, group in groups.items() if group.timed}
+
+
+def phase_latencies(phases: Optional[Dict[str, float]]) -> Dict[str, float]:
+    """
+    由阶段时间戳计算各延迟区间（秒）
+
+    Returns:
+        {区间名称: 秒数}（起点或终点阶段缺失的区间不包含在内）
+    """
+    if not phases:
+        return {}
+    result = {}
+    for segment, start, end in LATENCY_SEGMENTS:
+        if start in phases and end in phases:
+            result[segment] = round(max(phases[end] - phases[start], 0.0), 3)
+    return result
+
+
+def summarize_latency(sources: Iterable[Tuple[str, str, List[Dict[str, Any]]]],
+                      percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+    """
+    合并延迟聚合行
+
+    Args:
+        sources: [(队列ID, 队列名称, HistoryManager.latency_aggregates() 返回的聚合行)]
+        percentiles: 要计算的百分位数
+
+    Returns:
+        {"queues": [{"queue", "queue_name", "segments": {区间: 分布}}], "total": {区间: 分布}}
+        分布为 {"count", "mean", "min", "max", "p50", ...}（秒），没有记录的区间不包含在内
+    """
+    order = [segment for segment, _, _ in LATENCY_SEGMENTS]
+    total: Dict[str, _Group] = {}
+    queues = []
+    for queue_id, queue_name, rows in sources:
+        groups: Dict[str, _Group] = {}
+        for row in rows:
+            # 聚合行与 history_stats 同构，所有记录都计为有时长
+            row = dict(row, status="", timed=row["count"])
+            for target in (groups, total):
+                group = target.get(row["segment"])
+                if group is None:
+                    group = target[row["segment"]] = _Group()
+                group.merge(row)
+        queues.append({
+            "queue": queue_id,
+            "queue_name": queue_name,
+            "segments": _latency_dict(groups, order, percentiles),
+        })
+    return {"queues": queues, "total": _latency_dict(total, order, percentiles)}
+
+
+def _latency_dict(groups: Dict[str, _Group], order: Sequence[str],
+                  percentiles: Sequence[float]) -> Dict[str, Any]:
+    return {segment: groups[segment].to_dict(percentiles)["duration"]
+            for segment in order if segment in groups}
+
+
+def _product(values: List[Tuple]) -> Iterable[Tuple]:
+    """各维度取值的笛卡尔积（只有 GPU 维度可能有多个取值）"""
+    keys = [()]
+    for options in values:
+        keys = [key + (option,) for key in keys for option in options]
+    return keys
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+执行历史统计 API
+
+- /analytics/history：按任务名、命令模板、队列、GPU、状态和时间桶分组，返回记录数、成功率和时长百分位数。
+  数据来自各队列历史数据库中增量维护的聚合表（见 analytics.py），不扫描历史记录。
+- /analytics/latency：任务生命周期各阶段之间的延迟分布（排队、调度、启动、首次输出、通知、写入历史），按队列汇总
+- /analytics/gpu-trace：时间窗口内 GPU 占用的 Chrome trace 导出和利用率汇总（见 trace.py）
+"""
+
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse
+
+from ..state import get_queue_manager
+from ..blocking import run_blocking
+from ..analytics import (
+    GROUP_DIMENSIONS, BUCKETS, LATENCY_SEGMENTS, parse_percentiles, summarize, summarize_latency,
+)
+from ..trace import TraceTask, build_trace
+from .auth import require_auth
+from .listing import parse_time, select_queues
+
+
+router = APIRouter()
+
+
+def _parse_date(value: Optional[str], name: str) -> Optional[str]:
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} 格式应为 YYYY-MM-DD")
+
+
+def _date_range(days: Optional[int], since: Optional[str], until: Optional[str]):
+    """解析日期范围参数，返回 (since, until)"""
+    since = _parse_date(since, "since")
+    until = _parse_date(until, "until")
+    if days is not None:
+        if since is not None:
+            raise HTTPException(status_code=400, detail="days 和 since 不能同时指定")
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+    return since, until
+
+
+def _parse_quantiles(percentiles: Optional[str]):
+    try:
+        return parse_percentiles(percentiles)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="percentiles 必须是 0 到 100 之间的数字")
+
+
+@router.get("/analytics/history")
+async def get_history_analytics(
+    group_by: str = Query("name", description="分组维度，逗号分隔：name,template,queue,gpu,status"),
+    bucket: Optional[str] = Query(None, description="时间分桶：day / week / month"),
+    days: Optional[int] = Query(None, ge=1, description="最近 N 天（含今天）"),
+    since: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD（含）"),
+    until: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD（不含）"),
+    name: Optional[str] = Query(None, description="任务名称，支持通配符，如 train_yolov8*"),
+    status: Optional[str] = Query(None, description="状态，逗号分隔"),
+    gpu: Optional[int] = Query(None, description="使用了该 GPU 的任务"),
+    queue: Optional[str] = Query(None, description="队列 ID，逗号分隔（默认全部队列）"),
+    percentiles: Optional[str] = Query(None, description="时长百分位数，如 50,95,99"),
+    _=Depends(require_auth),
+):
+    """
+    执行历史统计
+
+    例如 ``?name=train_yolov8*&days=30&group_by=queue`` 返回最近 30 天
+    train_yolov8 系列任务在各队列的 p95 时长和失败率。时间按结束日期统计，粒度为天。
+    """
+    dimensions = [d.strip() for d in group_by.split(",") if d.strip()]
+    invalid = [d for d in dimensions if d not in GROUP_DIMENSIONS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"不支持的分组维度: {', '.join(invalid)}")
+    if bucket is not None and bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket 必须是 {' / '.join(BUCKETS)} 之一")
+    quantiles = _parse_quantiles(percentiles)
+    since, until = _date_range(days, since, until)
+
+    queues = select_queues(get_queue_manager(), queue)
+    statuses = [s.strip() for s in status.split(",") if s.strip()] if status else None
+
+    def collect():
+        sources = [
+            (queue_id, queue_name, manager.history_manager.aggregates(
+                since=since, until=until, name=name, statuses=statuses, gpu=gpu))
+            for queue_id, queue_name, manager in queues
+        ]
+        return summarize(sources, dimensions, bucket, quantiles)
+
+    result = await run_blocking(collect)
+    result.update({
+        "group_by": dimensions,
+        "bucket": bucket,
+        "since": since,
+        "until": until,
+    })
+    return result
+
+
+@router.get("/analytics/latency")
+async def get_latency_analytics(
+    days: Optional[int] = Query(None, ge=1, description="最近 N 天（含今天）"),
+    since: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD（含）"),
+    until: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD（不含）"),
+    queue: Optional[str] = Query(None, description="队列 ID，逗号分隔（默认全部队列）"),
+    percentiles: Optional[str] = Query(None, description="百分位数，如 50,95,99"),
+    _=Depends(require_auth),
+):
+    """
+    任务生命周期延迟分布
+
+    每个区间为两个生命周期阶段之间的秒数（见 analytics.LATENCY_SEGMENTS），
+    例如 queue_wait 为加入队列到轮到该任务、spawn 为调度决定到进程创建。
+    单条记录的阶段时间戳见历史记录的 phases 字段。
+    """
+    quantiles = _parse_quantiles(percentiles)
+    since, until = _date_range(days, since, until)
+    queues = select_queues(get_queue_manager(), queue)
+
+    def collect():
+        sources = [
+            (queue_id, queue_name, manager.history_manager.latency_aggregates(since=since, until=until))
+            for queue_id, queue_name, manager in queues
+        ]
+        return summarize_latency(sources, quantiles)
+
+    result = await run_blocking(collect)
+    result.update({
+        "segments": [{"name": name, "from": start, "to": end} for name, start, end in LATENCY_SEGMENTS],
+        "since": since,
+        "until": until,
+    })
+    return result
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(value).timestamp() if value else None
+    except ValueError:
+        return None
+
+
+@router.get("/analytics/gpu-trace")
+async def get_gpu_trace(
+    hours: float = Query(24, gt=0, description="最近 N 小时（未指定 since 时使用）"),
+    since: Optional[str] = Query(None, description="窗口开始（ISO 时间）"),
+    until: Optional[str] = Query(None, description="窗口结束（ISO 时间，默认现在）"),
+    queue: Optional[str] = Query(None, description="队列 ID，逗号分隔（默认全部队列）"),
+    gpus: Optional[int] = Query(None, ge=1, le=64, description="GPU 数量：0..N-1 即使空闲也列出"),
+    summary: bool = Query(False, description="只返回利用率汇总"),
+    download: bool = Query(False, description="作为 JSON 文件下载"),
+    _=Depends(require_auth),
+):
+    """
+    GPU 占用时间线（Chrome trace-event JSON）
+
+    包含窗口内结束的历史任务和运行中任务，每张 GPU、每个队列一条轨道；
+    用 chrome://tracing 或 https://ui.perfetto.dev 打开。
+    otherData.utilization 为每张 GPU 的利用率和最长空闲间隙。
+    """
+    now = time.time()
+    window_end = _timestamp(parse_time(until, "until")) if until else now
+    window_start = _timestamp(parse_time(since, "since")) if since else window_end - hours * 3600
+    if window_end <= window_start:
+        raise HTTPException(status_code=400, detail="until 必须晚于 since")
+    since_iso = datetime.fromtimestamp(window_start).isoformat()
+
+    queues = select_queues(get_queue_manager(), queue)
+
+    def collect():
+        tasks = []
+        for queue_id, _, manager in queues:
+            # 窗口开始之后结束、且在窗口结束之前开始的历史任务
+            for _, _, record in manager.history_manager.iter_timeline(since=since_iso):
+                start = _timestamp(record.get("start_time"))
+                end = _timestamp(record.get("end_time"))
+                if start is None or end is None or start >= window_end:
+                    continue
+                tasks.append(TraceTask(record["id"], record.get("name") or "", record.get("status") or "",
+                                       record.get("command"), record.get("gpu"), queue_id, start, end))
+            for task in manager.get_running_tasks():
+                if task.start_time is None:
+                    continue
+                tasks.append(TraceTask(task.id, task.name, task.status.value, task.command, task.gpu,
+                                       queue_id, task.start_time.timestamp(), now))
+        queue_names = {queue_id: queue_name for queue_id, queue_name, _ in queues}
+        return build_trace(tasks, queue_names, window_start, window_end, range(gpus or 0))
+
+    trace = await run_blocking(collect)
+    if summary:
+        return trace["otherData"]
+    if download:
+        filename = datetime.fromtimestamp(window_end).strftime("gpu-trace-%Y%m%d-%H%M%S.json")
+        return JSONResponse(trace, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+    return trace
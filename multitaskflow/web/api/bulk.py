@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批量任务操作 API
+
+一次请求创建、修改、删除、运行、停止或重新排队多个任务：
+每个操作只获取一次任务锁、只持久化一次，并返回逐项结果。
+"""
+
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel
+
+from ..state import get_task_manager
+from ..blocking import run_blocking
+from .auth import require_auth
+from .tasks import TaskCreate, _save_state
+
+
+router = APIRouter()
+
+
+# 单次请求的最大条目数
+MAX_BULK_ITEMS = 5000
+
+
+# ============ 请求模型 ============
+
+class BulkCreate(BaseModel):
+    """批量创建任务请求"""
+    tasks: List[TaskCreate]
+
+
+class BulkTaskUpdate(BaseModel):
+    """批量更新中的单个任务"""
+    id: str
+    name: Optional[str] = None
+    command: Optional[str] = None
+    note: Optional[str] = None
+
+
+class BulkUpdate(BaseModel):
+    """批量更新任务请求"""
+    tasks: List[BulkTaskUpdate]
+
+
+class BulkIds(BaseModel):
+    """按任务 ID 批量操作请求"""
+    ids: List[str]
+
+
+# ============ 辅助函数 ============
+
+def _get_manager():
+    manager = get_task_manager()
+    if manager is None:
+        raise HTTPException(status_code=400, detail="请先添加任务队列")
+    return manager
+
+
+def _check_size(count: int):
+    if count == 0:
+        raise HTTPException(status_code=400, detail="任务列表不能为空")
+    if count > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多操作 {MAX_BULK_ITEMS} 个任务")
+
+
+def _unique(ids: List[str]) -> List[str]:
+    """去重并保持顺序"""
+    return list(dict.fromkeys(ids))
+
+
+def _summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总逐项结果"""
+    succeeded = sum(1 for item in results if item["success"])
+    return {
+        "success": succeeded == len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }
+
+
+def _id_results(task_ids: List[str], errors: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    """把 {任务ID: 错误信息} 转为逐项结果"""
+    results = []
+    for task_id in task_ids:
+        error = errors.get(task_id)
+        item = {"id": task_id, "success": error is None}
+        if error is not None:
+            item["message"] = error
+        results.append(item)
+    return _summary(results)
+
+
+# ============ API 端点 ============
+
+@router.post("/tasks/bulk-create")
+async def bulk_create(request: BulkCreate, _=Depends(require_auth)):
+    """
+    批量创建任务
+
+    名称或命令为空的条目会被跳过并在结果中标记失败（按 index 对应请求中的位置）。
+    """
+    manager = _get_manager()
+    _check_size(len(request.tasks))
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(request.tasks)
+    specs, positions = [], []
+    for index, task in enumerate(request.tasks):
+        if not task.name or not task.command:
+            results[index] = {"index": index, "success": False, "message": "任务名称和命令不能为空"}
+        else:
+            specs.append({"name": task.name, "command": task.command,
+                          "note": task.note, "raw_log": task.raw_log})
+            positions.append(index)
+
+    created = await run_blocking(manager.add_tasks, specs)
+    for index, task in zip(positions, created):
+        task_dict = task.to_dict()
+        task_dict["can_run"] = True
+        task_dict["conflict_message"] = None
+        results[index] = {"index": index, "id": task.id, "success": True, "task": task_dict}
+
+    if created:
+        await _save_state()
+    return _summary(results)
+
+
+@router.post("/tasks/bulk-update")
+async def bulk_update(request: BulkUpdate, _=Depends(require_auth)):
+    """批量更新待执行任务的名称、命令和备注"""
+    manager = _get_manager()
+    _check_size(len(request.tasks))
+
+    updates = list({
+        task.id: {"id": task.id, "name": task.name, "command": task.command, "note": task.note}
+        for task in request.tasks
+    }.values())
+    errors = await run_blocking(manager.update_tasks, updates)
+    if any(error is None for error in errors.values()):
+        await _save_state()
+    return _id_results([update["id"] for update in updates], errors)
+
+
+@router.post("/tasks/bulk-delete")
+async def bulk_delete(request: BulkIds, _=Depends(require_auth)):
+    """批量删除待执行任务"""
+    manager = _get_manager()
+    _check_size(len(request.ids))
+
+    task_ids = _unique(request.ids)
+    errors = await run_blocking(manager.delete_tasks, task_ids)
+    if any(error is None for error in errors.values()):
+        await _save_state()
+    return _id_results(task_ids, errors)
+
+
+@router.post("/tasks/bulk-run")
+async def bulk_run(request: BulkIds, _=Depends(require_auth)):
+    """
+    批量运行任务
+
+    按请求顺序启动；与已运行任务（包括本次先启动的任务）GPU 冲突的任务标记失败。
+    """
+    manager = _get_manager()
+    _check_size(len(request.ids))
+
+    task_ids = _unique(request.ids)
+    errors = await run_blocking(manager.run_tasks, task_ids)
+    return _id_results(task_ids, errors)
+
+
+@router.post("/tasks/bulk-stop")
+async def bulk_stop(request: BulkIds, _=Depends(require_auth)):
+    """批量停止任务（同时发送 SIGTERM，总等待时间不随任务数增加）"""
+    manager = _get_manager()
+    _check_size(len(request.ids))
+
+    task_ids = _unique(request.ids)
+    errors = await run_blocking(manager.stop_tasks, task_ids)
+    return _id_results(task_ids, errors)
+
+
+@router.post("/tasks/bulk-requeue")
+async def bulk_requeue(request: BulkIds, _=Depends(require_auth)):
+    """
+    按执行历史批量重新排队
+
+    以历史任务的名称、命令和备注创建新的待执行任务，结果中的 task 为新任务。
+    """
+    manager = _get_manager()
+    _check_size(len(request.ids))
+
+    task_ids = _unique(request.ids)
+    requeued = await run_blocking(manager.requeue_tasks, task_ids)
+    results = []
+    for task_id in task_ids:
+        outcome = requeued.get(task_id)
+        if isinstance(outcome, str):
+            results.append({"id": task_id, "success": False, "message": outcome})
+        else:
+            results.append({"id": task_id, "success": True, "task": outcome.to_dict()})
+
+    if any(item["success"] for item in results):
+        await _save_state()
+    return _summary(results)
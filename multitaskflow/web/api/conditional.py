@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基于状态版本号的条件请求
+
+轮询接口用队列的状态版本号生成 ETag：状态未变化时直接返回 304，
+不再重新计算 GPU 冲突和序列化响应。浏览器缓存会自动带上 If-None-Match，
+前端无需改动即可受益。
+"""
+
+import hashlib
+from typing import Any
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def version_etag(*parts: Any) -> str:
+    """
+    由版本号等组成部分生成弱 ETag（响应中运行时长等派生字段不计入）
+
+    Args:
+        *parts: 决定响应内容的值（队列 ID、状态版本号、查询参数等）
+    """
+    key = "|".join(str(part) for part in parts)
+    return f'W/"{hashlib.md5(key.encode()).hexdigest()[:16]}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """客户端的 If-None-Match 是否与当前 ETag 匹配（弱比较）"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == tag:
+            return True
+    return False
+
+
+def set_etag(response: Response, etag: str):
+    """设置 ETag，并要求浏览器每次使用缓存前重新验证"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+
+def not_modified(etag: str) -> Response:
+    """304 响应"""
+    response = Response(status_code=304)
+    set_etag(response, etag)
+    return response
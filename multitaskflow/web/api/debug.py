@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+性能分析 API（默认关闭，启动时加 --profiling 启用）
+
+- /debug/profile：对运行中的服务采样 N 秒，返回折叠调用栈或 pstats 文件
+- /debug/tracemalloc/*：开始 / 停止跟踪内存分配，获取快照并与基线对比
+
+未调用时不产生任何开销（见 profiler.py）。
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import PlainTextResponse, Response
+
+from ..blocking import run_blocking
+from ..profiler import (
+    DEFAULT_INTERVAL, DEFAULT_TRACE_FRAMES, MAX_SECONDS, SNAPSHOT_GROUPS,
+    SamplingProfiler, allocation_tracer,
+)
+from .auth import require_auth
+
+
+router = APIRouter()
+
+# 同一时间只允许一个采样分析
+_profile_lock = asyncio.Lock()
+
+
+async def require_profiling(request: Request):
+    """性能分析接口需要在启动时显式启用"""
+    if not getattr(request.app.state, "profiling", False):
+        raise HTTPException(status_code=403, detail="性能分析接口未启用（启动时添加 --profiling 参数）")
+
+
+@router.get("/debug/profile")
+async def profile(
+    seconds: float = Query(10, gt=0, le=MAX_SECONDS, description="采样时长（秒）"),
+    interval_ms: float = Query(DEFAULT_INTERVAL * 1000, ge=1, le=1000, description="采样间隔（毫秒）"),
+    format: str = Query("collapsed", description="collapsed（折叠调用栈文本）/ pstats（cProfile 格式文件）"),
+    thread: Optional[str] = Query(None, description="只采样名称包含该字符串的线程，如 MainThread（事件循环）"),
+    _=Depends(require_auth),
+    __=Depends(require_profiling),
+):
+    """
+    采样式 CPU 分析
+
+    采样期间请求保持等待，结束后返回结果。collapsed 可直接交给 flamegraph.pl 或
+    https://www.speedscope.app 生成火焰图；pstats 可用 ``python -m pstats`` 或 snakeviz 打开。
+    """
+    if format not in ("collapsed", "pstats"):
+        raise HTTPException(status_code=400, detail="format 必须是 collapsed / pstats 之一")
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="已有性能分析正在进行")
+
+    async with _profile_lock:
+        profiler = SamplingProfiler(interval_ms / 1000, thread)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+        body = await run_blocking(profiler.collapsed if format == "collapsed" else profiler.pstats)
+
+    summary = profiler.summary()
+    headers = {
+        "X-Profile-Samples": str(summary["samples"]),
+        "X-Profile-Seconds": str(summary["seconds"]),
+    }
+    if format == "pstats":
+        filename = datetime.now().strftime("profile-%Y%m%d-%H%M%S.prof")
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return Response(body, media_type="application/octet-stream", headers=headers)
+    return PlainTextResponse(body, headers=headers)
+
+
+@router.post("/debug/tracemalloc/start")
+async def start_tracemalloc(
+    frames: int = Query(DEFAULT_TRACE_FRAMES, ge=1, le=100, description="每次分配保存的调用栈深度"),
+    _=Depends(require_auth),
+    __=Depends(require_profiling),
+):
+    """
+    开始跟踪内存分配，并以当前状态为对比基线
+
+    跟踪期间每次分配都有额外开销（调用栈越深越大），排查完成后请调用 stop。
+    """
+    return await run_blocking(allocation_tracer.start, frames)
+
+
+@router.post("/debug/tracemalloc/stop")
+async def stop_tracemalloc(_=Depends(require_auth), __=Depends(require_profiling)):
+    """停止跟踪内存分配并释放跟踪数据"""
+    return await run_blocking(allocation_tracer.stop)
+
+
+@router.get("/debug/tracemalloc/snapshot")
+async def tracemalloc_snapshot(
+    group_by: str = Query("lineno", description="分组方式：lineno / filename / traceback"),
+    limit: int = Query(30, ge=1, le=1000, description="返回的条目数"),
+    diff: bool = Query(True, description="与基线对比，按增长量排序"),
+    rebase: bool = Query(False, description="以本次快照作为新的基线"),
+    _=Depends(require_auth),
+    __=Depends(require_profiling),
+):
+    """
+    内存分配快照
+
+    diff=true 时返回相对基线（start 或上次 rebase 时）增长最多的分配位置，
+    连续调用并设置 rebase=true 可以观察每段时间内的增长。
+    """
+    if group_by not in SNAPSHOT_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by 必须是 {' / '.join(SNAPSHOT_GROUPS)} 之一")
+    try:
+        return await run_blocking(allocation_tracer.snapshot, group_by, limit, diff, rebase)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -7,10 +7,18 @@
 提供任务运行、停止等控制接口。
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+import os
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import Response, StreamingResponse
 
 from ..state import get_task_manager
+from ..blocking import run_blocking
 from .auth import require_auth
+from .conditional import version_etag, is_not_modified, not_modified, set_etag
 
 
 router = APIRouter()
@@ -29,7 +37,8 @@ async def run_task(task_id: str, _=Depends(require_auth)):
         raise HTTPException(status_code=400, detail="请先添加任务队列")
     
     try:
-        task = manager.run_task(task_id)
+        # 启动子进程（和输出泵）放到线程池，不阻塞事件循环
+        task = await run_blocking(manager.run_task, task_id)
         return {
             "success": True,
             "message": f"任务 {task.name} 已启动",
@@ -47,7 +56,8 @@ async def stop_task(task_id: str, _=Depends(require_auth)):
     if manager is None:
         raise HTTPException(status_code=400, detail="请先添加任务队列")
     
-    success = manager.stop_task(task_id)
+    # 等待进程退出最多需要数秒，放到线程池执行
+    success = await run_blocking(manager.stop_task, task_id)
     if not success:
         raise HTTPException(status_code=400, detail="任务不存在或未在运行")
     
@@ -60,7 +70,7 @@ async def stop_all(_=Depends(require_auth)):
     manager = get_task_manager()
     if manager is None:
         return {"success": True, "message": "无运行中的任务"}
-    manager.stop_all()
+    await run_blocking(manager.stop_all)
     return {"success": True, "message": "所有任务已停止"}
 
 
@@ -122,8 +132,8 @@ async def stop_queue(_=Depends(require_auth)):
 
 
 @router.get("/queue-status")
-async def queue_status(_=Depends(require_auth)):
-    """获取队列状态"""
+async def queue_status(request: Request, response: Response, _=Depends(require_auth)):
+    """获取队列状态（带 ETag，状态未变化时返回 304）"""
     manager = get_task_manager()
     
     if manager is None:
@@ -134,6 +144,11 @@ async def queue_status(_=Depends(require_auth)):
             "main_log_file": None
         }
     
+    etag = version_etag("queue-status", manager.queue_id, manager.state_version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
     return {
         "running": manager.queue_running,
         "pending_count": len(manager.get_pending_tasks()),
@@ -166,24 +181,17 @@ async def get_main_log(lines: int = 200, _=Depends(require_auth)):
         }
     
     try:
-        from ..ws import clean_progress_bar_output
-        
-        with open(log_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
-            content = f.read()
+        from ..logstore import iter_log_text
+        from ..termlog import collapse_tail
         
-        # 清理进度条输出
-        content = clean_progress_bar_output(content)
-        
-        # 只返回最后 N 行
-        all_lines = content.split('\n')
-        if len(all_lines) > lines:
-            content = '\n'.join(all_lines[-lines:])
+        # 流式清理进度条输出，只保留最后 N 行
+        content, total_lines = await run_blocking(collapse_tail, iter_log_text(str(log_path)), lines)
         
         return {
             "success": True,
             "content": content,
             "log_file": manager.main_log_file,
-            "total_lines": len(all_lines)
+            "total_lines": total_lines
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"读取日志失败: {str(e)}")
@@ -205,9 +213,7 @@ async def reload_tasks(_=Depends(require_auth)):
         )
     
     # 清空现有任务并重新加载
-    manager.tasks.clear()
-    manager.task_order.clear()
-    count = manager.load_tasks()
+    count = await run_blocking(manager.reload_tasks)
     
     return {
         "success": True, 
@@ -236,7 +242,7 @@ async def check_yaml(_=Depends(require_auth)):
             "message": "请先添加任务队列"
         }
     
-    result = manager.check_yaml_updates()
+    result = await run_blocking(manager.check_yaml_updates)
     
     valid_count = sum(1 for t in result["new_tasks"] if t["valid"])
     invalid_count = sum(1 for t in result["new_tasks"] if not t["valid"])
@@ -270,7 +276,7 @@ async def load_new_tasks(_=Depends(require_auth)):
             "errors": []
         }
     
-    result = manager.load_new_tasks_from_yaml()
+    result = await run_blocking(manager.load_new_tasks_from_yaml)
     
     # 保存状态到工作空间（持久化新加载的任务）
     if result["loaded"] > 0:
@@ -304,52 +310,254 @@ async def get_log_content(task_id: str, lines: int = 500, _=Depends(require_auth
         task_id: 任务ID
         lines: 返回最后多少行（默认500）
     """
-    from pathlib import Path
     from ..state import get_queue_manager
     
-    queue_manager = get_queue_manager()
+    if get_queue_manager() is None:
+        return {"success": False, "detail": "请先添加任务队列"}
+    
+    log_file = _find_task_log(task_id)
+    
+    # 运行中的任务直接从内存缓冲区获取（缓冲区保留的行数足够时）
+    from ..logbuffer import log_buffers
+    buffer = log_buffers.get(task_id)
+    if buffer is not None and buffer.has_lines(lines):
+        content, total_lines = buffer.tail(lines)
+        return {
+            "success": True,
+            "log_file": str(log_file),
+            "content": content,
+            "total_lines": total_lines
+        }
+    
+    from ..logstore import log_exists, iter_log_text
+    from ..termlog import collapse_tail
+    
+    if not log_exists(log_file):
+        raise HTTPException(status_code=404, detail="日志文件不存在")
+    
+    try:
+        # 透明读取原始日志或压缩归档，流式清理进度条输出，只保留最后 N 行
+        content, total_lines = await run_blocking(collapse_tail, iter_log_text(log_file), lines)
+        
+        return {
+            "success": True,
+            "log_file": str(log_file),
+            "content": content,
+            "total_lines": total_lines
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"读取日志失败: {str(e)}")
+
+
+def _find_task_log(task_id: str) -> str:
+    """
+    查找任务（运行中、待执行或历史）的日志路径
     
+    Raises:
+        HTTPException: 没有队列或找不到任务日志
+    """
+    from ..state import get_queue_manager
+    
+    queue_manager = get_queue_manager()
     if queue_manager is None:
-        return {"success": False, "detail": "请先添加任务队列"}
+        raise HTTPException(status_code=400, detail="请先添加任务队列")
     
     log_file = None
     
     # 在所有队列中查找运行中或待执行任务
-    task, queue = queue_manager.find_task_in_all_queues(task_id)
+    task, _ = queue_manager.find_task_in_all_queues(task_id)
     if task and task.log_file:
         log_file = task.log_file
     else:
         # 在所有队列的历史记录中查找
-        task_dict, queue = queue_manager.find_task_in_history(task_id)
+        task_dict, _ = queue_manager.find_task_in_history(task_id)
         if task_dict:
             log_file = task_dict.get('log_file')
     
     if not log_file:
         raise HTTPException(status_code=404, detail="找不到任务日志")
+    return log_file
+
+
+# ============ 原始日志下载 ============
+
+# 下载流的读取块大小
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单个 Range 请求头
     
-    log_path = Path(log_file)
-    if not log_path.exists():
+    Args:
+        header: Range 头，如 "bytes=0-499"、"bytes=500-"、"bytes=-500"
+        size: 资源总大小
+    
+    Returns:
+        (start, end)，end 不包含；格式不支持（如多段）时返回 None
+    
+    Raises:
+        HTTPException: 416 范围无法满足
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else size
+            if end <= start:
+                # 末尾位置小于起始位置：语法无效，忽略 Range（RFC 7233 §2.1）
+                return None
+        else:
+            # 后缀范围：最后 N 字节
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(size - suffix, 0), size
+    except ValueError:
+        return None
+    
+    end = min(end, size)
+    if start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="请求的范围无效",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """根据 If-None-Match / If-Modified-Since 判断客户端缓存是否仍然有效"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(',')]
+        return '*' in tags or etag in tags or f"W/{etag}" in tags
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def _if_range_matches(request: Request, etag: str, mtime: float) -> bool:
+    """If-Range 条件：不满足时忽略 Range，返回完整内容"""
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # 弱 ETag 不能用于范围请求
+        return if_range == etag
+    try:
+        return int(mtime) == int(parsedate_to_datetime(if_range).timestamp())
+    except (TypeError, ValueError):
+        return False
+
+
+def _iter_file_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    """按块读取文件的字节区间"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _iter_gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """把字节流实时压缩为 gzip 格式"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip 头和尾
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@router.get("/logs/{task_id}/raw")
+async def download_raw_log(task_id: str, request: Request, gzip: bool = False,
+                           _=Depends(require_auth)):
+    """
+    下载原始日志（流式传输，不经 JSON 包装）
+    
+    - 支持 Range（单段）和 If-Range，可断点续传多 GB 的日志
+    - 支持 ETag / Last-Modified 条件请求（If-None-Match / If-Modified-Since → 304）
+    - gzip=true 时返回 gzip 压缩流：已归档的日志直接发送归档文件（支持 Range），
+      否则实时压缩（不支持 Range）
+    - 运行中任务的日志按请求时的大小截取
+    
+    Args:
+        task_id: 任务ID
+        gzip: 是否返回 gzip 压缩流
+    """
+    from ..logstore import resolve_log_path, is_archived, log_size, iter_log_bytes
+    
+    log_file = _find_task_log(task_id)
+    path = resolve_log_path(log_file)
+    if path is None:
         raise HTTPException(status_code=404, detail="日志文件不存在")
     
+    archived = is_archived(path)
+    passthrough = gzip and archived
+    
+    def file_info():
+        # 没有块索引的归档日志需要完整解压才能得到原始大小
+        stat = path.stat()
+        return stat, stat.st_size if passthrough else log_size(log_file)
+    
     try:
-        from ..ws import clean_progress_bar_output
-        
-        with open(log_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
-            content = f.read()
-        
-        # 清理进度条输出
-        content = clean_progress_bar_output(content)
-        
-        # 只返回最后 N 行
-        all_lines = content.split('\n')
-        if len(all_lines) > lines:
-            content = '\n'.join(all_lines[-lines:])
-        
-        return {
-            "success": True,
-            "log_file": str(log_file),
-            "content": content,
-            "total_lines": len(all_lines)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"读取日志失败: {str(e)}")
+        stat, size = await run_blocking(file_info)
+    except OSError as e:
+        raise HTTPException(status_code=404, detail=f"读取日志失败: {e}")
+    mtime = stat.st_mtime
+    
+    # 归档时保留了原始修改时间，同一日志归档前后 ETag 不变（直接发送归档文件时除外）
+    etag = f'"{size:x}-{int(mtime * 1000):x}{"-gz" if passthrough else ""}"'
+    filename = os.path.basename(log_file) + (".gz" if gzip else "")
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "no-cache",
+    }
+    media_type = "application/gzip" if gzip else "text/plain; charset=utf-8"
+    
+    if _not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=headers)
+    
+    if gzip and not passthrough:
+        # 实时压缩：压缩后大小未知，不支持 Range
+        headers["Accept-Ranges"] = "none"
+        chunks = iter_log_bytes(log_file, 0, size, chunk_size=DOWNLOAD_CHUNK_SIZE)
+        return StreamingResponse(_iter_gzip(chunks), media_type=media_type, headers=headers)
+    
+    headers["Accept-Ranges"] = "bytes"
+    start, end = 0, size
+    status_code = 200
+    range_header = request.headers.get("range")
+    if range_header and _if_range_matches(request, etag, mtime):
+        byte_range = _parse_range(range_header, size)
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+    
+    if passthrough:
+        chunks = _iter_file_range(str(path), start, end)
+    else:
+        chunks = iter_log_bytes(log_file, start, end, chunk_size=DOWNLOAD_CHUNK_SIZE)
+    # 同步迭代器由 Starlette 在线程池中执行，不阻塞事件循环
+    return StreamingResponse(chunks, status_code=status_code, media_type=media_type, headers=headers)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+主机资源 API
+
+返回后台采样器（见 hostmon.py）记录的 CPU、负载、内存、交换分区、磁盘剩余空间和网络速率，
+用于在网页上判断是否还能启动更多任务。
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from ..blocking import run_blocking
+from ..hostmon import CAPACITY, SAMPLE_INTERVAL, DEFAULT_POINTS, host_sampler
+from .auth import require_auth
+
+
+router = APIRouter()
+
+
+@router.get("/host/metrics")
+async def get_host_metrics(
+    window: Optional[float] = Query(None, gt=0, le=CAPACITY * SAMPLE_INTERVAL,
+                                    description="最近多少秒（默认全部缓冲的采样）"),
+    points: int = Query(DEFAULT_POINTS, ge=1, le=CAPACITY, description="时间序列最多返回的点数"),
+    _=Depends(require_auth),
+):
+    """
+    主机资源时间序列
+
+    latest 为最近一次采样（disks 为各磁盘的剩余空间，net 为各网络接口的 [接收, 发送] 字节/秒），
+    series 为按时间等分后各段的平均值（时间戳为 Unix 秒）。采样间隔为 5 秒，默认保留最近 1 小时。
+    """
+    result = await run_blocking(host_sampler.series, window, points)
+    # 结果在同一采样周期内被多个请求共用，不能修改；主机静态信息在采样器启动时已读取
+    return dict(result, host=host_sampler.host, sampler=host_sampler.stats())
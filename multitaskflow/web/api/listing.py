@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+列表接口的分页、过滤和字段投影
+
+- 游标分页：游标记录上一页最后一项的位置和 ID，下一页从该位置继续扫描，
+  代价与页大小（和被过滤掉的项数）相关，而不是列表总长度；
+  位置上的 ID 不一致（列表在两次请求之间发生变化）时按 ID 重新定位
+- 过滤：status（逗号分隔多个）、name（名称子串，不区分大小写）、gpu（使用该 GPU 的任务）
+- 字段投影：fields=id,name,status 只返回指定字段（始终包含 id）
+- 跨队列接口的队列选择（queue=id1,id2）和时间参数解析
+"""
+
+import json
+import base64
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from fastapi import HTTPException
+
+
+# 默认 / 最大页大小
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """把游标状态编码为 URL 安全的字符串"""
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    解码游标
+
+    Raises:
+        HTTPException: 游标格式无效
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(raw)
+        if not isinstance(state, dict):
+            raise ValueError
+        return state
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+def check_page_size(page_size: Optional[int]) -> int:
+    """校验页大小（未指定时使用默认值）"""
+    if page_size is None:
+        return DEFAULT_PAGE_SIZE
+    if page_size < 1 or page_size > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page_size 必须在 1 到 {MAX_PAGE_SIZE} 之间")
+    return page_size
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    """解析 fields 参数（未指定时返回 None，表示全部字段）"""
+    if not fields:
+        return None
+    selected = {f.strip() for f in fields.split(",") if f.strip()}
+    selected.add("id")
+    return selected
+
+
+def project(item: Dict[str, Any], fields: Optional[Set[str]]) -> Dict[str, Any]:
+    """只保留指定字段"""
+    if fields is None:
+        return item
+    return {key: value for key, value in item.items() if key in fields}
+
+
+class ListFilter:
+    """列表过滤条件"""
+
+    def __init__(self, status: Optional[str] = None, name: Optional[str] = None, gpu: Optional[int] = None):
+        self.statuses = {s.strip() for s in status.split(",") if s.strip()} if status else None
+        self.name = name.lower() if name else None
+        self.gpu = gpu
+
+    @property
+    def active(self) -> bool:
+        return self.statuses is not None or self.name is not None or self.gpu is not None
+
+    def allows_status(self, status: str) -> bool:
+        return self.statuses is None or status in self.statuses
+
+    def match(self, status: str, name: Optional[str], gpu: Optional[List[int]]) -> bool:
+        if self.statuses is not None and status not in self.statuses:
+            return False
+        if self.name is not None and self.name not in (name or "").lower():
+            return False
+        if self.gpu is not None and (not gpu or self.gpu not in gpu):
+            return False
+        return True
+
+
+def seek(ids: Sequence[str], position: int, last_id: Optional[str]) -> int:
+    """
+    定位游标的下一项
+
+    Args:
+        ids: 当前列表的 ID 序列（或支持按下标取 ID 的序列）
+        position: 上一页最后一项之后的位置
+        last_id: 上一页最后一项的 ID
+
+    Returns:
+        下一项的下标
+    """
+    if last_id is None:
+        return max(position, 0)
+    if 0 < position <= len(ids) and ids[position - 1] == last_id:
+        return position
+    # 列表已变化：按 ID 重新定位（找不到时沿用原位置）
+    try:
+        return ids.index(last_id) + 1
+    except ValueError:
+        return min(max(position, 0), len(ids))
+
+
+def scan_page(count: int, start: int, limit: int,
+              get: Callable[[int], Any], match: Callable[[Any], bool]) -> Tuple[List[Any], int]:
+    """
+    从 start 开始扫描，收集最多 limit 个匹配项
+
+    Returns:
+        (匹配项, 扫描结束的位置)；位置等于 count 表示已到末尾
+    """
+    items = []
+    index = start
+    while index < count and len(items) < limit:
+        item = get(index)
+        index += 1
+        if item is not None and match(item):
+            items.append(item)
+    return items, index
+
+
+def parse_time(value: Optional[str], name: str) -> Optional[str]:
+    """解析 ISO 格式时间参数（与历史记录中的本地时间格式一致）"""
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} 格式应为 ISO 时间，如 2024-01-01T08:00:00")
+
+
+def select_queues(queue_manager, queue: Optional[str]) -> List[Tuple[str, str, Any]]:
+    """
+    解析 queue 参数（逗号分隔的队列 ID，未指定时为全部队列）
+
+    Returns:
+        [(队列ID, 队列名称, TaskManager)]
+
+    Raises:
+        HTTPException: 队列不存在
+    """
+    queue_ids = [q.strip() for q in queue.split(",") if q.strip()] if queue else list(queue_manager.queues)
+    queues = []
+    for queue_id in queue_ids:
+        manager = queue_manager.get_queue(queue_id)
+        if manager is None:
+            raise HTTPException(status_code=404, detail=f"队列不存在: {queue_id}")
+        config = queue_manager.queue_configs.get(queue_id, {})
+        queues.append((queue_id, config.get("name", queue_id), manager))
+    return queues
@@ -30,7 +30,6 @@ class NotificationSettingsResponse(BaseModel):
 async def get_notification_settings(_=Depends(require_auth)) -> NotificationSettingsResponse:
     """获取通知设置"""
     import os
-    import json
     
     queue_manager = get_queue_manager()
     
@@ -47,14 +46,8 @@ async def get_notification_settings(_=Depends(require_auth)) -> NotificationSett
     enabled = True
     
     if queue_manager:
-        workspace_file = queue_manager.workspace_dir / ".workspace.json"
-        if workspace_file.exists():
-            try:
-                data = json.loads(workspace_file.read_text())
-                token = data.get("pushplus_token", "")
-                enabled = data.get("notification_enabled", True)
-            except Exception:
-                pass
+        token = queue_manager.workspace.pushplus_token
+        enabled = queue_manager.workspace.notification_enabled
     
     return NotificationSettingsResponse(
         pushplus_token=token,
@@ -66,31 +59,17 @@ async def get_notification_settings(_=Depends(require_auth)) -> NotificationSett
 @router.post("/settings/notification")
 async def save_notification_settings(settings: NotificationSettings, _=Depends(require_auth)):
     """保存通知设置"""
-    import json
-    
     queue_manager = get_queue_manager()
     if not queue_manager:
         return {"success": False, "message": "无工作区"}
     
-    workspace_file = queue_manager.workspace_dir / ".workspace.json"
+    # 由 WorkspaceStore 合并写入，不会被队列状态的保存覆盖
+    settings_update = {"notification_enabled": settings.enabled}
+    if settings.pushplus_token is not None:
+        settings_update["pushplus_token"] = settings.pushplus_token.strip()
+    queue_manager.workspace.update_settings(**settings_update)
     
-    try:
-        # 读取现有数据
-        data = {}
-        if workspace_file.exists():
-            data = json.loads(workspace_file.read_text())
-        
-        # 更新设置
-        if settings.pushplus_token is not None:
-            data["pushplus_token"] = settings.pushplus_token.strip()
-        data["notification_enabled"] = settings.enabled
-        
-        # 保存
-        workspace_file.write_text(json.dumps(data, indent=2, ensure_ascii=False))
-        
-        return {"success": True, "message": "设置已保存"}
-    except Exception as e:
-        return {"success": False, "message": str(e)}
+    return {"success": True, "message": "设置已保存"}
 
 
 @router.post("/settings/notification/test")
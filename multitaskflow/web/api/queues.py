@@ -8,11 +8,13 @@
 """
 
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from pydantic import BaseModel
 
 from ..state import get_queue_manager, set_current_queue, get_current_queue_id
+from ..blocking import run_blocking
 from .auth import require_auth
+from .conditional import version_etag, is_not_modified, not_modified, set_etag
 
 
 router = APIRouter()
@@ -24,6 +26,7 @@ class QueueCreate(BaseModel):
     """创建队列请求"""
     name: str
     yaml_path: str
+    output_pump: bool = False  # 写入时压缩进度条帧
 
 
 class QueueResponse(BaseModel):
@@ -38,11 +41,20 @@ class QueueResponse(BaseModel):
 # ============ API 端点 ============
 
 @router.get("/queues")
-async def get_queues(_=Depends(require_auth)):
-    """获取所有队列"""
+async def get_queues(request: Request, response: Response, _=Depends(require_auth)):
+    """获取所有队列（带 ETag：队列列表和各队列状态都未变化时返回 304）"""
     manager = get_queue_manager()
-    queues = manager.get_all_queues()
     current_id = get_current_queue_id()
+    
+    etag = version_etag(
+        "queues", manager.state_version, current_id,
+        *(f"{queue_id}:{queue.state_version}" for queue_id, queue in list(manager.queues.items()))
+    )
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
+    queues = manager.get_all_queues()
     return {
         "queues": queues,
         "current_queue_id": current_id
@@ -58,7 +70,8 @@ async def create_queue(queue: QueueCreate, _=Depends(require_auth)):
         raise HTTPException(status_code=400, detail="队列名称和 YAML 路径不能为空")
     
     try:
-        config = manager.add_queue(queue.name, queue.yaml_path)
+        # 读取 YAML、写工作空间文件
+        config = await run_blocking(manager.add_queue, queue.name, queue.yaml_path, queue.output_pump)
         # 自动切换到新队列
         set_current_queue(config['id'])
         return {"success": True, "queue": config}
@@ -73,7 +86,8 @@ async def delete_queue(queue_id: str, _=Depends(require_auth)):
     """移除队列（不删除文件）"""
     manager = get_queue_manager()
     
-    success = manager.remove_queue(queue_id)
+    # 移除队列会停止其中运行的任务（等待进程退出）
+    success = await run_blocking(manager.remove_queue, queue_id)
     if not success:
         raise HTTPException(status_code=404, detail="队列不存在")
     
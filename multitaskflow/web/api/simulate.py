@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+调度模拟 API
+
+用队列当前的待执行任务和运行中任务，按多个调度策略模拟执行，
+返回预测的完成时间和 GPU 利用率（见 simulator.py）。
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel
+
+from ..state import get_task_manager, get_queue_manager
+from ..blocking import run_blocking
+from ..simulator import (
+    POLICIES, GPU_MODES, DEFAULT_DURATION, DurationEstimator, SimTask, build_tasks, compare,
+)
+from .auth import require_auth
+
+
+router = APIRouter()
+
+
+class SimulateRequest(BaseModel):
+    """调度模拟请求"""
+    queue_id: Optional[str] = None              # 默认当前队列
+    policies: Optional[List[str]] = None        # 默认全部策略
+    gpus: Optional[int] = None                  # GPU 总数（默认按任务用到的最大编号推断）
+    max_concurrent: Optional[int] = None        # 最大并发任务数（默认只受 GPU 限制）
+    gpu_mode: str = "pinned"                    # pinned / count
+    default_duration: float = DEFAULT_DURATION  # 没有历史记录时的任务时长（秒）
+    durations: Optional[Dict[str, float]] = None    # 指定任务时长（任务 ID -> 秒）
+    priorities: Optional[Dict[str, int]] = None     # priority 策略的优先级（任务 ID -> 整数，越大越先）
+    include_running: bool = True                # 运行中任务是否占用 GPU
+    include_schedule: bool = False              # 返回每个任务的开始 / 结束时间
+
+
+@router.post("/simulate")
+async def simulate_queue(request: SimulateRequest, _=Depends(require_auth)):
+    """
+    模拟队列在不同调度策略下的执行
+
+    时间单位为秒，从现在（时间 0）开始计算。serial 为当前队列的实际行为（一次运行一个任务）。
+    """
+    if request.queue_id:
+        manager = get_queue_manager().get_queue(request.queue_id)
+        if manager is None:
+            raise HTTPException(status_code=404, detail=f"队列不存在: {request.queue_id}")
+    else:
+        manager = get_task_manager()
+    if manager is None:
+        raise HTTPException(status_code=400, detail="请先添加任务队列")
+
+    policies = request.policies or list(POLICIES)
+    invalid = [p for p in policies if p not in POLICIES]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"不支持的调度策略: {', '.join(invalid)}")
+    if request.gpu_mode not in GPU_MODES:
+        raise HTTPException(status_code=400, detail=f"gpu_mode 必须是 {' / '.join(GPU_MODES)} 之一")
+    if request.gpus is not None and request.gpus < 1:
+        raise HTTPException(status_code=400, detail="gpus 必须大于 0")
+    if request.max_concurrent is not None and request.max_concurrent < 1:
+        raise HTTPException(status_code=400, detail="max_concurrent 必须大于 0")
+    if request.default_duration <= 0:
+        raise HTTPException(status_code=400, detail="default_duration 必须大于 0")
+
+    pending = [task.to_dict() for task in manager.get_pending_tasks()]
+    running_tasks = manager.get_running_tasks() if request.include_running else []
+
+    def run():
+        estimator = DurationEstimator(manager.history_manager.aggregates(), request.default_duration)
+        tasks = build_tasks(pending, estimator, request.durations, request.priorities)
+
+        now = datetime.now()
+        running = []
+        for task in running_tasks:
+            duration, _ = estimator.estimate(task.name, task.command)
+            elapsed = (now - task.start_time).total_seconds() if task.start_time else 0.0
+            # 已超过估计时长的任务按即将结束处理
+            running.append(SimTask(task.id, task.name, task.gpu, max(duration - elapsed, 1.0)))
+
+        used = [gpu for task in tasks + running for gpu in task.gpu]
+        gpu_count = request.gpus or (max(used) + 1 if used else 1)
+        result = compare(tasks, gpu_count, policies, request.max_concurrent, request.gpu_mode,
+                         running, request.include_schedule)
+
+        sources: Dict[str, int] = {}
+        for task in tasks:
+            sources[task.source] = sources.get(task.source, 0) + 1
+        result.update({
+            "tasks": len(tasks),
+            "running": len(running),
+            "gpus": gpu_count,
+            "estimates": sources,
+        })
+        return result
+
+    try:
+        return await run_blocking(run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
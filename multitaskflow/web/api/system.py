@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+系统运行状态 API
+
+提供事件循环延迟、阻塞操作线程池等服务自身的运行指标。
+"""
+
+from fastapi import APIRouter, Depends
+
+from .auth import require_auth
+
+
+router = APIRouter()
+
+
+@router.get("/system/event-loop")
+async def get_event_loop_stats(_=Depends(require_auth)):
+    """
+    事件循环延迟和阻塞操作线程池统计
+
+    lag 中的延迟单位为毫秒；p99 / 最大值持续偏高说明有代码阻塞了事件循环。
+    """
+    from ..loopmon import loop_monitor
+    from ..blocking import blocking_executor
+
+    return {
+        "lag": loop_monitor.stats(),
+        "blocking_pool": blocking_executor.stats(),
+    }
+
+
+@router.get("/system/event-loop/blocks")
+async def get_event_loop_blocks(_=Depends(require_auth)):
+    """
+    最近的事件循环阻塞现场（新的在前）
+
+    延迟超过卡顿阈值时，看门狗线程记录事件循环线程当时的调用栈：
+    detected_ms 为捕获时已阻塞的时长，lag_ms 为这次卡顿的完整时长（恢复前为 null）。
+    """
+    from ..loopmon import loop_monitor
+
+    return {
+        "stall_threshold_ms": loop_monitor.stall_threshold * 1000,
+        "blocks": loop_monitor.recent_blocks(),
+    }
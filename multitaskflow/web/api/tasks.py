@@ -7,12 +7,24 @@
 提供任务的增删改查和排序接口。
 """
 
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Depends
+import sys
+import heapq
+import itertools
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
 from ..state import get_task_manager, get_queue_manager
+from ..blocking import run_blocking
+from .. import events
 from .auth import require_auth
+from .conditional import version_etag, is_not_modified, not_modified, set_etag
+from .listing import (
+    ListFilter, encode_cursor, decode_cursor, check_page_size, parse_fields, project, seek, scan_page,
+    parse_time, select_queues,
+)
 
 
 router = APIRouter()
@@ -25,6 +37,7 @@ class TaskCreate(BaseModel):
     name: str
     command: str
     note: Optional[str] = None
+    raw_log: bool = False  # 保留原始输出（不压缩进度条）
 
 
 class TaskUpdate(BaseModel):
@@ -47,11 +60,13 @@ class TaskResponse(BaseModel):
     status: str
     gpu: Optional[List[int]]
     start_time: Optional[str]
+    start_timestamp: Optional[float] = None
     end_time: Optional[str]
     duration: Optional[float]
     error_message: Optional[str]
     log_file: Optional[str]
     note: Optional[str] = None
+    raw_log: bool = False
     can_run: bool = True
     conflict_message: Optional[str] = None
 
@@ -60,39 +75,342 @@ class TaskListResponse(BaseModel):
     """任务列表响应"""
     pending: List[TaskResponse]
     running: List[TaskResponse]
+    version: Optional[int] = None  # 队列状态版本号
 
 
 # ============ 辅助函数 ============
 
-def _save_state():
-    """保存工作空间状态"""
+async def _save_state():
+    """保存工作空间状态（只标记 dirty，由 WorkspaceStore 合并写入）"""
     queue_manager = get_queue_manager()
     if queue_manager:
         queue_manager._save_workspace()
 
 
+def _pending_task_dict(manager, task, running_tasks=None) -> Dict[str, Any]:
+    """待执行任务（附带 GPU 冲突检查结果）"""
+    task_dict = task.to_dict()
+    conflict = manager.check_gpu_conflict(task.id, running_tasks)
+    task_dict["can_run"] = conflict is None
+    task_dict["conflict_message"] = conflict
+    return task_dict
+
+
+# 需要计算 GPU 冲突的字段
+_CONFLICT_FIELDS = {"can_run", "conflict_message"}
+
+
+def _task_item(manager, task, running_tasks, fields) -> Dict[str, Any]:
+    """列表中的单个任务（只有待执行任务且需要冲突字段时才检查 GPU 冲突）"""
+    if task.status.value == "pending" and (fields is None or fields & _CONFLICT_FIELDS):
+        return project(_pending_task_dict(manager, task, running_tasks), fields)
+    return project(task.to_dict(), fields)
+
+
+def _cursor_state(cursor: Optional[str], sections: Tuple[str, ...]) -> Tuple[str, int, Optional[str]]:
+    """解析游标为 (分区, 位置, 上一项 ID)，没有游标时从第一个分区开头开始"""
+    if cursor is None:
+        return sections[0], 0, None
+    state = decode_cursor(cursor)
+    section, position, last_id = state.get("s", sections[0]), state.get("i"), state.get("id")
+    if section not in sections or not isinstance(position, int) or not (last_id is None or isinstance(last_id, str)):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    return section, position, last_id
+
+
+def _tasks_page(manager, list_filter: ListFilter, fields, cursor: Optional[str],
+                page_size: int) -> Dict[str, Any]:
+    """
+    分页获取任务：先运行中任务，再按队列顺序的待执行任务
+
+    只为本页任务序列化和检查 GPU 冲突；有过滤条件时扫描量取决于匹配密度。
+    """
+    section, position, last_id = _cursor_state(cursor, ("r", "p"))
+    running_tasks = manager.get_running_tasks()
+    order = manager.task_order
+
+    def get_pending(index):
+        try:
+            task = manager.tasks.get(order[index])
+        except IndexError:  # 队列线程在扫描过程中启动了任务
+            return None
+        return task if task is not None and task.status.value == "pending" else None
+
+    sections = [
+        ("r", "running", [task.id for task in running_tasks], running_tasks.__getitem__),
+        ("p", "pending", order, get_pending),
+    ]
+
+    def match(task):
+        return list_filter.match(task.status.value, task.name, task.gpu)
+
+    page, next_state = [], None
+    started = False
+    for key, status, ids, get in sections:
+        if key == section:
+            started = True
+            start = seek(ids, position, last_id)
+        elif started:
+            start = 0
+        else:
+            continue
+        if not list_filter.allows_status(status):
+            continue
+        remaining = page_size - len(page)
+        if remaining == 0:
+            next_state = {"s": key, "i": 0}
+            break
+        items, end = scan_page(len(ids), start, remaining, get, match)
+        page.extend(items)
+        if len(page) == page_size and end < len(ids):
+            next_state = {"s": key, "i": end, "id": ids[end - 1]}
+            break
+
+    return {
+        "tasks": [_task_item(manager, task, running_tasks, fields) for task in page],
+        "next_cursor": encode_cursor(next_state) if next_state else None,
+    }
+
+
+def _history_page(manager, list_filter: ListFilter, fields, cursor: Optional[str],
+                  page_size: int) -> Dict[str, Any]:
+    """
+    分页获取执行历史（最新在前）
+
+    游标记录上一页最后一条记录的 seq（历史数据库的插入序号），下一页查询 seq 更小的记录，
+    过滤条件由数据库索引处理。
+    """
+    _, position, _ = _cursor_state(cursor, ("h",))
+    rows = manager.history_manager.query(
+        limit=page_size + 1,
+        before_seq=position if cursor is not None else None,
+        statuses=list_filter.statuses,
+        name=list_filter.name,
+        gpu=list_filter.gpu,
+    )
+    next_state = {"s": "h", "i": rows[page_size - 1][0]} if len(rows) > page_size else None
+    return {
+        "history": [project(record, fields) for _, record in rows[:page_size]],
+        "next_cursor": encode_cursor(next_state) if next_state else None,
+    }
+
+
+def _timeline_bound(cursor_state: Dict[str, Any], queue_id: str) -> Tuple[str, int]:
+    """
+    跨队列游标在某个队列上的读取起点
+
+    全局顺序为 (end_time, 队列ID, seq) 倒序：结束时间与游标相同的记录，
+    队列 ID 更小的全部在游标之后，更大的全部在游标之前。
+    """
+    end_time, cursor_queue, seq = cursor_state["t"], cursor_state["q"], cursor_state["s"]
+    if queue_id < cursor_queue:
+        return end_time, sys.maxsize
+    if queue_id > cursor_queue:
+        return end_time, 0
+    return end_time, seq
+
+
+def _tag_queue(rows, queue_id: str):
+    """给队列的时间线记录加上队列 ID：(end_time, 队列ID, seq, 记录)"""
+    for end_time, seq, record in rows:
+        yield end_time, queue_id, seq, record
+
+
+def _timeline_page(queues: List[Tuple[str, str, Any]], list_filter: ListFilter, fields,
+                   cursor: Optional[str], page_size: int,
+                   since: Optional[str], until: Optional[str]) -> Dict[str, Any]:
+    """
+    全部队列的执行历史按结束时间归并分页（最新在前）
+
+    每个队列按 (end_time, seq) 倒序逐批读取，heapq.merge 做 k 路归并，
+    一页只读取每个队列最多 page_size + 1 条记录，不加载完整历史。
+    游标记录上一页最后一条记录的 (end_time, 队列ID, seq)。
+    """
+    state = None
+    if cursor is not None:
+        state = decode_cursor(cursor)
+        if not (isinstance(state.get("t"), str) and isinstance(state.get("q"), str)
+                and isinstance(state.get("s"), int)):
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+
+    chunk_size = min(page_size + 1, 200)
+    streams = []
+    for queue_id, _, manager in queues:
+        rows = manager.history_manager.iter_timeline(
+            before=_timeline_bound(state, queue_id) if state else None,
+            statuses=list_filter.statuses, name=list_filter.name, gpu=list_filter.gpu,
+            since=since, until=until, chunk_size=chunk_size,
+        )
+        streams.append(_tag_queue(rows, queue_id))
+
+    merged = heapq.merge(*streams, key=lambda row: row[:3], reverse=True)
+    rows = list(itertools.islice(merged, page_size + 1))
+
+    names = {queue_id: queue_name for queue_id, queue_name, _ in queues}
+    history = []
+    for _, queue_id, _, record in rows[:page_size]:
+        record["queue_id"] = queue_id
+        record["queue_name"] = names[queue_id]
+        history.append(project(record, fields))
+
+    next_state = None
+    if len(rows) > page_size:
+        end_time, queue_id, seq, _ = rows[page_size - 1]
+        next_state = {"t": end_time, "q": queue_id, "s": seq}
+    return {"history": history, "next_cursor": encode_cursor(next_state) if next_state else None}
+
+
+# 不影响待执行/运行中任务内容的事件（order 在增量中总是返回）
+_TASK_LIST_NEUTRAL_EVENTS = (
+    events.QUEUE_STARTED, events.QUEUE_STOPPED, events.HISTORY_CHANGED, events.TASKS_REORDERED,
+)
+
+# 改变 GPU 占用的事件（待执行任务的冲突状态可能随之变化）
+_GPU_EVENTS = (events.TASK_STARTED, events.TASK_FINISHED, events.TASK_STOPPED)
+
+# 改变执行历史的事件
+_HISTORY_EVENTS = (events.TASK_FINISHED, events.TASK_STOPPED, events.HISTORY_CHANGED)
+
+
+def _tasks_delta(manager, changes: List[Tuple[str, Optional[str]]]) -> Optional[Dict[str, Any]]:
+    """
+    根据变更记录构建任务列表增量
+
+    Returns:
+        {"pending", "running", "removed", "order"}；无法确定变化范围（批量加载等）时返回 None
+    """
+    changed = set()
+    gpu_changed = False
+    for event_type, task_id in changes:
+        if event_type in _TASK_LIST_NEUTRAL_EVENTS:
+            continue
+        if task_id is None:
+            return None
+        changed.add(task_id)
+        if event_type in _GPU_EVENTS:
+            gpu_changed = True
+
+    pending_tasks = manager.get_pending_tasks()
+    if gpu_changed:
+        changed.update(task.id for task in pending_tasks if task.gpu)
+
+    pending, running, removed = [], [], []
+    for task_id in changed:
+        task = manager.get_task(task_id)
+        if task is None:
+            removed.append(task_id)
+        elif task.status.value == "pending":
+            pending.append(_pending_task_dict(manager, task))
+        elif task.status.value == "running":
+            running.append(task.to_dict())
+        else:
+            removed.append(task_id)
+
+    return {
+        "pending": pending,
+        "running": running,
+        "removed": removed,
+        "order": [task.id for task in pending_tasks],
+    }
+
+
+def _history_delta(manager, changes: List[Tuple[str, Optional[str]]], limit: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    根据变更记录获取新增或修改的历史记录（最新在前）
+
+    Returns:
+        历史记录列表；历史被清空时返回 None
+    """
+    changed = set()
+    for event_type, task_id in changes:
+        if event_type not in _HISTORY_EVENTS:
+            continue
+        if task_id is None:
+            return None
+        changed.add(task_id)
+    return manager.history_manager.get_many(changed)[:limit]
+
+
 # ============ API 端点 ============
 
 @router.get("/tasks", response_model=TaskListResponse)
-async def get_tasks(_=Depends(require_auth)):
-    """获取所有任务"""
+async def get_tasks(request: Request, response: Response, since_version: Optional[int] = None,
+                    cursor: Optional[str] = None, page_size: Optional[int] = None,
+                    fields: Optional[str] = None, status: Optional[str] = None,
+                    name: Optional[str] = None, gpu: Optional[int] = None,
+                    _=Depends(require_auth)):
+    """
+    获取所有任务
+    
+    响应带 ETag（队列状态版本号 + 查询参数），状态未变化时返回 304。
+    运行中任务的 duration 不计入 ETag，客户端应根据 start_timestamp 计算。
+    
+    Args:
+        since_version: 增量模式：只返回此版本之后变化的任务
+            {"version", "full": false, "pending", "running", "removed", "order"}；
+            版本号无效或过旧时返回完整列表并带 "full": true
+        cursor / page_size: 分页模式：返回 {"tasks", "next_cursor", "version"}，
+            先运行中任务再待执行任务；next_cursor 为 null 表示已到末尾
+        fields: 只返回指定字段（逗号分隔，始终包含 id）
+        status / name / gpu: 按状态（逗号分隔）、名称子串、使用的 GPU 过滤
+    """
     manager = get_task_manager()
     
+    paged = cursor is not None or page_size is not None
+    
     # 如果没有加载队列，返回空列表
     if manager is None:
-        return {"pending": [], "running": []}
+        return {"tasks": [], "next_cursor": None} if paged else {"pending": [], "running": []}
+    
+    list_filter = ListFilter(status, name, gpu)
+    selected = parse_fields(fields)
+    if since_version is not None and (paged or selected is not None or list_filter.active):
+        raise HTTPException(status_code=400, detail="增量模式不支持分页、过滤和字段参数")
+    if paged:
+        page_size = check_page_size(page_size)
+    
+    # 先读取版本号再读取状态：状态只可能比版本号新，增量不会遗漏变化
+    version = manager.state_version
+    etag = version_etag("tasks", manager.queue_id, version, request.url.query)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    
+    if since_version is not None:
+        changes = manager.get_changes(since_version)
+        delta = _tasks_delta(manager, changes) if changes is not None else None
+        if delta is not None:
+            result = JSONResponse({"version": version, "full": False, **delta})
+            set_etag(result, etag)
+            return result
+    
+    if paged:
+        result = JSONResponse({**_tasks_page(manager, list_filter, selected, cursor, page_size),
+                               "version": version})
+        set_etag(result, etag)
+        return result
     
-    pending = []
-    for task in manager.get_pending_tasks():
-        task_dict = task.to_dict()
-        conflict = manager.check_gpu_conflict(task.id)
-        task_dict["can_run"] = conflict is None
-        task_dict["conflict_message"] = conflict
-        pending.append(task_dict)
+    running_tasks = manager.get_running_tasks()
+    pending = [task for task in manager.get_pending_tasks()
+               if list_filter.match("pending", task.name, task.gpu)]
+    running = [task for task in running_tasks
+               if list_filter.match("running", task.name, task.gpu)]
     
-    running = [task.to_dict() for task in manager.get_running_tasks()]
+    if since_version is not None or selected is not None:
+        result = JSONResponse({
+            "pending": [_task_item(manager, task, running_tasks, selected) for task in pending],
+            "running": [_task_item(manager, task, running_tasks, selected) for task in running],
+            "version": version,
+            **({"full": True} if since_version is not None else {}),
+        })
+        set_etag(result, etag)
+        return result
     
-    return {"pending": pending, "running": running}
+    set_etag(response, etag)
+    return {
+        "pending": [_pending_task_dict(manager, task, running_tasks) for task in pending],
+        "running": [task.to_dict() for task in running],
+        "version": version,
+    }
 
 
 @router.post("/tasks", response_model=TaskResponse)
@@ -106,10 +424,10 @@ async def create_task(task: TaskCreate, _=Depends(require_auth)):
     if not task.name or not task.command:
         raise HTTPException(status_code=400, detail="任务名称和命令不能为空")
     
-    new_task = manager.add_task(task.name, task.command, task.note)
+    new_task = manager.add_task(task.name, task.command, task.note, task.raw_log)
     
     # 持久化
-    _save_state()
+    await _save_state()
     
     result = new_task.to_dict()
     result["can_run"] = True
@@ -139,12 +457,13 @@ async def update_task(task_id: str, task: TaskUpdate, _=Depends(require_auth)):
     manager = get_task_manager()
     
     try:
-        updated = manager.update_task(task_id, task.name, task.command, task.note)
+        # 更新后会追加写待执行任务的 journal 文件
+        updated = await run_blocking(manager.update_task, task_id, task.name, task.command, task.note)
         if not updated:
             raise HTTPException(status_code=404, detail="任务不存在")
         
         # 持久化
-        _save_state()
+        await _save_state()
         
         result = updated.to_dict()
         conflict = manager.check_gpu_conflict(task_id)
@@ -166,7 +485,7 @@ async def delete_task(task_id: str, _=Depends(require_auth)):
             raise HTTPException(status_code=404, detail="任务不存在")
         
         # 持久化
-        _save_state()
+        await _save_state()
         
         return {"success": True, "message": "任务已删除"}
     except ValueError as e:
@@ -183,22 +502,121 @@ async def reorder_tasks(reorder: TaskReorder, _=Depends(require_auth)):
         raise HTTPException(status_code=400, detail="无效的任务顺序")
     
     # 持久化
-    _save_state()
+    await _save_state()
     
     return {"success": True, "message": "任务顺序已更新"}
 
 
 @router.get("/history")
-async def get_history(limit: int = 50, _=Depends(require_auth)):
-    """获取执行历史"""
+async def get_history(request: Request, response: Response, limit: int = 50,
+                      since_version: Optional[int] = None,
+                      cursor: Optional[str] = None, page_size: Optional[int] = None,
+                      fields: Optional[str] = None, status: Optional[str] = None,
+                      name: Optional[str] = None, gpu: Optional[int] = None,
+                      _=Depends(require_auth)):
+    """
+    获取执行历史
+    
+    响应带 ETag（队列状态版本号 + 查询参数），状态未变化时返回 304。
+    
+    Args:
+        limit: 最大返回数量
+        since_version: 增量模式：只返回此版本之后新增或修改的记录（"full": false），
+            客户端按 id 合并后截取前 limit 条；历史被清空、版本号无效或过旧时返回完整列表（"full": true）
+        cursor / page_size: 分页模式：返回 {"history", "next_cursor", "version"}（最新在前），
+            用 next_cursor 向更早的记录翻页，为 null 表示已到末尾
+        fields: 只返回指定字段（逗号分隔，始终包含 id）
+        status / name / gpu: 按状态（逗号分隔）、名称子串、使用的 GPU 过滤
+    """
     manager = get_task_manager()
     
+    paged = cursor is not None or page_size is not None
+    
     # 如果没有加载队列，返回空列表
     if manager is None:
-        return {"history": []}
+        return {"history": [], "next_cursor": None} if paged else {"history": []}
+    
+    list_filter = ListFilter(status, name, gpu)
+    selected = parse_fields(fields)
+    if since_version is not None and (paged or selected is not None or list_filter.active):
+        raise HTTPException(status_code=400, detail="增量模式不支持分页、过滤和字段参数")
+    if paged:
+        page_size = check_page_size(page_size)
+    
+    version = manager.state_version
+    etag = version_etag("history", manager.queue_id, version, request.url.query)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
+    if since_version is not None:
+        changes = manager.get_changes(since_version)
+        delta = _history_delta(manager, changes, limit) if changes is not None else None
+        if delta is not None:
+            return {"version": version, "full": False, "history": delta,
+                    "count": manager.history_manager.count()}
+        return {"version": version, "full": True, "history": manager.get_history(limit)}
+    
+    if paged:
+        return {**_history_page(manager, list_filter, selected, cursor, page_size), "version": version}
+    
+    if list_filter.active or selected is not None:
+        rows = manager.history_manager.query(limit=limit, statuses=list_filter.statuses,
+                                             name=list_filter.name, gpu=list_filter.gpu)
+        return {"history": [project(record, selected) for _, record in rows], "version": version}
     
     history = manager.get_history(limit)
-    return {"history": history}  # 已经是 dict 列表
+    return {"history": history, "version": version}  # 已经是 dict 列表
+
+
+@router.get("/history/all")
+async def get_all_history(request: Request, response: Response,
+                          cursor: Optional[str] = None, page_size: Optional[int] = None,
+                          fields: Optional[str] = None, status: Optional[str] = None,
+                          name: Optional[str] = None, gpu: Optional[int] = None,
+                          queue: Optional[str] = None, hours: Optional[float] = None,
+                          since: Optional[str] = None, until: Optional[str] = None,
+                          _=Depends(require_auth)):
+    """
+    全部队列的执行历史时间线（按结束时间归并，最新在前）
+
+    记录额外带 queue_id / queue_name 字段。响应带 ETag（各队列状态版本号 + 查询参数）。
+
+    Args:
+        cursor / page_size: 游标分页，用 next_cursor 向更早的记录翻页，为 null 表示已到末尾
+        fields: 只返回指定字段（逗号分隔，始终包含 id）
+        status / name / gpu: 按状态（逗号分隔）、名称子串、使用的 GPU 过滤
+        queue: 只包含这些队列（逗号分隔的队列 ID，默认全部）
+        hours: 最近 N 小时结束的记录
+        since / until: 结束时间范围（ISO 格式，含 since 不含 until）
+    """
+    queue_manager = get_queue_manager()
+    page_size = check_page_size(page_size)
+    list_filter = ListFilter(status, name, gpu)
+    selected = parse_fields(fields)
+
+    since = parse_time(since, "since")
+    until = parse_time(until, "until")
+    if hours is not None:
+        if since is not None:
+            raise HTTPException(status_code=400, detail="hours 和 since 不能同时指定")
+        if hours <= 0:
+            raise HTTPException(status_code=400, detail="hours 必须大于 0")
+        since = (datetime.now() - timedelta(hours=hours)).isoformat()
+
+    queues = select_queues(queue_manager, queue)
+
+    # hours 参数随时间变化，不生成 ETag
+    if hours is None:
+        etag = version_etag(
+            "history-all", request.url.query,
+            *(f"{queue_id}:{manager.state_version}" for queue_id, _, manager in queues)
+        )
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+
+    return await run_blocking(_timeline_page, queues, list_filter, selected, cursor, page_size, since, until)
 
 
 @router.delete("/history")
@@ -207,10 +625,10 @@ async def clear_history(_=Depends(require_auth)):
     manager = get_task_manager()
     if manager is None:
         return {"success": True, "message": "无历史记录"}
-    manager.clear_history()
+    await run_blocking(manager.clear_history)
     
     # 持久化
-    _save_state()
+    await _save_state()
     
     return {"success": True, "message": "历史已清空"}
 
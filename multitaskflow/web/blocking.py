@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+阻塞操作线程池
+
+API 处理函数都是 async def，在事件循环中直接调用阻塞操作（停止任务时等待进程退出、
+启动子进程、读取日志文件、写入 YAML 和工作空间文件）会让所有 WebSocket 和 API 请求停顿。
+这些操作通过 run_blocking() 交给有界线程池执行，事件循环只等待结果。
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set
+
+logger = logging.getLogger("Blocking")
+
+
+# 线程池大小：同时执行的阻塞操作数量上限（其余排队等待）
+MAX_WORKERS = 8
+
+
+class BlockingExecutor:
+    """有界线程池（首次使用时创建）"""
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 已提交但未完成的操作（关闭时取消尚未开始的）
+        self._pending: Set[Future] = set()
+
+        # 统计信息
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.max_active = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="Blocking"
+                )
+            return self._executor
+
+    def _call(self, func: Callable[..., Any]) -> Any:
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在线程池中执行阻塞函数并等待结果（异常原样抛出）
+
+        Args:
+            func: 阻塞函数
+            *args, **kwargs: 函数参数
+
+        Returns:
+            函数返回值
+        """
+        call = functools.partial(func, *args, **kwargs)
+        future = self._get_executor().submit(self._call, call)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._discard)
+        self.submitted += 1
+        try:
+            result = await asyncio.wrap_future(future)
+        except BaseException:
+            self.failed += 1
+            raise
+        self.completed += 1
+        return result
+
+    def _discard(self, future: Future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "active": self.active,
+            "queued": max(self.submitted - self.completed - self.failed - self.active, 0),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "max_active": self.max_active,
+        }
+
+    def shutdown(self):
+        """关闭线程池（不等待执行中的操作）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            pending, self._pending = self._pending, set()
+        if executor is not None:
+            # cancel_futures 参数需要 Python 3.9，这里自行取消排队中的操作
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+# 全局阻塞操作线程池
+blocking_executor = BlockingExecutor()
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在全局线程池中执行阻塞函数（见 BlockingExecutor.run）"""
+    return await blocking_executor.run(func, *args, **kwargs)
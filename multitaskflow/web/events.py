@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+内部事件总线
+
+TaskManager 和 QueueManager 在状态变化时发布事件（任务增删改、启动、结束、
+队列启停等），状态推送等模块订阅事件，不再轮询。
+
+发布方可以在任意线程（API 处理、任务监控线程、队列线程）中调用 publish()，
+订阅方回调通过 loop.call_soon_threadsafe 在其事件循环中执行。
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("EventBus")
+
+
+# 事件类型
+TASK_ADDED = "task_added"
+TASK_UPDATED = "task_updated"
+TASK_DELETED = "task_deleted"
+TASKS_LOADED = "tasks_loaded"
+TASKS_REORDERED = "tasks_reordered"
+TASK_STARTED = "task_started"
+TASK_FINISHED = "task_finished"
+TASK_STOPPED = "task_stopped"
+QUEUE_STARTED = "queue_started"
+QUEUE_STOPPED = "queue_stopped"
+QUEUE_ADDED = "queue_added"
+QUEUE_REMOVED = "queue_removed"
+HISTORY_CHANGED = "history_changed"
+
+
+@dataclass
+class Event:
+    """状态变化事件"""
+    type: str
+    queue_id: Optional[str] = None
+    task_id: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    ts: float = field(default_factory=time.time)
+
+
+class EventBus:
+    """线程安全的发布/订阅总线"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[Callable[[Event], None], Optional[asyncio.AbstractEventLoop]]] = []
+
+    def subscribe(self, callback: Callable[[Event], None],
+                  loop: Optional[asyncio.AbstractEventLoop] = None):
+        """
+        订阅事件
+
+        Args:
+            callback: 回调函数，不能阻塞
+            loop: 回调所在的事件循环；为 None 时在发布线程中同步调用
+        """
+        with self._lock:
+            self._subscribers.append((callback, loop))
+
+    def unsubscribe(self, callback: Callable[[Event], None]):
+        """取消订阅"""
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[0] is not callback]
+
+    def publish(self, event_type: str, queue_id: str = None, task_id: str = None, **data):
+        """
+        发布事件
+
+        Args:
+            event_type: 事件类型
+            queue_id: 所属队列 ID
+            task_id: 相关任务 ID
+            **data: 附加数据
+        """
+        event = Event(event_type, queue_id, task_id, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback, loop in subscribers:
+            try:
+                if loop is None:
+                    callback(event)
+                else:
+                    loop.call_soon_threadsafe(callback, event)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+            except Exception as e:
+                logger.warning(f"事件回调失败 ({event_type}): {e}")
+
+
+# 全局事件总线
+event_bus = EventBus()
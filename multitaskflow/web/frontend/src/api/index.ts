@@ -9,6 +9,7 @@ export interface Task {
     status: 'pending' | 'running' | 'completed' | 'failed' | 'stopped';
     gpu?: string;
     start_time?: string;
+    start_timestamp?: number;
     end_time?: string;
     duration?: number;
     log_file?: string;
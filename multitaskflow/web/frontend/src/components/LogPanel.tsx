@@ -172,53 +172,81 @@ export function LogPanel({ taskId, onClose, onSelectLog }: LogPanelProps) {
         } else if (isRunning) {
             // Real-time log via WebSocket
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            const wsUrl = `${protocol}//${window.location.host}/ws/logs/${taskId}`;
-
-            const ws = new WebSocket(wsUrl);
-            wsRef.current = ws;
-            let wsConnected = false;
+            // 续传游标：断线重连时只获取缺失的内容
+            let offset: number | null = null;
+            let ended = false;
+            let retryTimer: number | null = null;
+
+            const connect = () => {
+                const query = offset !== null ? `?since=${offset}` : '';
+                const wsUrl = `${protocol}//${window.location.host}/ws/logs/${taskId}${query}`;
+
+                const ws = new WebSocket(wsUrl);
+                wsRef.current = ws;
+                let wsConnected = false;
+
+                ws.onopen = () => {
+                    if (cancelled) {
+                        ws.close();
+                        return;
+                    }
+                    wsConnected = true;
+                };
 
-            ws.onopen = () => {
-                if (cancelled) {
-                    ws.close();
-                    return;
-                }
-                wsConnected = true;
-                setLogContent('');
-            };
+                ws.onmessage = (event) => {
+                    if (cancelled) return;
+                    const data = JSON.parse(event.data);
+                    if (data.type === 'init') {
+                        // 非续传连接会重新发送历史日志
+                        if (!data.resumed) {
+                            setLogContent('');
+                        }
+                        // 初始化消息包含日志文件路径
+                        if (data.log_file) {
+                            setLogPath(data.log_file);
+                        }
+                    } else if (data.type === 'log') {
+                        appendLogContent(data.content);
+                        if (typeof data.offset === 'number') {
+                            offset = data.offset;
+                        }
+                    } else if (data.type === 'end') {
+                        ended = true;
+                        appendLogContent(`\n\n✅ ${data.message}`);
+                    } else if (data.type === 'info') {
+                        setLogContent(data.message);
+                    } else if (data.type === 'error') {
+                        ended = true;
+                        setLogContent(`⚠️ ${data.message}`);
+                    }
+                };
 
-            ws.onmessage = (event) => {
-                if (cancelled) return;
-                const data = JSON.parse(event.data);
-                if (data.type === 'init') {
-                    // 初始化消息包含日志文件路径
-                    if (data.log_file) {
-                        setLogPath(data.log_file);
+                ws.onerror = () => {
+                    if (cancelled) return;
+                    if (!wsConnected && offset === null) {
+                        setLogContent('WebSocket 连接失败');
                     }
-                } else if (data.type === 'log') {
-                    appendLogContent(data.content);
-                } else if (data.type === 'end') {
-                    appendLogContent(`\n\n✅ ${data.message}`);
-                } else if (data.type === 'info') {
-                    setLogContent(data.message);
-                } else if (data.type === 'error') {
-                    setLogContent(`⚠️ ${data.message}`);
-                }
-            };
+                };
 
-            ws.onerror = () => {
-                if (cancelled) return;
-                if (!wsConnected) {
-                    setLogContent('WebSocket 连接失败');
-                }
+                ws.onclose = () => {
+                    if (wsRef.current === ws) {
+                        wsRef.current = null;
+                    }
+                    // 意外断开（网络波动等）时自动重连并续传
+                    if (!cancelled && !ended && (wsConnected || offset !== null)) {
+                        retryTimer = window.setTimeout(connect, 2000);
+                    }
+                };
             };
 
-            ws.onclose = () => {
-                wsRef.current = null;
-            };
+            connect();
 
             return () => {
                 cancelled = true;
+                if (retryTimer) {
+                    clearTimeout(retryTimer);
+                    retryTimer = null;
+                }
                 if (wsRef.current) {
                     wsRef.current.close();
                     wsRef.current = null;
@@ -311,6 +339,14 @@ export function LogPanel({ taskId, onClose, onSelectLog }: LogPanelProps) {
                         title="Linux 命令"
                         disabled={!logPath}
                     >🐧</button>
+                    {!isMainLog && (
+                        <a
+                            href={`/api/logs/${taskId}/raw`}
+                            download
+                            className="px-2 py-1 text-xs bg-slate-700 hover:bg-slate-600 rounded text-slate-300"
+                            title="下载原始日志"
+                        >⬇</a>
+                    )}
                     <button
                         onClick={onClose}
                         className="px-2 py-1 text-xs bg-slate-700 hover:bg-slate-600 rounded text-slate-300"
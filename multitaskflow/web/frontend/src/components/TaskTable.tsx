@@ -1,4 +1,4 @@
-import { useState, useRef } from 'react';
+import { useState, useRef, useEffect } from 'react';
 import { useTaskStore } from '../stores/taskStore';
 import { type Task } from '../api';
 import { type FilterType } from './FilterTabs';
@@ -45,6 +45,23 @@ function formatDuration(seconds?: number): string {
     return `${Math.floor(seconds / 3600)}h`;
 }
 
+// 运行中任务的时长由客户端根据启动时间计算（任务列表未变化时接口返回 304，duration 不会更新）
+function useElapsed(task: Task): number | undefined {
+    const isRunning = task.status === 'running';
+    const [now, setNow] = useState(() => Date.now());
+
+    useEffect(() => {
+        if (!isRunning) return;
+        const timer = window.setInterval(() => setNow(Date.now()), 1000);
+        return () => clearInterval(timer);
+    }, [isRunning]);
+
+    if (isRunning && task.start_timestamp) {
+        return Math.max(0, now / 1000 - task.start_timestamp);
+    }
+    return task.duration;
+}
+
 // 简化列：移除状态列
 const COLUMNS = [
     { key: 'order', label: '#', minWidth: 3, defaultWidth: 4 },
@@ -70,7 +87,7 @@ function TaskRow({ task, index, onViewLog, onViewDetail, columnWidths }: TaskRow
     const isRunning = task.status === 'running';
     const isPending = task.status === 'pending';
     const hasLog = !!task.log_file || isRunning;
-    const duration = formatDuration(task.duration);
+    const duration = formatDuration(useElapsed(task));
 
     const rowBg = isRunning
         ? 'bg-blue-500/10'
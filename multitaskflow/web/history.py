@@ -4,136 +4,591 @@
 """
 执行历史持久化模块
 
-将任务执行历史保存到 JSON 文件，支持持久化和恢复。
+将任务执行历史保存到 SQLite（每个队列一个 ``logs/.history_<yaml名>.db``，WAL 模式）：
+- 追加一条记录只插入一行，不再重写整个文件，也不限制保存数量
+- 任务 ID 唯一索引，按 ID 查找、修改备注不随历史增长而变慢
+- 状态、结束时间索引支持按状态 / 时间范围查询；seq（插入顺序）用于分页
+- 旧版 ``.history.json`` 在首次创建数据库时自动导入（只导入一次，之后重命名为 ``.history.json.migrated``）
+- 每次 add() 同时增量更新统计聚合表（见 analytics.py），统计查询不扫描历史记录
 """
 
 import json
+import sqlite3
 import logging
+import threading
 from pathlib import Path
-from datetime import datetime
-from typing import List, Dict, Any, Optional
-from dataclasses import asdict
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+from .analytics import command_template, duration_bin, record_day, phase_latencies
+from .metrics import persist_seconds
 
 logger = logging.getLogger("History")
 
+# 历史记录保存的字段
+RECORD_FIELDS = (
+    'id', 'name', 'command', 'status', 'gpu', 'start_time', 'end_time',
+    'duration', 'error_message', 'log_file', 'note', 'phases', 'raw_log',
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    name TEXT,
+    status TEXT,
+    gpu TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_history_id ON history(id);
+CREATE INDEX IF NOT EXISTS idx_history_status ON history(status, seq);
+CREATE INDEX IF NOT EXISTS idx_history_end_time ON history(end_time);
+CREATE TABLE IF NOT EXISTS history_stats (
+    day TEXT NOT NULL,
+    name TEXT NOT NULL,
+    template TEXT NOT NULL,
+    gpu TEXT NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    timed INTEGER NOT NULL,
+    duration_sum REAL NOT NULL,
+    duration_min REAL,
+    duration_max REAL,
+    PRIMARY KEY (day, name, template, gpu, status)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS history_durations (
+    day TEXT NOT NULL,
+    name TEXT NOT NULL,
+    template TEXT NOT NULL,
+    gpu TEXT NOT NULL,
+    status TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, name, template, gpu, status, bin)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS history_latency (
+    day TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    duration_sum REAL NOT NULL,
+    duration_min REAL NOT NULL,
+    duration_max REAL NOT NULL,
+    PRIMARY KEY (day, segment)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS history_latency_bins (
+    day TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, segment, bin)
+) WITHOUT ROWID;
+"""
+
+# 数据库结构版本（PRAGMA user_version）；低于该版本时升级（见 HistoryManager._upgrade）
+# 1: 按任务统计  2: 生命周期延迟统计  3: 记录保存 raw_log
+SCHEMA_VERSION = 3
+
+_STATS_KEY = ("day", "name", "template", "gpu", "status")
+
+# 统计聚合表（清空历史或重建统计时一并清空）
+_STATS_TABLES = ("history_stats", "history_durations", "history_latency", "history_latency_bins")
+
+# 空闲页超过总页数的该比例时 VACUUM
+VACUUM_FREE_RATIO = 0.25
+
+
+def _gpu_key(gpu: Optional[List[int]]) -> Optional[str]:
+    """GPU 列表的索引形式（",0,1,"），便于按单个 GPU 过滤"""
+    if not gpu:
+        return None
+    return "," + ",".join(str(g) for g in gpu) + ","
+
 
 class HistoryManager:
     """执行历史管理器"""
-    
-    def __init__(self, history_file: str, max_items: int = 100):
+
+    def __init__(self, history_file: str, max_items: Optional[int] = None, legacy_file: str = None):
         """
         初始化历史管理器
-        
+
         Args:
-            history_file: 历史记录文件路径
-            max_items: 最大保存条目数
+            history_file: 历史数据库路径（``.json`` 后缀时数据库为同名 ``.db``，并从该文件导入旧历史）
+            max_items: 最大保存条目数（None 表示不限制；超出后删除的记录仍计入统计）
+            legacy_file: 旧版 JSON 历史文件，数据库首次创建时导入
         """
         self.history_file = Path(history_file)
+        if self.history_file.suffix == ".json":
+            legacy_file = legacy_file or str(self.history_file)
+            self.db_file = self.history_file.with_suffix(".db")
+        else:
+            self.db_file = self.history_file
+        self.legacy_file = Path(legacy_file) if legacy_file else None
         self.max_items = max_items
-        self.items: List[Dict[str, Any]] = []
-        
+        # 停止任务和任务监控线程可能同时写入历史，串行化数据库访问
+        self._lock = threading.RLock()
+        self._count = 0
+
         # 确保目录存在
-        self.history_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        # 加载历史
-        self._load()
-    
-    def _load(self):
-        """从文件加载历史"""
-        if not self.history_file.exists():
-            self.items = []
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+
+        # 打开数据库（首次创建时导入旧版 JSON 历史）
+        self._open()
+
+    # ============ 数据库 ============
+
+    def _open(self):
+        """打开数据库，损坏时移到一旁并重建"""
+        created = not self.db_file.exists()
+        try:
+            self._conn = self._connect()
+        except sqlite3.DatabaseError as e:
+            corrupt = self.db_file.with_name(self.db_file.name + ".corrupt")
+            logger.error(f"历史数据库损坏，已移至 {corrupt}: {e}")
+            self.db_file.replace(corrupt)
+            created = True
+            self._conn = self._connect()
+
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            self._upgrade(version)
+        if created and self.legacy_file is not None:
+            self._import_legacy()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        self.compact()
+        logger.info(f"已加载 {self._count} 条历史记录")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _import_legacy(self):
+        """
+        导入旧版 .history.json（只在数据库首次创建时执行）
+
+        旧版同一目录下的所有 YAML 共用一个历史文件，记录中没有所属队列的标记，
+        因此只导入到第一个创建的数据库，导入后把原文件重命名为 ``.migrated``，
+        之后创建的数据库（同目录的其他队列）不会重复导入。
+        """
+        if not self.legacy_file.exists():
             return
-        
         try:
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.items = data.get('history', [])
-                logger.info(f"已加载 {len(self.items)} 条历史记录")
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                items = json.load(f).get('history', [])
         except Exception as e:
-            logger.error(f"加载历史记录失败: {e}")
-            self.items = []
-    
-    def _save(self):
-        """保存历史到文件"""
+            logger.error(f"读取旧版历史记录失败: {e}")
+            return
+        with self._conn:
+            imported = self._insert_many(
+                {**item, 'raw_log': bool(item.get('raw_log', False))} for item in items
+            )
+        logger.info(f"已从 {self.legacy_file.name} 导入 {imported} 条历史记录")
+        migrated = self.legacy_file.with_name(self.legacy_file.name + ".migrated")
         try:
-            data = {
-                'updated_at': datetime.now().isoformat(),
-                'history': self.items[-self.max_items:]  # 只保留最新的
-            }
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存历史记录失败: {e}")
-    
+            self.legacy_file.replace(migrated)
+        except OSError as e:
+            logger.warning(f"重命名旧版历史文件失败，其他新建的数据库可能重复导入: {e}")
+
+    def _insert_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        """插入记录（已存在的任务 ID 忽略），返回插入数量"""
+        inserted = 0
+        for record in records:
+            if not record.get('id'):
+                continue
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO history (id, name, status, gpu, start_time, end_time, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (record['id'], record.get('name'), record.get('status'), _gpu_key(record.get('gpu')),
+                 record.get('start_time'), record.get('end_time'), json.dumps(record, ensure_ascii=False)),
+            )
+            if cursor.rowcount:
+                self._add_stats(record)
+                inserted += 1
+        return inserted
+
+    def _add_stats(self, record: Dict[str, Any]):
+        """把一条新记录计入统计聚合（与插入记录在同一事务中）"""
+        key = (record_day(record), record.get('name') or "", command_template(record.get('command')),
+               _gpu_key(record.get('gpu')) or "", record.get('status') or "")
+        duration = record.get('duration')
+        timed = isinstance(duration, (int, float)) and duration >= 0
+        self._conn.execute(
+            "INSERT INTO history_stats (day, name, template, gpu, status, count, timed, "
+            "duration_sum, duration_min, duration_max) VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?) "
+            "ON CONFLICT (day, name, template, gpu, status) DO UPDATE SET "
+            "count = count + 1, timed = timed + excluded.timed, "
+            "duration_sum = duration_sum + excluded.duration_sum, "
+            "duration_min = min(coalesce(duration_min, excluded.duration_min), "
+            "coalesce(excluded.duration_min, duration_min)), "
+            "duration_max = max(coalesce(duration_max, excluded.duration_max), "
+            "coalesce(excluded.duration_max, duration_max))",
+            key + (int(timed), duration if timed else 0.0,
+                   duration if timed else None, duration if timed else None),
+        )
+        if timed:
+            self._conn.execute(
+                "INSERT INTO history_durations (day, name, template, gpu, status, bin, count) "
+                "VALUES (?, ?, ?, ?, ?, ?, 1) "
+                "ON CONFLICT (day, name, template, gpu, status, bin) DO UPDATE SET count = count + 1",
+                key + (duration_bin(duration),),
+            )
+        for segment, seconds in phase_latencies(record.get('phases')).items():
+            self._conn.execute(
+                "INSERT INTO history_latency (day, segment, count, duration_sum, duration_min, duration_max) "
+                "VALUES (?, ?, 1, ?, ?, ?) "
+                "ON CONFLICT (day, segment) DO UPDATE SET "
+                "count = count + 1, duration_sum = duration_sum + excluded.duration_sum, "
+                "duration_min = min(duration_min, excluded.duration_min), "
+                "duration_max = max(duration_max, excluded.duration_max)",
+                (key[0], segment, seconds, seconds, seconds),
+            )
+            self._conn.execute(
+                "INSERT INTO history_latency_bins (day, segment, bin, count) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (day, segment, bin) DO UPDATE SET count = count + 1",
+                (key[0], segment, duration_bin(seconds)),
+            )
+
+    def _upgrade(self, version: int):
+        """升级旧版数据库（新建的数据库同样执行，此时没有记录）"""
+        if version < 3:
+            # 旧记录没有 raw_log 字段，按未设置处理
+            with self._conn:
+                for seq, data in self._conn.execute("SELECT seq, data FROM history").fetchall():
+                    record = json.loads(data)
+                    if 'raw_log' not in record:
+                        record['raw_log'] = False
+                        self._conn.execute("UPDATE history SET data = ? WHERE seq = ?",
+                                           (json.dumps(record, ensure_ascii=False), seq))
+        if version < 2:
+            self._rebuild_stats()
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _rebuild_stats(self):
+        """从历史记录重建统计聚合（旧版数据库升级时执行一次）"""
+        with self._conn:
+            for table in _STATS_TABLES:
+                self._conn.execute(f"DELETE FROM {table}")
+            for (data,) in self._conn.execute("SELECT data FROM history ORDER BY seq").fetchall():
+                self._add_stats(json.loads(data))
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def compact(self):
+        """合并 WAL；空闲页较多（如清空历史后）时 VACUUM 回收空间"""
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                pages = self._conn.execute("PRAGMA page_count").fetchone()[0]
+                free = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if pages and free / pages > VACUUM_FREE_RATIO:
+                    self._conn.execute("VACUUM")
+                    # WAL 模式下 VACUUM 的结果在检查点之后才写回主文件
+                    self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                logger.warning(f"压缩历史数据库失败: {e}")
+
+    # ============ 写入 ============
+
     def add(self, task_data: Dict[str, Any]):
         """
         添加历史记录
-        
+
+        同一任务 ID 只记录一次（停止任务和监控线程可能先后为同一任务写入历史）。
+
         Args:
             task_data: 任务数据字典
         """
         # 清理不需要的字段
-        record = {
-            'id': task_data.get('id'),
-            'name': task_data.get('name'),
-            'command': task_data.get('command'),
-            'status': task_data.get('status'),
-            'gpu': task_data.get('gpu'),
-            'start_time': task_data.get('start_time'),
-            'end_time': task_data.get('end_time'),
-            'duration': task_data.get('duration'),
-            'error_message': task_data.get('error_message'),
-            'log_file': task_data.get('log_file'),
-            'note': task_data.get('note'),
-        }
-        
-        self.items.append(record)
-        
-        # 限制数量
-        if len(self.items) > self.max_items:
-            self.items = self.items[-self.max_items:]
-        
-        # 保存
-        self._save()
-        logger.info(f"历史记录已添加: {record['name']}")
-    
+        record = {key: task_data.get(key) for key in RECORD_FIELDS}
+
+        with self._lock:
+            try:
+                with persist_seconds.time(store="history", op="insert"), self._conn:
+                    inserted = self._insert_many([record])
+                    self._count += inserted
+                    # 限制数量
+                    if self.max_items and self._count > self.max_items:
+                        self._conn.execute(
+                            "DELETE FROM history WHERE seq <= "
+                            "(SELECT seq FROM history ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                            (self.max_items,),
+                        )
+                        self._count = self.max_items
+            except sqlite3.Error as e:
+                logger.error(f"保存历史记录失败: {e}")
+                return
+        if inserted:
+            logger.info(f"历史记录已添加: {record['name']}")
+
+    def update_note(self, task_id: str, note: str) -> bool:
+        """
+        更新历史记录中任务的备注
+
+        Args:
+            task_id: 任务ID
+            note: 新备注
+
+        Returns:
+            是否成功更新
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT seq, data FROM history WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                return False
+            record = json.loads(row[1])
+            record['note'] = note
+            with self._conn:
+                self._conn.execute("UPDATE history SET data = ? WHERE seq = ?",
+                                   (json.dumps(record, ensure_ascii=False), row[0]))
+        logger.info(f"更新历史备注: {record.get('name')} (ID: {task_id})")
+        return True
+
+    def clear(self):
+        """清空历史记录"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM history")
+                for table in _STATS_TABLES:
+                    self._conn.execute(f"DELETE FROM {table}")
+            self._count = 0
+            self.compact()
+        logger.info("历史记录已清空")
+
+    # ============ 查询 ============
+
     def get_all(self, limit: int = 50) -> List[Dict[str, Any]]:
         """
         获取历史记录
-        
+
         Args:
             limit: 返回数量限制
-        
+
         Returns:
             历史记录列表（最新在前）
         """
-        return list(reversed(self.items[-limit:]))
-    
-    def clear(self):
-        """清空历史记录"""
-        self.items = []
-        self._save()
-        logger.info("历史记录已清空")
-    
-    def count(self) -> int:
-        """获取历史记录数量"""
-        return len(self.items)
-    
-    def update_note(self, task_id: str, note: str) -> bool:
+        return [record for _, record in self.query(limit=limit)]
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """按任务 ID 获取历史记录"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM history WHERE id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, task_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """按任务 ID 批量获取历史记录（最新在前，不存在的 ID 忽略）"""
+        task_ids = list(task_ids)
+        rows = []
+        with self._lock:
+            # 分批查询，避免超出 SQLite 参数数量限制
+            for i in range(0, len(task_ids), 500):
+                batch = task_ids[i:i + 500]
+                rows.extend(self._conn.execute(
+                    f"SELECT seq, data FROM history WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return [json.loads(data) for _, data in rows]
+
+    def query(self, limit: Optional[int] = None, before_seq: Optional[int] = None,
+              statuses: Optional[Iterable[str]] = None, name: Optional[str] = None,
+              gpu: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None,
+              newest_first: bool = True) -> List[Tuple[int, Dict[str, Any]]]:
         """
-        更新历史记录中任务的备注
-        
+        按条件查询历史记录
+
         Args:
-            task_id: 任务ID
-            note: 新备注
-        
+            limit: 最大返回数量（None 表示不限制）
+            before_seq: 只返回 seq 小于该值的记录（倒序分页游标）
+            statuses: 状态集合
+            name: 名称子串（不区分大小写）
+            gpu: 使用了该 GPU 的记录
+            since / until: 结束时间范围（ISO 格式字符串，含 since 不含 until）
+            newest_first: 是否按插入顺序倒序
+
         Returns:
-            是否成功更新
+            [(seq, 记录)] 列表
         """
-        for item in self.items:
-            if item.get('id') == task_id:
-                item['note'] = note
-                self._save()
-                logger.info(f"更新历史备注: {item['name']} (ID: {task_id})")
-                return True
-        return False
+        conditions, params = self._conditions(statuses, name, gpu, since, until)
+        if before_seq is not None:
+            conditions.append("seq < ?")
+            params.append(before_seq)
+
+        sql = "SELECT seq, data FROM history"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY seq DESC" if newest_first else " ORDER BY seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(max(limit, 0))
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(seq, json.loads(data)) for seq, data in rows]
+
+    def iter_timeline(self, before: Optional[Tuple[str, int]] = None,
+                      statuses: Optional[Iterable[str]] = None, name: Optional[str] = None,
+                      gpu: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None,
+                      chunk_size: int = 200) -> Iterator[Tuple[str, int, Dict[str, Any]]]:
+        """
+        按结束时间倒序逐批读取历史记录（用于跨队列归并）
+
+        每批最多 chunk_size 条，按 (end_time, seq) 定位下一批，批与批之间不持有锁；
+        调用方只取前几条时只会读取第一批。没有结束时间的记录不包含在内。
+
+        Args:
+            before: 只返回 (end_time, seq) 小于该值的记录
+            其余参数同 query()
+
+        Yields:
+            (end_time, seq, 记录)
+        """
+        conditions, params = self._conditions(statuses, name, gpu, since, until)
+        conditions.append("end_time IS NOT NULL")
+        while True:
+            sql_conditions, sql_params = list(conditions), list(params)
+            if before is not None:
+                # 先按 end_time 范围走索引，再排除同一时间上已返回的记录
+                sql_conditions.append("end_time <= ? AND (end_time < ? OR seq < ?)")
+                sql_params.extend((before[0], before[0], before[1]))
+            sql = ("SELECT end_time, seq, data FROM history WHERE " + " AND ".join(sql_conditions) +
+                   " ORDER BY end_time DESC, seq DESC LIMIT ?")
+            sql_params.append(chunk_size)
+            with self._lock:
+                rows = self._conn.execute(sql, sql_params).fetchall()
+            for end_time, seq, data in rows:
+                yield end_time, seq, json.loads(data)
+            if len(rows) < chunk_size:
+                return
+            before = (rows[-1][0], rows[-1][1])
+
+    @staticmethod
+    def _conditions(statuses: Optional[Iterable[str]], name: Optional[str], gpu: Optional[int],
+                    since: Optional[str], until: Optional[str]) -> Tuple[List[str], List[Any]]:
+        """构建过滤条件（WHERE 子句片段和参数）"""
+        conditions, params = [], []
+        if statuses is not None:
+            statuses = list(statuses)
+            conditions.append(f"status IN ({','.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if name:
+            conditions.append("instr(lower(name), ?) > 0")
+            params.append(name.lower())
+        if gpu is not None:
+            conditions.append("instr(gpu, ?) > 0")
+            params.append(f",{gpu},")
+        if since is not None:
+            conditions.append("end_time >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("end_time < ?")
+            params.append(until)
+        return conditions, params
+
+    def aggregates(self, since: Optional[str] = None, until: Optional[str] = None,
+                   name: Optional[str] = None, statuses: Optional[Iterable[str]] = None,
+                   gpu: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        查询统计聚合行（供 analytics.summarize() 合并）
+
+        Args:
+            since / until: 日期范围（YYYY-MM-DD，含 since 不含 until）
+            name: 任务名称；含 * ? [ 时按通配符匹配（区分大小写），否则按子串匹配（不区分大小写）
+            statuses: 状态集合
+            gpu: 使用了该 GPU 的记录
+
+        Returns:
+            [{"day", "name", "template", "gpu", "status", "count", "timed",
+              "duration_sum", "duration_min", "duration_max", "bins": {分箱: 数量}}]
+        """
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("day >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("day < ?")
+            params.append(until)
+        if name:
+            if any(c in name for c in "*?["):
+                conditions.append("name GLOB ?")
+                params.append(name)
+            else:
+                conditions.append("instr(lower(name), ?) > 0")
+                params.append(name.lower())
+        if statuses is not None:
+            statuses = list(statuses)
+            conditions.append(f"status IN ({','.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if gpu is not None:
+            conditions.append("instr(gpu, ?) > 0")
+            params.append(f",{gpu},")
+        where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+
+        with self._lock:
+            stats = self._conn.execute(
+                "SELECT day, name, template, gpu, status, count, timed, duration_sum, duration_min, duration_max "
+                "FROM history_stats" + where, params
+            ).fetchall()
+            durations = self._conn.execute(
+                "SELECT day, name, template, gpu, status, bin, count FROM history_durations" + where, params
+            ).fetchall()
+
+        rows: Dict[Tuple, Dict[str, Any]] = {}
+        for row in stats:
+            item = dict(zip(_STATS_KEY + ("count", "timed", "duration_sum", "duration_min", "duration_max"), row))
+            item["bins"] = {}
+            rows[row[:5]] = item
+        for row in durations:
+            item = rows.get(row[:5])
+            if item is not None:
+                item["bins"][row[5]] = row[6]
+        return list(rows.values())
+
+    def latency_aggregates(self, since: Optional[str] = None,
+                           until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        查询生命周期延迟聚合行（供 analytics.summarize_latency() 合并）
+
+        Args:
+            since / until: 日期范围（YYYY-MM-DD，含 since 不含 until）
+
+        Returns:
+            [{"day", "segment", "count", "duration_sum", "duration_min", "duration_max", "bins": {分箱: 数量}}]
+        """
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("day >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("day < ?")
+            params.append(until)
+        where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+
+        with self._lock:
+            stats = self._conn.execute(
+                "SELECT day, segment, count, duration_sum, duration_min, duration_max FROM history_latency" + where,
+                params,
+            ).fetchall()
+            bins = self._conn.execute(
+                "SELECT day, segment, bin, count FROM history_latency_bins" + where, params
+            ).fetchall()
+
+        rows: Dict[Tuple, Dict[str, Any]] = {}
+        for row in stats:
+            item = dict(zip(("day", "segment", "count", "duration_sum", "duration_min", "duration_max"), row))
+            item["bins"] = {}
+            rows[row[:2]] = item
+        for day, segment, index, count in bins:
+            item = rows.get((day, segment))
+            if item is not None:
+                item["bins"][index] = count
+        return list(rows.values())
+
+    def count(self) -> int:
+        """获取历史记录数量"""
+        return self._count
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
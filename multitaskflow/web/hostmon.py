@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+主机资源监控
+
+一个后台线程按固定间隔采样主机的 CPU、负载、内存、交换分区、工作空间和日志目录所在磁盘的剩余空间，
+以及各网络接口的收发速率，写入固定长度的环形缓冲区（默认保留最近 1 小时）。
+
+采样开销与查看者数量无关：读取时只复制缓冲区并按时间分桶求平均，
+同一采样周期内相同参数的查询共用一次计算结果。
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import psutil
+
+logger = logging.getLogger("HostMonitor")
+
+
+# 采样间隔（秒）
+SAMPLE_INTERVAL = 5.0
+
+# 环形缓冲区长度（默认 1 小时）
+CAPACITY = 720
+
+# 默认返回的时间序列点数
+DEFAULT_POINTS = 120
+
+# 时间序列中取平均值的标量字段
+SCALAR_FIELDS = ("cpu_percent", "load1", "memory_percent", "memory_available", "swap_percent", "swap_used")
+
+# 不统计的网络接口
+IGNORED_INTERFACES = ("lo",)
+
+
+class HostSampler:
+    """主机资源采样器（后台线程 + 环形缓冲区）"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, capacity: int = CAPACITY):
+        self.interval = interval
+        self.capacity = capacity
+
+        self._lock = threading.Lock()
+        self._samples: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        # 采样序号：每次采样加一，用于判断缓存是否过期
+        self._seq = 0
+        self._cache: Dict[Tuple, Dict[str, Any]] = {}
+
+        self._queue_manager = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._last_net: Optional[Tuple[float, Dict[str, Any]]] = None
+
+        # 最近一次采样耗时（秒）
+        self.sample_seconds = 0.0
+        # 主机的静态信息（启动时读取一次）
+        self.host: Optional[Dict[str, Any]] = None
+
+    def start(self, queue_manager=None):
+        """启动后台采样线程"""
+        self._queue_manager = queue_manager
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self.host = host_info()
+        psutil.cpu_percent(interval=None)  # 第一次调用只建立基准
+        self._thread = threading.Thread(target=self._run, name="HostSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台采样线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._queue_manager = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sample_once()
+            except Exception as e:
+                logger.error(f"主机资源采样失败: {e}")
+            self._stop_event.wait(self.interval)
+
+    def _paths(self) -> Dict[str, str]:
+        """需要监控剩余空间的目录：{目录: 用途}"""
+        paths: Dict[str, str] = {}
+        queue_manager = self._queue_manager
+        if queue_manager is None:
+            return paths
+        paths[str(queue_manager.workspace_dir)] = "workspace"
+        for queue in list(queue_manager.queues.values()):
+            paths.setdefault(str(queue.log_dir), "logs")
+        return paths
+
+    def sample_once(self) -> Dict[str, Any]:
+        """采样一次并写入缓冲区"""
+        started = time.perf_counter()
+        now = time.time()
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        sample: Dict[str, Any] = {
+            "time": round(now, 3),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "load1": os.getloadavg()[0] if hasattr(os, "getloadavg") else None,
+            "memory_percent": memory.percent,
+            "memory_available": memory.available,
+            "swap_percent": swap.percent,
+            "swap_used": swap.used,
+            "disks": self._sample_disks(),
+            "net": self._sample_net(now),
+        }
+        with self._lock:
+            self._samples.append(sample)
+            self._seq += 1
+            self._cache.clear()
+        self.sample_seconds = time.perf_counter() - started
+        return sample
+
+    def _sample_disks(self) -> Dict[str, Dict[str, Any]]:
+        """各目录所在磁盘的空间（同一设备上的目录只统计一次，键为第一个目录）"""
+        disks: Dict[str, Dict[str, Any]] = {}
+        devices: Dict[int, str] = {}
+        for path, role in self._paths().items():
+            try:
+                device = os.stat(path).st_dev
+                if device in devices:
+                    disks[devices[device]]["roles"].add(role)
+                    continue
+                usage = psutil.disk_usage(path)
+            except OSError:
+                continue
+            devices[device] = path
+            disks[path] = {"roles": {role}, "free": usage.free, "total": usage.total, "percent": usage.percent}
+        for disk in disks.values():
+            disk["roles"] = sorted(disk["roles"])
+        return disks
+
+    def _sample_net(self, now: float) -> Dict[str, Tuple[float, float]]:
+        """各网络接口的收发速率（字节/秒），与上一次采样的计数器相减"""
+        counters = {
+            name: (stats.bytes_recv, stats.bytes_sent)
+            for name, stats in psutil.net_io_counters(pernic=True).items()
+            if name not in IGNORED_INTERFACES
+        }
+        rates: Dict[str, Tuple[float, float]] = {}
+        if self._last_net is not None:
+            last_time, last_counters = self._last_net
+            elapsed = now - last_time
+            if elapsed > 0:
+                for name, (recv, sent) in counters.items():
+                    previous = last_counters.get(name)
+                    # 计数器回绕或接口重建时跳过这一次
+                    if previous is None or recv < previous[0] or sent < previous[1]:
+                        continue
+                    rates[name] = (round((recv - previous[0]) / elapsed, 1), round((sent - previous[1]) / elapsed, 1))
+        self._last_net = (now, counters)
+        return rates
+
+    # ============ 读取 ============
+
+    def series(self, window: Optional[float] = None, points: int = DEFAULT_POINTS) -> Dict[str, Any]:
+        """
+        降采样后的时间序列
+
+        Args:
+            window: 最近多少秒（默认缓冲区中的全部采样）
+            points: 最多返回的点数（按时间等分，每段取平均值；cpu_percent 另外给出每段最大值）
+
+        Returns:
+            {"latest": 最近一次采样, "series": {"time": [...], 字段: [...], "disk_free": {目录: [...]},
+             "net_recv": {接口: [...]}, "net_sent": {接口: [...]}}}
+        """
+        key = (window, points)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+            seq = self._seq
+            samples = list(self._samples)
+
+        result = self._downsample(samples, window, points)
+        with self._lock:
+            # 计算期间有新采样时不缓存（结果仍然返回）
+            if seq == self._seq:
+                self._cache[key] = result
+        return result
+
+    def _downsample(self, samples: List[Dict[str, Any]], window: Optional[float], points: int) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "interval": self.interval,
+            "capacity": self.capacity,
+            "samples": len(samples),
+            "latest": samples[-1] if samples else None,
+            "series": None,
+        }
+        if not samples:
+            return result
+
+        end = samples[-1]["time"]
+        start = end - window if window else samples[0]["time"]
+        samples = [sample for sample in samples if sample["time"] >= start]
+        span = max(end - start, self.interval)
+        step = max(span / points, self.interval)
+
+        buckets: Dict[int, List[Dict[str, Any]]] = {}
+        for sample in samples:
+            index = min(int((sample["time"] - start) / step), points - 1)
+            buckets.setdefault(index, []).append(sample)
+        ordered = [buckets[index] for index in sorted(buckets)]
+
+        series: Dict[str, Any] = {
+            "time": [round(sum(s["time"] for s in group) / len(group), 3) for group in ordered],
+        }
+        for name in SCALAR_FIELDS:
+            series[name] = [_mean(s[name] for s in group) for group in ordered]
+        series["cpu_percent_max"] = [max(s["cpu_percent"] for s in group) for group in ordered]
+
+        disks = {path for sample in samples for path in sample["disks"]}
+        series["disk_free"] = {
+            path: [_mean(s["disks"][path]["free"] for s in group if path in s["disks"]) for group in ordered]
+            for path in sorted(disks)
+        }
+        interfaces = {name for sample in samples for name in sample["net"]}
+        for direction, position in (("net_recv", 0), ("net_sent", 1)):
+            series[direction] = {
+                name: [_mean(s["net"][name][position] for s in group if name in s["net"]) for group in ordered]
+                for name in sorted(interfaces)
+            }
+        result["series"] = series
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "samples": len(self._samples),
+            "sample_ms": round(self.sample_seconds * 1000, 2),
+        }
+
+
+def _mean(values) -> Optional[float]:
+    """平均值（忽略 None；没有值时为 None）"""
+    total, count = 0.0, 0
+    for value in values:
+        if value is not None:
+            total += value
+            count += 1
+    return round(total / count, 2) if count else None
+
+
+def host_info() -> Dict[str, Any]:
+    """主机的静态信息"""
+    return {
+        "cpu_count": psutil.cpu_count(),
+        "memory_total": psutil.virtual_memory().total,
+        "swap_total": psutil.swap_memory().total,
+        "boot_time": psutil.boot_time(),
+    }
+
+
+# 全局主机资源采样器
+host_sampler = HostSampler()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+待执行队列日志（journal）
+
+每个队列把待执行任务的变化追加到 ``logs/.pending_<yaml名>.jsonl``，每行一条记录：
+
+- ``{"op": "put", "tasks": [...]}``：新增或修改任务（已存在的任务保持原位置）
+- ``{"op": "remove", "ids": [...]}``：任务被删除或开始运行
+- ``{"op": "order", "ids": [...]}``：重排待执行任务
+- ``{"op": "snapshot", "tasks": [...], "loaded_names": [...]}``：完整状态，之前的记录全部作废
+
+批量操作只写一条记录。旧版本的单任务记录（``"task"`` / ``"id"``）仍可重放。
+
+WebUI 重启时按顺序重放记录即可恢复待执行任务及其顺序。追加的条目数超过
+当前任务数的 COMPACT_RATIO 倍（且不少于 COMPACT_MIN_RECORDS）时写入快照压缩，
+文件大小和重放时间始终与队列长度成正比。
+
+写入在后台线程中进行（与 WorkspaceStore 相同的写后合并）：调用方只把记录放入内存队列，
+一个间隔内的记录合并为一次追加写入并 flush 到操作系统；压缩时 fsync 并原子替换。
+关闭时立即写入剩余记录，之后的记录同步写入。
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import persist_seconds
+
+logger = logging.getLogger("Journal")
+
+# 压缩阈值：条目数超过 max(COMPACT_MIN_RECORDS, 任务数 × COMPACT_RATIO) 时压缩
+COMPACT_MIN_RECORDS = 1000
+COMPACT_RATIO = 2
+
+# 两次写入之间的最小间隔（秒）
+DEFAULT_FLUSH_INTERVAL = 0.2
+
+# 持久化的任务字段
+TASK_FIELDS = ("id", "name", "command", "note", "raw_log", "phases")
+
+
+class TaskJournal:
+    """待执行任务的追加日志（后台写入）"""
+
+    def __init__(self, path: str, snapshot: Callable[[], Tuple[List[Dict[str, Any]], List[str]]],
+                 interval: float = DEFAULT_FLUSH_INTERVAL):
+        """
+        Args:
+            path: 日志文件路径
+            snapshot: 返回 (待执行任务列表, 已从 YAML 加载的任务名称) 的函数，压缩时在写入线程中调用
+            interval: 两次写入之间的最小间隔（秒）
+        """
+        self.path = Path(path)
+        self.interval = interval
+        self._snapshot = snapshot
+
+        self._lock = threading.Lock()          # 保护待写入记录和计数
+        self._write_lock = threading.Lock()    # 串行化文件写入
+        self._file = None
+        self._pending: List[str] = []
+        self._compact_requested = False
+        self._records = 0
+        self._live = 0
+
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.writes = 0
+
+    # ============ 重放 ============
+
+    def replay(self) -> Optional[Tuple[List[Dict[str, Any]], List[str]]]:
+        """
+        重放日志
+
+        Returns:
+            (按顺序的待执行任务, 已从 YAML 加载的任务名称)；日志不存在时返回 None
+        """
+        if not self.path.exists():
+            return None
+
+        tasks: Dict[str, Dict[str, Any]] = {}  # 保持插入顺序
+        loaded_names: List[str] = []
+        records = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 最后一行可能在写入时被中断
+                    logger.warning(f"跳过损坏的日志记录: {self.path}:{line_no}")
+                    continue
+                op = record.get("op")
+                records += 1
+                if op == "snapshot":
+                    tasks = {t["id"]: t for t in record.get("tasks", [])}
+                    loaded_names = list(record.get("loaded_names", []))
+                    records = 1
+                elif op == "put":
+                    items = record["tasks"] if "tasks" in record else [record["task"]]
+                    records += len(items) - 1
+                    for task in items:
+                        if task["id"] in tasks:
+                            tasks[task["id"]].update(task)
+                        else:
+                            tasks[task["id"]] = task
+                elif op == "remove":
+                    items = record["ids"] if "ids" in record else [record.get("id")]
+                    records += len(items) - 1
+                    for task_id in items:
+                        tasks.pop(task_id, None)
+                elif op == "order":
+                    ordered = {tid: tasks[tid] for tid in record.get("ids", []) if tid in tasks}
+                    # 重排后新增的任务排在最后
+                    ordered.update((tid, task) for tid, task in tasks.items() if tid not in ordered)
+                    tasks = ordered
+
+        with self._lock:
+            self._records = records
+            self._live = len(tasks)
+        return list(tasks.values()), loaded_names
+
+    # ============ 写入 ============
+
+    def put(self, tasks: List[Dict[str, Any]], new: bool = False):
+        """
+        记录新增或修改的待执行任务（一条记录）
+
+        Args:
+            tasks: 任务字典列表（只保存 TASK_FIELDS 中的字段）
+            new: 是否为新增任务（用于估算压缩阈值）
+        """
+        if not tasks:
+            return
+        self._append({"op": "put", "tasks": [{k: task.get(k) for k in TASK_FIELDS} for task in tasks]},
+                     entries=len(tasks), live_delta=len(tasks) if new else 0)
+
+    def remove(self, task_ids: List[str]):
+        """记录移出待执行队列的任务（删除或开始运行）"""
+        if not task_ids:
+            return
+        self._append({"op": "remove", "ids": list(task_ids)}, entries=len(task_ids), live_delta=-len(task_ids))
+
+    def order(self, task_ids: List[str]):
+        """记录待执行任务的新顺序"""
+        self._append({"op": "order", "ids": task_ids}, entries=1, live_delta=0)
+
+    def _append(self, record: Dict[str, Any], entries: int, live_delta: int):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._pending.append(line)
+            self._records += entries
+            self._live = max(self._live + live_delta, 0)
+            if self._records > max(COMPACT_MIN_RECORDS, self._live * COMPACT_RATIO):
+                self._compact_requested = True
+        self._schedule()
+
+    def compact(self):
+        """请求写入当前状态快照，替换全部历史记录（由写入线程执行）"""
+        with self._lock:
+            self._compact_requested = True
+        self._schedule()
+
+    def _schedule(self):
+        with self._lock:
+            closed = self._closed
+            if not closed and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="TaskJournal", daemon=True)
+                self._thread.start()
+        if closed:
+            self.flush()
+        else:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stop_event.is_set():
+                return
+            self.flush()
+            # 间隔内的后续记录合并到下一次写入；关闭时 close() 会写入剩余记录
+            self._stop_event.wait(self.interval)
+
+    def flush(self) -> bool:
+        """
+        立即写入待写入的记录（或压缩）
+
+        Returns:
+            是否执行了写入
+        """
+        with self._write_lock:
+            with self._lock:
+                compact = self._compact_requested
+                self._compact_requested = False
+                lines, self._pending = self._pending, []
+            if compact:
+                # 快照反映的状态不早于已排队的记录，这些记录直接作废
+                self._compact()
+                return True
+            if not lines:
+                return False
+            try:
+                with persist_seconds.time(store="journal", op="append"):
+                    if self._file is None:
+                        self.path.parent.mkdir(parents=True, exist_ok=True)
+                        self._file = open(self.path, 'a', encoding='utf-8')
+                    self._file.write(''.join(lines))
+                    self._file.flush()
+            except OSError as e:
+                logger.error(f"写入队列日志失败: {e}")
+                return False
+            self.writes += 1
+            return True
+
+    def _compact(self):
+        """写入快照并原子替换日志文件（调用方持有 _write_lock）"""
+        tasks, loaded_names = self._snapshot()
+        record = {
+            "op": "snapshot",
+            "tasks": [{k: task.get(k) for k in TASK_FIELDS} for task in tasks],
+            "loaded_names": sorted(loaded_names),
+        }
+        start = time.perf_counter()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=self.path.name + ".", suffix=".tmp", dir=str(self.path.parent))
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                os.replace(tmp, self.path)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            logger.error(f"压缩队列日志失败: {e}")
+            return
+        persist_seconds.observe(time.perf_counter() - start, store="journal", op="compact")
+        self.writes += 1
+        with self._lock:
+            # 快照之后排队的记录在下一次写入时追加
+            self._records = len(self._pending) + 1
+            self._live = len(tasks)
+
+    def close(self):
+        """停止后台写入线程，写入剩余记录并关闭文件（之后的记录同步写入）"""
+        with self._lock:
+            self._closed = True
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        """日志统计"""
+        with self._lock:
+            return {"path": str(self.path), "records": self._records, "tasks": self._live,
+                    "pending": len(self._pending), "writes": self.writes}
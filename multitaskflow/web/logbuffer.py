@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+运行中任务的日志环形缓冲区
+
+每个运行中的任务在内存中保留最近 N 行折叠后的输出：
+- 由一个后台线程统一跟踪所有运行中任务的日志文件，每个任务只读取一次新增内容
+  （无论有多少查看者），直接写日志和经输出泵写日志的任务都适用
+- WebSocket 历史日志、运行中任务的日志 API 和完成通知直接从内存读取
+- 所有缓冲区共享全局内存上限，超限时从占用最多的缓冲区丢弃最旧的行
+- 任务结束并发送通知后移除
+"""
+
+import codecs
+import logging
+import threading
+import time
+from collections import deque
+from itertools import islice
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .termlog import ProgressBarCollapser
+
+logger = logging.getLogger("LogBuffer")
+
+
+# 每个任务保留的最大行数
+DEFAULT_MAX_LINES = 2000
+
+# 所有缓冲区合计的内存上限（字符数）
+DEFAULT_MAX_TOTAL_CHARS = 64 * 1024 * 1024
+
+# 跟踪线程轮询间隔（秒）
+POLL_INTERVAL = 0.2
+
+# 每次轮询单个任务最多读取的字节数（避免大日志独占跟踪线程）
+READ_BUDGET = 4 * 1024 * 1024
+
+# 未完成行保留的最大字符数：持续输出但不换行的任务只保留最后部分（日志文件中仍是完整内容）
+MAX_PARTIAL_CHARS = 16 * 1024
+
+# 监听器: (completed, frame, final, offset)
+#   completed: 新完成的行（以 \n 结尾，可能为空）
+#   frame: 当前未完成行规整后的内容（进度条最新帧或未换行的输出）
+#   final: 任务输出已结束
+#   offset: 已完成行在日志文件中的结束字节偏移（可作为续传游标）
+Listener = Callable[[str, str, bool, int], None]
+
+
+class TaskLogBuffer:
+    """单个任务的日志环形缓冲区"""
+
+    def __init__(self, task_id: str, log_file: str, max_lines: int = DEFAULT_MAX_LINES,
+                 on_first_output: Optional[Callable[[float], None]] = None):
+        self.task_id = task_id
+        self.log_file = log_file
+        self.max_lines = max_lines
+        # 第一次读到日志内容时调用（参数为 Unix 时间戳）
+        self._on_first_output = on_first_output
+
+        self._lock = threading.Lock()
+        self._lines: Deque[str] = deque()
+        self._collapser = ProgressBarCollapser(MAX_PARTIAL_CHARS)
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._listeners: List[Listener] = []
+        self._fp = None
+
+        # 已读取的日志字节数
+        self.end_offset = 0
+        # 最后一个已完成行之后的字节偏移（行对齐的续传游标）
+        self.line_offset = 0
+        # 已完成的总行数（包括已被丢弃的行）
+        self.total_lines = 0
+        # 因行数或内存上限被丢弃的行数
+        self.dropped_lines = 0
+        # 缓冲区中行内容和未完成行的字符数
+        self.chars = 0
+        # 未完成行规整后的内容（每次读取后更新一次，供通知和快照复用）
+        self._partial = ''
+
+        # 输出已结束（任务退出且已读完日志）
+        self.finished = False
+
+    # ============ 写入（跟踪线程 / 任务监控线程） ============
+
+    def _append(self, completed: str):
+        if not completed:
+            return
+        lines = completed.split('\n')
+        lines.pop()  # completed 以 \n 结尾
+        self._lines.extend(lines)
+        self.total_lines += len(lines)
+        self.chars += len(completed) - len(lines)
+        while len(self._lines) > self.max_lines:
+            self.chars -= len(self._lines.popleft())
+            self.dropped_lines += 1
+
+    def _update_partial(self):
+        """重新计算未完成行（长度受 MAX_PARTIAL_CHARS 限制），并计入 chars"""
+        partial = self._collapser.partial_line()
+        self.chars += len(partial) - len(self._partial)
+        self._partial = partial
+
+    def _notify(self, completed: str, final: bool = False):
+        frame = self._partial
+        for listener in list(self._listeners):
+            try:
+                listener(completed, frame, final, self.line_offset)
+            except Exception as e:
+                logger.debug(f"日志监听器错误: {e}")
+
+    def _read_new(self, budget: int) -> bool:
+        """读取日志新增内容（调用方持有锁），返回是否读到了数据"""
+        if self._fp is None:
+            try:
+                self._fp = open(self.log_file, 'rb')
+            except OSError:
+                return False
+            self._fp.seek(self.end_offset)
+
+        data = self._fp.read(budget)
+        if not data:
+            return False
+        if self.end_offset == 0 and self._on_first_output is not None:
+            try:
+                self._on_first_output(time.time())
+            except Exception as e:
+                logger.debug(f"首次输出回调错误: {e}")
+        # \n 不会出现在多字节字符中，解码器不会滞留换行符，折叠器恰好输出到最后一个换行
+        newline = data.rfind(b'\n')
+        if newline >= 0:
+            self.line_offset = self.end_offset + newline + 1
+        self.end_offset += len(data)
+        completed = self._collapser.feed(self._decoder.decode(data))
+        self._append(completed)
+        self._update_partial()
+        self._notify(completed)
+        return True
+
+    def poll(self, budget: int = READ_BUDGET) -> bool:
+        """读取一次新增内容，返回是否读到了数据"""
+        with self._lock:
+            if self.finished:
+                return False
+            return self._read_new(budget)
+
+    def finish(self):
+        """任务已退出：读完剩余日志，结束最后一行并通知监听器"""
+        with self._lock:
+            if self.finished:
+                return
+            while self._read_new(READ_BUDGET):
+                pass
+            tail = self._collapser.feed(self._decoder.decode(b'', final=True))
+            self._append(tail)
+            self._update_partial()
+            self.finished = True
+            self.line_offset = self.end_offset
+            self._close_file()
+            self._notify(tail, final=True)
+            self._listeners.clear()
+
+    def _close_file(self):
+        if self._fp is not None:
+            try:
+                self._fp.close()
+            except OSError:
+                pass
+            self._fp = None
+
+    def trim(self, count: int) -> int:
+        """丢弃最旧的 count 行（内存上限），返回释放的字符数"""
+        freed = 0
+        with self._lock:
+            for _ in range(min(count, len(self._lines))):
+                freed += len(self._lines.popleft())
+                self.dropped_lines += 1
+            self.chars -= freed
+        return freed
+
+    # ============ 读取 ============
+
+    def _tail(self, n: int) -> Tuple[str, int]:
+        """
+        最后 n 行文本（调用方持有锁），语义与 termlog.collapse_tail 一致：
+        未完成的行作为最后一行，总行数 = 已完成行数 + 1
+        """
+        partial = self._partial
+        total = self.total_lines + 1
+        if n <= 0:
+            n = total
+        count = min(n - 1, len(self._lines))
+        if count > 0:
+            lines = list(islice(self._lines, len(self._lines) - count, None))
+            lines.append(partial)
+            return '\n'.join(lines), total
+        return partial, total
+
+    def has_lines(self, n: int) -> bool:
+        """缓冲区是否能完整提供最后 n 行"""
+        with self._lock:
+            return self.dropped_lines == 0 or (n > 0 and n - 1 <= len(self._lines))
+
+    def tail(self, n: int) -> Tuple[str, int]:
+        """
+        获取最后 n 行
+
+        Returns:
+            (文本, 总行数)
+        """
+        with self._lock:
+            return self._tail(n)
+
+    def _snapshot(self, backlog_lines: int) -> Tuple[str, int, str, bool, int]:
+        count = min(backlog_lines, len(self._lines)) if backlog_lines > 0 else len(self._lines)
+        lines = islice(self._lines, len(self._lines) - count, None)
+        text = ''.join(line + '\n' for line in lines)
+        return text, self.total_lines, self._partial, self.finished, self.line_offset
+
+    def snapshot(self, backlog_lines: int) -> Tuple[str, int, str, bool, int]:
+        """
+        获取历史快照（不订阅）
+
+        与已注册监听器收到的通知按 offset 对齐：offset 不大于快照 offset 的通知中，
+        已完成的行已经包含在快照里。
+
+        Returns:
+            同 subscribe()
+        """
+        with self._lock:
+            return self._snapshot(backlog_lines)
+
+    def subscribe(self, listener: Listener, backlog_lines: int) -> Tuple[str, int, str, bool, int]:
+        """
+        获取历史快照并订阅后续输出（原子操作，快照和增量之间不会丢失或重复）
+
+        监听器在跟踪线程中被调用，不能阻塞。
+
+        Returns:
+            (最后 backlog_lines 个已完成行, 已完成总行数, 当前未完成行, 是否已结束,
+             已完成行的结束字节偏移)
+        """
+        with self._lock:
+            if not self.finished:
+                self._listeners.append(listener)
+            return self._snapshot(backlog_lines)
+
+    def unsubscribe(self, listener: Listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def close(self):
+        with self._lock:
+            self._close_file()
+            self._listeners.clear()
+
+
+class LogBufferRegistry:
+    """所有运行中任务的日志缓冲区（全局内存上限 + 后台跟踪线程）"""
+
+    def __init__(self, max_lines: int = DEFAULT_MAX_LINES,
+                 max_total_chars: int = DEFAULT_MAX_TOTAL_CHARS,
+                 poll_interval: float = POLL_INTERVAL):
+        self.max_lines = max_lines
+        self.max_total_chars = max_total_chars
+        self.poll_interval = poll_interval
+
+        self._buffers: Dict[str, TaskLogBuffer] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def open(self, task_id: str, log_file: str,
+             on_first_output: Optional[Callable[[float], None]] = None) -> TaskLogBuffer:
+        """
+        开始跟踪任务日志（从文件开头读取，恢复的任务也会读入已有内容）
+
+        Args:
+            task_id: 任务ID
+            log_file: 日志文件路径
+            on_first_output: 第一次读到日志内容时的回调（参数为 Unix 时间戳）
+
+        Returns:
+            任务的日志缓冲区
+        """
+        with self._lock:
+            buffer = self._buffers.get(task_id)
+            if buffer is None or buffer.log_file != log_file:
+                if buffer is not None:
+                    buffer.close()
+                buffer = TaskLogBuffer(task_id, log_file, self.max_lines, on_first_output)
+                self._buffers[task_id] = buffer
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="LogBufferPump", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return buffer
+
+    def get(self, task_id: str) -> Optional[TaskLogBuffer]:
+        """获取任务的日志缓冲区（未跟踪时返回 None）"""
+        return self._buffers.get(task_id)
+
+    def finish(self, task_id: str) -> Optional[TaskLogBuffer]:
+        """任务已退出：读完剩余日志（缓冲区保留到 evict）"""
+        buffer = self._buffers.get(task_id)
+        if buffer is not None:
+            buffer.finish()
+        return buffer
+
+    def evict(self, task_id: str):
+        """移除任务的日志缓冲区"""
+        with self._lock:
+            buffer = self._buffers.pop(task_id, None)
+        if buffer is not None:
+            buffer.finish()
+            buffer.close()
+
+    def total_chars(self) -> int:
+        return sum(b.chars for b in list(self._buffers.values()))
+
+    def stats(self) -> Dict[str, int]:
+        buffers = list(self._buffers.values())
+        return {
+            "buffers": len(buffers),
+            "lines": sum(len(b._lines) for b in buffers),
+            "chars": sum(b.chars for b in buffers),
+            "max_total_chars": self.max_total_chars,
+        }
+
+    def _enforce_limit(self):
+        """超过全局上限时，从占用最多的缓冲区丢弃最旧的行"""
+        total = self.total_chars()
+        while total > self.max_total_chars:
+            buffers = [b for b in list(self._buffers.values()) if b._lines]
+            if not buffers:
+                break
+            largest = max(buffers, key=lambda b: b.chars)
+            # 每次丢弃四分之一，避免逐行循环
+            freed = largest.trim(max(len(largest._lines) // 4, 1))
+            if freed <= 0 and len(largest._lines) == 0:
+                break
+            total -= freed
+
+    def _run(self):
+        """跟踪线程：轮询所有运行中任务的日志新增内容"""
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+            got_data = False
+            for buffer in list(self._buffers.values()):
+                try:
+                    got_data = buffer.poll() or got_data
+                except Exception as e:
+                    logger.warning(f"读取任务日志失败 ({buffer.task_id}): {e}")
+            if got_data:
+                self._enforce_limit()
+
+
+# 全局日志缓冲区
+log_buffers = LogBufferRegistry()
@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+任务日志存储模块
+
+负责已结束任务日志的压缩归档，并为所有读取方提供透明访问。
+
+归档格式：
+- ``xxx.log.gz``：由多个独立 gzip 成员组成（每块原始数据单独压缩），
+  标准 ``zcat``/``gzip -d`` 可直接解压
+- ``xxx.log.gz.idx``：块索引（JSON），记录每块的原始偏移和压缩偏移，
+  读取尾部或任意区间时只需解压相关的块
+"""
+
+import os
+import gzip
+import codecs
+import json
+import time
+import zlib
+import bisect
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger("LogStore")
+
+# 归档文件后缀
+ARCHIVE_SUFFIX = ".gz"
+INDEX_SUFFIX = ".idx"
+
+# 每块原始数据大小（块越小尾部读取越快，压缩率略低）
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# 默认归档年龄（小时）：任务结束且日志超过该时长未修改才压缩
+DEFAULT_ARCHIVE_AGE_HOURS = 24.0
+
+
+def _archive_path(path: Path) -> Path:
+    return path.with_name(path.name + ARCHIVE_SUFFIX)
+
+
+def _index_path(archive: Path) -> Path:
+    return archive.with_name(archive.name + INDEX_SUFFIX)
+
+
+def resolve_log_path(log_file: Optional[str]) -> Optional[Path]:
+    """
+    查找日志的实际存储位置
+
+    Args:
+        log_file: 原始日志路径（任务和历史记录中保存的路径）
+
+    Returns:
+        原始文件或归档文件路径，都不存在时返回 None
+    """
+    if not log_file:
+        return None
+    path = Path(log_file)
+    if path.exists():
+        return path
+    archive = _archive_path(path)
+    if archive.exists():
+        return archive
+    return None
+
+
+def log_exists(log_file: Optional[str]) -> bool:
+    """检查日志（原始或归档）是否存在"""
+    return resolve_log_path(log_file) is not None
+
+
+def is_archived(path: Path) -> bool:
+    """判断路径是否为归档文件"""
+    return path.name.endswith(ARCHIVE_SUFFIX)
+
+
+class _BlockIndex:
+    """归档块索引"""
+
+    def __init__(self, raw_offsets: List[int], comp_offsets: List[int], raw_size: int, comp_size: int):
+        self.raw_offsets = raw_offsets
+        self.comp_offsets = comp_offsets
+        self.raw_size = raw_size
+        self.comp_size = comp_size
+
+    @classmethod
+    def load(cls, archive: Path) -> Optional["_BlockIndex"]:
+        """加载索引，索引缺失或与归档不匹配时返回 None"""
+        index_file = _index_path(archive)
+        try:
+            data = json.loads(index_file.read_text())
+            blocks = data["blocks"]
+            index = cls(
+                [b[0] for b in blocks],
+                [b[1] for b in blocks],
+                data["raw_size"],
+                data["comp_size"],
+            )
+            if index.comp_size != archive.stat().st_size:
+                return None
+            return index
+        except Exception:
+            return None
+
+    def block_range(self, start: int, end: int) -> Tuple[int, int]:
+        """返回覆盖原始区间 [start, end) 的块下标范围 [first, last)"""
+        first = max(bisect.bisect_right(self.raw_offsets, start) - 1, 0)
+        last = bisect.bisect_left(self.raw_offsets, end)
+        return first, max(last, first + 1)
+
+    def comp_end(self, block: int) -> int:
+        if block + 1 < len(self.comp_offsets):
+            return self.comp_offsets[block + 1]
+        return self.comp_size
+
+
+def compress_log(path: Path, block_size: int = DEFAULT_BLOCK_SIZE, remove_source: bool = True) -> Path:
+    """
+    将日志压缩为分块 gzip 归档
+
+    先写入临时文件再原子重命名，压缩过程中崩溃不会留下损坏的归档。
+
+    Args:
+        path: 原始日志路径
+        block_size: 每块原始数据大小
+        remove_source: 压缩完成后是否删除原始文件
+
+    Returns:
+        归档文件路径
+    """
+    path = Path(path)
+    archive = _archive_path(path)
+    tmp_archive = archive.with_name(archive.name + ".tmp")
+
+    blocks = []
+    raw_offset = 0
+    comp_offset = 0
+    with open(path, 'rb') as src, open(tmp_archive, 'wb') as dst:
+        while True:
+            chunk = src.read(block_size)
+            if not chunk:
+                break
+            member = gzip.compress(chunk, compresslevel=6)
+            dst.write(member)
+            blocks.append([raw_offset, comp_offset])
+            raw_offset += len(chunk)
+            comp_offset += len(member)
+        dst.flush()
+        os.fsync(dst.fileno())
+
+    index = {
+        "version": 1,
+        "block_size": block_size,
+        "raw_size": raw_offset,
+        "comp_size": comp_offset,
+        "blocks": blocks,
+    }
+    tmp_index = _index_path(tmp_archive)
+    tmp_index.write_text(json.dumps(index))
+
+    # 先放索引再放归档：读取方看到归档时索引一定已就绪
+    os.replace(tmp_index, _index_path(archive))
+    os.replace(tmp_archive, archive)
+
+    stat = path.stat()
+    os.utime(archive, (stat.st_atime, stat.st_mtime))
+    if remove_source:
+        path.unlink()
+    return archive
+
+
+def log_size(log_file: Optional[str]) -> int:
+    """获取日志原始（未压缩）大小"""
+    path = resolve_log_path(log_file)
+    if path is None:
+        return 0
+    if not is_archived(path):
+        return path.stat().st_size
+    index = _BlockIndex.load(path)
+    if index is not None:
+        return index.raw_size
+    # 无索引时只能完整解压计算
+    size = 0
+    with gzip.open(path, 'rb') as f:
+        while True:
+            chunk = f.read(DEFAULT_BLOCK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+    return size
+
+
+def iter_log_bytes(log_file: Optional[str], start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    按块读取日志原始字节（透明处理归档）
+
+    Args:
+        log_file: 原始日志路径
+        start: 起始偏移（原始字节）
+        end: 结束偏移（不包含），None 表示读到结尾
+        chunk_size: 原始文件的单次读取大小
+    """
+    path = resolve_log_path(log_file)
+    if path is None:
+        return
+
+    if not is_archived(path):
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            # 检查与打开之间恰好被归档，改读归档
+            path = resolve_log_path(log_file)
+            if path is None or not is_archived(path):
+                return
+        else:
+            with f:
+                yield from _iter_file_bytes(f, start, end, chunk_size)
+            return
+
+    index = _BlockIndex.load(path)
+    if index is None:
+        # 索引缺失：顺序解压并跳过前面的数据
+        yield from _iter_gzip_slow(path, start, end)
+        return
+
+    if end is None or end > index.raw_size:
+        end = index.raw_size
+    if start >= end:
+        return
+
+    first, last = index.block_range(start, end)
+    with open(path, 'rb') as f:
+        for block in range(first, last):
+            f.seek(index.comp_offsets[block])
+            member = f.read(index.comp_end(block) - index.comp_offsets[block])
+            data = zlib.decompress(member, 16 + zlib.MAX_WBITS)
+            block_start = index.raw_offsets[block]
+            lo = max(start - block_start, 0)
+            hi = min(end - block_start, len(data))
+            if hi > lo:
+                yield data[lo:hi]
+
+
+def _iter_file_bytes(f, start: int, end: Optional[int], chunk_size: int) -> Iterator[bytes]:
+    """读取原始文件的字节区间"""
+    f.seek(start)
+    remaining = None if end is None else max(end - start, 0)
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        chunk = f.read(size)
+        if not chunk:
+            break
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
+
+
+def _iter_gzip_slow(path: Path, start: int, end: Optional[int]) -> Iterator[bytes]:
+    """无索引时的顺序解压读取"""
+    pos = 0
+    with gzip.open(path, 'rb') as f:
+        while end is None or pos < end:
+            chunk = f.read(DEFAULT_BLOCK_SIZE)
+            if not chunk:
+                break
+            chunk_start = pos
+            pos += len(chunk)
+            lo = max(start - chunk_start, 0)
+            hi = len(chunk) if end is None else min(end - chunk_start, len(chunk))
+            if hi > lo:
+                yield chunk[lo:hi]
+
+
+def iter_log_text(log_file: Optional[str], start: int = 0, chunk_size: int = 1024 * 1024) -> Iterator[str]:
+    """
+    按块读取日志文本（增量解码，多字节字符不会被块边界截断）
+
+    Args:
+        log_file: 原始日志路径
+        start: 起始字节偏移
+        chunk_size: 单次读取大小
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for chunk in iter_log_bytes(log_file, start, chunk_size=chunk_size):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def read_log_bytes(log_file: Optional[str], start: int = 0, end: Optional[int] = None) -> bytes:
+    """读取日志的原始字节区间"""
+    return b''.join(iter_log_bytes(log_file, start, end))
+
+
+def read_log_text(log_file: Optional[str]) -> str:
+    """
+    读取完整日志文本（保留 \\r，非法编码替换）
+    """
+    return read_log_bytes(log_file).decode('utf-8', errors='replace')
+
+
+def read_log_tail(log_file: Optional[str], max_bytes: int) -> str:
+    """
+    读取日志末尾最多 max_bytes 字节的文本
+
+    对归档日志只解压末尾相关的块。
+    """
+    size = log_size(log_file)
+    start = max(size - max_bytes, 0)
+    return read_log_bytes(log_file, start, size).decode('utf-8', errors='replace')
+
+
+class LogArchiver:
+    """
+    后台日志归档器
+
+    定期扫描日志目录，把已结束任务且超过指定时长未修改的日志压缩归档。
+    """
+
+    def __init__(
+        self,
+        get_log_dirs: Callable[[], Iterable[Path]],
+        get_active_logs: Callable[[], Set[str]],
+        archive_age_hours: float = DEFAULT_ARCHIVE_AGE_HOURS,
+        interval: float = 600.0,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+    ):
+        """
+        初始化归档器
+
+        Args:
+            get_log_dirs: 返回需要扫描的日志目录
+            get_active_logs: 返回运行中任务的日志路径（这些日志不会被压缩）
+            archive_age_hours: 日志最后修改后多久归档（小时），<= 0 表示禁用
+            interval: 扫描间隔（秒）
+            block_size: 压缩块大小
+        """
+        self.get_log_dirs = get_log_dirs
+        self.get_active_logs = get_active_logs
+        self.archive_age_hours = archive_age_hours
+        self.interval = interval
+        self.block_size = block_size
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.archive_age_hours > 0
+
+    def start(self):
+        """启动后台归档线程"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="LogArchiver", daemon=True)
+        self._thread.start()
+        logger.info(f"日志归档已启动（{self.archive_age_hours} 小时后压缩）")
+
+    def stop(self):
+        """停止后台归档线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.scan_once()
+            except Exception as e:
+                logger.error(f"日志归档扫描失败: {e}")
+            self._stop_event.wait(self.interval)
+
+    def scan_once(self) -> int:
+        """
+        扫描一次并归档符合条件的日志
+
+        Returns:
+            本次归档的文件数
+        """
+        if not self.enabled:
+            return 0
+
+        cutoff = time.time() - self.archive_age_hours * 3600
+        active = {str(Path(p).resolve()) for p in self.get_active_logs() if p}
+        archived = 0
+
+        for log_dir in self.get_log_dirs():
+            log_dir = Path(log_dir)
+            if not log_dir.is_dir():
+                continue
+            for path in log_dir.glob("*.log"):
+                if self._stop_event.is_set():
+                    return archived
+                try:
+                    if str(path.resolve()) in active:
+                        continue
+                    if path.stat().st_mtime > cutoff:
+                        continue
+                    compress_log(path, self.block_size)
+                    archived += 1
+                    logger.info(f"日志已归档: {path.name}")
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    logger.warning(f"归档日志失败 {path}: {e}")
+        return archived
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+事件循环延迟监控
+
+后台协程按固定间隔休眠，实际唤醒时间与预期时间之差即事件循环延迟：
+延迟越大说明有代码阻塞了事件循环，所有 WebSocket 和 API 请求都会随之停顿。
+
+协程每次休眠前记录心跳；看门狗线程发现心跳超时（事件循环仍被阻塞）时，
+读取事件循环线程当前的调用栈并写入日志，直接定位阻塞事件循环的代码。
+每次采样的延迟计入 Prometheus 直方图 event_loop_lag_seconds。
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .metrics import loop_lag
+
+logger = logging.getLogger("LoopMonitor")
+
+
+# 采样间隔（秒）
+SAMPLE_INTERVAL = 0.1
+
+# 保留的采样数（默认最近 60 秒）
+WINDOW_SAMPLES = 600
+
+# 超过此延迟（秒）记为一次卡顿，并记录阻塞位置的调用栈
+STALL_THRESHOLD = 0.1
+
+# 保留的阻塞现场数
+BLOCK_REPORTS = 20
+
+# 阻塞调用栈写入日志的最短间隔（秒），避免持续卡顿时刷屏
+LOG_INTERVAL = 10.0
+
+# 阻塞调用栈保留的帧数（最内层）
+STACK_LIMIT = 30
+
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class LoopLagMonitor:
+    """事件循环延迟监控"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, window: int = WINDOW_SAMPLES,
+                 stall_threshold: float = STALL_THRESHOLD):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+
+        # 元素: (采样时间戳, 延迟秒数)
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+        # 启动以来的统计
+        self.total_samples = 0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.stalled_seconds = 0.0
+        # 最近一次卡顿: (时间戳, 延迟秒数)
+        self.last_stall: Optional[Tuple[float, float]] = None
+
+        # 看门狗：协程休眠前的心跳（time.monotonic()）和事件循环线程
+        self._heartbeat: Optional[float] = None
+        self._reported_beat: Optional[float] = None
+        self._loop_thread: Optional[int] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._watchdog_stop = threading.Event()
+
+        # 阻塞现场（看门狗线程写入，事件循环线程补充完整时长）
+        self._reports_lock = threading.Lock()
+        self._reports: Deque[Dict[str, Any]] = deque(maxlen=BLOCK_REPORTS)
+        self._open_report: Optional[Dict[str, Any]] = None
+        self._last_logged = 0.0
+        # 捕获到调用栈的卡顿次数 / 因日志间隔未写入日志的次数
+        self.blocks = 0
+        self.suppressed_logs = 0
+
+    def start(self):
+        """在当前事件循环中启动监控协程和看门狗线程"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._watchdog_stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="LoopWatchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._watchdog_stop.set()
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+        self._heartbeat = None
+
+    def record(self, lag: float):
+        """记录一次延迟采样"""
+        lag = max(lag, 0.0)
+        now = time.time()
+        self._samples.append((now, lag))
+        self.total_samples += 1
+        self.max_lag = max(self.max_lag, lag)
+        loop_lag.observe(lag)
+        if lag >= self.stall_threshold:
+            self.stalls += 1
+            self.stalled_seconds += lag
+            self.last_stall = (now, lag)
+        with self._reports_lock:
+            # 看门狗在阻塞期间记录的现场：补充这次卡顿的完整时长
+            if self._open_report is not None:
+                self._open_report["lag_ms"] = round(lag * 1000, 2)
+                self._open_report = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        while True:
+            # loop.time() 即 time.monotonic()，与看门狗使用同一时钟
+            self._heartbeat = loop.time()
+            expected = self._heartbeat + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(loop.time() - expected)
+
+    def _watch(self):
+        """看门狗线程：事件循环超过阈值未唤醒时记录其调用栈（每次卡顿一次）"""
+        while not self._watchdog_stop.wait(max(self.stall_threshold / 2, 0.01)):
+            beat = self._heartbeat
+            if beat is None or beat == self._reported_beat:
+                continue
+            overdue = time.monotonic() - beat - self.interval
+            if overdue < self.stall_threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = traceback.format_stack(frame, limit=STACK_LIMIT)
+            del frame
+            self._reported_beat = beat
+            self._report(overdue, stack)
+
+    def _report(self, overdue: float, stack: List[str]):
+        now = time.time()
+        report = {
+            "time": now,
+            "detected_ms": round(overdue * 1000, 2),
+            "lag_ms": None,  # 事件循环恢复后补充
+            "stack": [line.rstrip() for line in stack],
+        }
+        with self._reports_lock:
+            self._reports.append(report)
+            self._open_report = report
+        self.blocks += 1
+
+        if now - self._last_logged >= LOG_INTERVAL:
+            self._last_logged = now
+            suppressed = f"（此前 {self.suppressed_logs} 次未记录）" if self.suppressed_logs else ""
+            self.suppressed_logs = 0
+            logger.warning(f"事件循环已阻塞 {overdue * 1000:.0f} ms{suppressed}，阻塞位置:\n{''.join(stack).rstrip()}")
+        else:
+            self.suppressed_logs += 1
+
+    def recent_blocks(self) -> List[Dict[str, Any]]:
+        """最近的阻塞现场（新的在前）"""
+        with self._reports_lock:
+            return [dict(report) for report in reversed(self._reports)]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        延迟统计（毫秒）
+
+        Returns:
+            最近窗口内的当前值、平均值、分位数、最大值，以及启动以来的卡顿次数
+        """
+        lags = sorted(lag for _, lag in self._samples)
+        window = len(lags)
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_ms": self.interval * 1000,
+            "window_samples": window,
+            "current_ms": round(self._samples[-1][1] * 1000, 2) if window else 0.0,
+            "mean_ms": round(sum(lags) / window * 1000, 2) if window else 0.0,
+            "p50_ms": round(_percentile(lags, 0.5) * 1000, 2),
+            "p99_ms": round(_percentile(lags, 0.99) * 1000, 2),
+            "window_max_ms": round(lags[-1] * 1000, 2) if window else 0.0,
+            "max_ms": round(self.max_lag * 1000, 2),
+            "total_samples": self.total_samples,
+            "stall_threshold_ms": self.stall_threshold * 1000,
+            "stalls": self.stalls,
+            "stalled_seconds": round(self.stalled_seconds, 3),
+            "last_stall": {
+                "time": self.last_stall[0],
+                "lag_ms": round(self.last_stall[1] * 1000, 2),
+            } if self.last_stall else None,
+            "watchdog": self._watchdog is not None and self._watchdog.is_alive(),
+            "blocked_stacks": self.blocks,
+        }
+
+
+# 全局事件循环监控
+loop_monitor = LoopLagMonitor()
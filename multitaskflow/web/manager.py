@@ -10,17 +10,29 @@
 
 import os
 import re
+import sys
 import subprocess
+import time
 import threading
 import logging
+from collections import deque
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Deque, Dict, List, Optional, Any, Set, Tuple
 from dataclasses import dataclass, field, asdict
 from enum import Enum
 
 import yaml
 
+from .logbuffer import log_buffers
+from .journal import TaskJournal
+from . import events
+from .events import event_bus
+
+
+# 保留的状态变更记录条数（?since_version= 增量查询可回溯的范围）
+CHANGE_LOG_SIZE = 1000
+
 
 class TaskStatus(str, Enum):
     """任务状态枚举"""
@@ -40,13 +52,22 @@ class Task:
     status: TaskStatus = TaskStatus.PENDING
     gpu: Optional[List[int]] = None
     note: Optional[str] = None  # 备注信息
+    raw_log: bool = False  # 保留原始输出（不经输出泵压缩进度条）
     
     # 运行时信息
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     error_message: Optional[str] = None
     process: Optional[subprocess.Popen] = field(default=None, repr=False)
+    pump_process: Optional[subprocess.Popen] = field(default=None, repr=False)
     log_file: Optional[str] = None
+    # 生命周期阶段 -> Unix 时间戳（阶段定义见 analytics.PHASES）
+    phases: Dict[str, float] = field(default_factory=lambda: {"enqueued": round(time.time(), 3)})
+    
+    def mark(self, phase: str, timestamp: float = None):
+        """记录生命周期阶段的时间（只保留第一次）"""
+        if phase not in self.phases:
+            self.phases[phase] = round(time.time() if timestamp is None else timestamp, 3)
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典（用于 API 响应）"""
@@ -57,11 +78,15 @@ class Task:
             "status": self.status.value,
             "gpu": self.gpu,
             "start_time": self.start_time.isoformat() if self.start_time else None,
+            # Unix 时间戳：客户端据此自行计算运行中任务的时长（不受时区影响）
+            "start_timestamp": self.start_time.timestamp() if self.start_time else None,
             "end_time": self.end_time.isoformat() if self.end_time else None,
             "duration": self.get_duration(),
             "error_message": self.error_message,
             "log_file": self.log_file,
             "note": self.note,
+            "raw_log": self.raw_log,
+            "phases": dict(self.phases),
         }
         return result
     
@@ -101,23 +126,34 @@ class TaskManager:
     """
     
     def __init__(self, config_path: str, history_file: str = None, 
-                 on_task_started=None, on_task_finished=None):
+                 on_task_started=None, on_task_finished=None,
+                 output_pump: bool = False, compact_interval: float = 1.0,
+                 queue_id: str = None, journal_file: str = None):
         """
         初始化任务管理器
         
         Args:
             config_path: 任务配置文件路径
-            history_file: 历史记录文件路径（可选）
+            history_file: 历史数据库路径（可选，默认 logs/.history_<yaml名>.db）
             on_task_started: 任务启动回调 (task_id, pid, log_file) -> None
             on_task_finished: 任务完成回调 (task_id) -> None
+            output_pump: 是否通过输出泵写日志（写入时压缩进度条帧）
+            compact_interval: 输出泵中同一进度条行的帧写入间隔（秒）
+            queue_id: 所属队列 ID（发布状态事件时使用）
+            journal_file: 待执行队列日志路径（可选，默认 logs/.pending_<yaml名>.jsonl）
         """
         self.config_path = Path(config_path).resolve()  # 确保使用绝对路径
         self.config_dir = self.config_path.parent
+        self.queue_id = queue_id
         
         # 回调函数（用于 PID 持久化）
         self.on_task_started = on_task_started
         self.on_task_finished = on_task_finished
         
+        # 输出泵配置（任务设置 raw_log 时仍直接写原始输出）
+        self.output_pump = output_pump
+        self.compact_interval = compact_interval
+        
         # 任务存储
         self.tasks: Dict[str, Task] = {}  # id -> Task
         self.task_order: List[str] = []   # 任务顺序（id列表）
@@ -127,6 +163,15 @@ class TaskManager:
         
         # 线程锁
         self._lock = threading.Lock()
+        # 正在停止的任务 ID
+        self._stopping: Set[str] = set()
+        
+        # 状态版本号：每次状态变化（发布事件）时递增，用于 ETag 和增量查询
+        # 以创建时的毫秒时间戳为起点，WebUI 重启后不会与旧版本号重复
+        self.state_version = int(time.time() * 1000)
+        # 变更记录: (版本号, 事件类型, 任务ID)
+        self._changes: Deque[Tuple[int, str, Optional[str]]] = deque(maxlen=CHANGE_LOG_SIZE)
+        self._version_lock = threading.Lock()
         
         # 队列自动执行状态
         self.queue_running = False
@@ -142,11 +187,20 @@ class TaskManager:
         main_log_name = f"webui_{yaml_name}.log"  # 固定文件名，不含时间戳
         self.main_log_file = str(self.config_dir / "logs" / main_log_name)
         
-        # 历史记录管理器
+        # 历史记录管理器（每个 YAML 一个数据库；同目录的旧版 .history.json 只导入第一个创建的数据库）
+        legacy_history = None
         if history_file is None:
-            history_file = str(self.config_dir / "logs" / ".history.json")
+            history_file = str(self.config_dir / "logs" / f".history_{self.config_path.stem}.db")
+            legacy_history = str(self.config_dir / "logs" / ".history.json")
         from .history import HistoryManager
-        self.history_manager = HistoryManager(history_file)
+        self.history_manager = HistoryManager(history_file, legacy_file=legacy_history)
+        
+        # 待执行队列日志：重启后恢复 API 添加、修改和重排过的待执行任务
+        if journal_file is None:
+            journal_file = str(self.config_dir / "logs" / f".pending_{self.config_path.stem}.jsonl")
+        self.journal = TaskJournal(journal_file, self._journal_snapshot)
+        # 串行化"读取任务状态 + 追加记录"，保证记录顺序与状态变化一致
+        self._journal_lock = threading.Lock()
         
         # 设置日志（使用唯一的 logger 名称，避免多队列日志混淆）
         # 使用配置文件路径的哈希作为唯一标识
@@ -168,6 +222,98 @@ class TaskManager:
         self.logger.info(f"=" * 50)
         self.logger.info(f"TaskFlow WebUI 启动 - {dt.now().strftime('%Y-%m-%d %H:%M:%S')}")
         self.logger.info(f"=" * 50)
+        
+        self._restore_pending()
+    
+    def _publish(self, event_type: str, task_id: str = None, **data):
+        """记录状态变化（写入队列日志、递增版本号）并发布事件"""
+        self._journal_event(event_type, [task_id] if task_id else [])
+        self._notify(event_type, task_id, **data)
+    
+    def _notify(self, event_type: str, task_id: str = None, **data):
+        """递增版本号并发布事件（不写队列日志，批量操作已单独写入）"""
+        with self._version_lock:
+            self.state_version += 1
+            self._changes.append((self.state_version, event_type, task_id))
+        event_bus.publish(event_type, queue_id=self.queue_id, task_id=task_id, **data)
+    
+    def _journal_event(self, event_type: str, task_ids: List[str]):
+        """
+        把待执行任务的变化写入队列日志（记录的是当前状态，重复或过时的事件不会写错）
+        
+        同一事件的多个任务只写一条记录；写入由队列日志的后台线程完成，这里不做磁盘 I/O。
+        """
+        with self._journal_lock:
+            if event_type in (events.TASK_ADDED, events.TASK_UPDATED):
+                tasks = [self.tasks.get(task_id) for task_id in task_ids]
+                # 运行中任务修改备注等不影响待执行队列
+                self.journal.put([task.to_dict() for task in tasks
+                                  if task is not None and task.status == TaskStatus.PENDING],
+                                 new=event_type == events.TASK_ADDED)
+            elif event_type in (events.TASK_DELETED, events.TASK_STARTED):
+                self.journal.remove(task_ids)
+            elif event_type == events.TASKS_REORDERED:
+                self.journal.order([task.id for task in self.get_pending_tasks()])
+            elif event_type == events.TASKS_LOADED:
+                # 批量变化直接写快照
+                self.journal.compact()
+    
+    def _journal_snapshot(self) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """队列日志压缩时的状态快照"""
+        with self._lock:
+            tasks = [task.to_dict() for task in self.get_pending_tasks()]
+        return tasks, list(getattr(self, '_loaded_task_names', set()))
+    
+    def _restore_pending(self):
+        """从队列日志恢复待执行任务（时间与队列长度成正比）"""
+        try:
+            restored = self.journal.replay()
+        except Exception as e:
+            self.logger.error(f"读取队列日志失败: {e}")
+            return
+        if restored is None:
+            return
+        
+        tasks, loaded_names = restored
+        for item in tasks:
+            task = Task(
+                id=item["id"],
+                name=item["name"],
+                command=item["command"],
+                status=TaskStatus.PENDING,
+                gpu=parse_gpu_from_command(item["command"]),
+                note=item.get("note"),
+                raw_log=bool(item.get("raw_log", False)),
+                phases=dict(item.get("phases") or {}),
+            )
+            self.tasks[task.id] = task
+            self.task_order.append(task.id)
+            # 新任务 ID 的计数器接在已恢复任务之后
+            match = re.match(r"task_(\d+)_", task.id)
+            if match:
+                self._task_counter = max(self._task_counter, int(match.group(1)))
+        self._loaded_task_names = set(loaded_names)
+        if tasks:
+            self.logger.info(f"从队列日志恢复 {len(tasks)} 个待执行任务")
+    
+    def get_changes(self, since_version: int) -> Optional[List[Tuple[str, Optional[str]]]]:
+        """
+        获取指定版本之后的状态变化
+        
+        Args:
+            since_version: 客户端已知的版本号
+        
+        Returns:
+            (事件类型, 任务ID) 列表；版本号无效或已超出变更记录范围时返回 None
+        """
+        with self._version_lock:
+            if since_version == self.state_version:
+                return []
+            if (since_version > self.state_version or not self._changes
+                    or self._changes[0][0] > since_version + 1):
+                return None
+            return [(event_type, task_id) for version, event_type, task_id in self._changes
+                    if version > since_version]
     
     def _generate_task_id(self) -> str:
         """生成任务ID - 使用 UUID 确保全局唯一性"""
@@ -211,7 +357,8 @@ class TaskManager:
                     name=task_config['name'],
                     command=command,
                     status=TaskStatus.PENDING,
-                    gpu=parse_gpu_from_command(command)
+                    gpu=parse_gpu_from_command(command),
+                    raw_log=bool(task_config.get('raw_log', False))
                 )
                 
                 self.tasks[task_id] = task
@@ -219,6 +366,7 @@ class TaskManager:
                 count += 1
             
             self.logger.info(f"已加载 {count} 个任务")
+            self._publish(events.TASKS_LOADED, count=count)
             
             # 保存已加载的任务名称用于去重
             self._loaded_task_names = {t.name for t in self.tasks.values()}
@@ -229,6 +377,23 @@ class TaskManager:
             self.logger.error(f"加载任务失败: {e}")
             return 0
     
+    def reload_tasks(self) -> int:
+        """
+        清空待执行任务并从配置文件重新加载
+        
+        Returns:
+            加载的任务数量
+        """
+        with self._lock:
+            self.tasks.clear()
+            self.task_order.clear()
+            self._loaded_task_names = set()
+        count = self.load_tasks()
+        if not count:
+            # 加载失败时 load_tasks 不发布事件，仍需记录队列已清空
+            self._publish(events.TASKS_LOADED, count=0)
+        return count
+    
     def check_yaml_updates(self) -> Dict[str, Any]:
         """
         检查 YAML 文件是否有新任务
@@ -284,6 +449,7 @@ class TaskManager:
                 task_info = {
                     "name": name,
                     "command": command,
+                    "raw_log": bool(task_config.get('raw_log', False)),
                     "valid": True,
                     "error": None
                 }
@@ -337,7 +503,8 @@ class TaskManager:
                     name=task_info["name"],
                     command=task_info["command"],
                     status=TaskStatus.PENDING,
-                    gpu=parse_gpu_from_command(task_info["command"])
+                    gpu=parse_gpu_from_command(task_info["command"]),
+                    raw_log=task_info["raw_log"]
                 )
                 self.tasks[task_id] = task
                 self.task_order.append(task_id)
@@ -350,6 +517,8 @@ class TaskManager:
                 loaded += 1
                 self.logger.info(f"加载新任务: {task_info['name']} (ID: {task_id})")
         
+        if loaded:
+            self._publish(events.TASKS_LOADED, count=loaded)
         return {"loaded": loaded, "skipped": skipped, "errors": errors}
     
     def get_all_tasks(self) -> List[Task]:
@@ -368,7 +537,7 @@ class TaskManager:
         """获取指定任务"""
         return self.tasks.get(task_id)
     
-    def add_task(self, name: str, command: str, note: str = None) -> Task:
+    def add_task(self, name: str, command: str, note: str = None, raw_log: bool = False) -> Task:
         """
         添加新任务
         
@@ -376,6 +545,7 @@ class TaskManager:
             name: 任务名称
             command: 执行命令
             note: 备注信息
+            raw_log: 是否保留原始输出（不压缩进度条）
         
         Returns:
             新创建的任务
@@ -388,12 +558,14 @@ class TaskManager:
                 command=command,
                 status=TaskStatus.PENDING,
                 gpu=parse_gpu_from_command(command),
-                note=note
+                note=note,
+                raw_log=raw_log
             )
             self.tasks[task_id] = task
             self.task_order.append(task_id)
             self.logger.info(f"添加任务: {name} (ID: {task_id})")
-            return task
+        self._publish(events.TASK_ADDED, task_id)
+        return task
     
     def update_task(self, task_id: str, name: str = None, command: str = None, note: str = None) -> Optional[Task]:
         """
@@ -425,7 +597,8 @@ class TaskManager:
                 task.note = note
             
             self.logger.info(f"更新任务: {task.name} (ID: {task_id})")
-            return task
+        self._publish(events.TASK_UPDATED, task_id)
+        return task
     
     def update_note(self, task_id: str, note: str) -> bool:
         """
@@ -446,10 +619,14 @@ class TaskManager:
             with self._lock:
                 task.note = note
                 self.logger.info(f"更新任务备注: {task.name} (ID: {task_id})")
-                return True
+            self._publish(events.TASK_UPDATED, task_id)
+            return True
         
         # 在历史记录中查找并更新
-        return self.history_manager.update_note(task_id, note)
+        updated = self.history_manager.update_note(task_id, note)
+        if updated:
+            self._publish(events.HISTORY_CHANGED, task_id)
+        return updated
     
     def delete_task(self, task_id: str) -> bool:
         """
@@ -472,7 +649,142 @@ class TaskManager:
             del self.tasks[task_id]
             self.task_order.remove(task_id)
             self.logger.info(f"删除任务: {task.name} (ID: {task_id})")
-            return True
+        self._publish(events.TASK_DELETED, task_id)
+        return True
+    
+    def add_tasks(self, specs: List[Dict[str, Any]]) -> List[Task]:
+        """
+        批量添加任务（只加锁一次，只发布一次事件）
+        
+        Args:
+            specs: 任务定义列表，每项包含 name、command，可选 note、raw_log
+        
+        Returns:
+            新创建的任务（与 specs 顺序一致）
+        """
+        created = []
+        with self._lock:
+            for spec in specs:
+                task_id = self._generate_task_id()
+                task = Task(
+                    id=task_id,
+                    name=spec["name"],
+                    command=spec["command"],
+                    status=TaskStatus.PENDING,
+                    gpu=parse_gpu_from_command(spec["command"]),
+                    note=spec.get("note"),
+                    raw_log=spec.get("raw_log", False)
+                )
+                self.tasks[task_id] = task
+                self.task_order.append(task_id)
+                created.append(task)
+        if created:
+            self.logger.info(f"批量添加任务: {len(created)} 个")
+            # 队列日志只追加新任务，不需要写完整快照
+            self._journal_event(events.TASK_ADDED, [task.id for task in created])
+            self._notify(events.TASKS_LOADED, count=len(created))
+        return created
+    
+    def update_tasks(self, updates: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """
+        批量更新待执行任务（只加锁一次）
+        
+        Args:
+            updates: 更新列表，每项包含 id，可选 name、command、note
+        
+        Returns:
+            {任务ID: 错误信息}，成功的任务错误信息为 None
+        """
+        results = {}
+        with self._lock:
+            for update in updates:
+                task_id = update["id"]
+                task = self.tasks.get(task_id)
+                if not task:
+                    results[task_id] = "任务不存在"
+                    continue
+                if task.status == TaskStatus.RUNNING:
+                    results[task_id] = "无法修改运行中的任务"
+                    continue
+                if update.get("name") is not None:
+                    task.name = update["name"]
+                if update.get("command") is not None:
+                    task.command = update["command"]
+                    task.gpu = parse_gpu_from_command(task.command)
+                if update.get("note") is not None:
+                    task.note = update["note"]
+                results[task_id] = None
+        updated = [task_id for task_id, error in results.items() if error is None]
+        if updated:
+            self.logger.info(f"批量更新任务: {len(updated)} 个")
+            self._journal_event(events.TASK_UPDATED, updated)
+        for task_id in updated:
+            self._notify(events.TASK_UPDATED, task_id)
+        return results
+    
+    def delete_tasks(self, task_ids: List[str]) -> Dict[str, Optional[str]]:
+        """
+        批量删除待执行任务（只加锁一次，只重建一次顺序列表）
+        
+        Args:
+            task_ids: 任务ID列表
+        
+        Returns:
+            {任务ID: 错误信息}，成功的任务错误信息为 None
+        """
+        results = {}
+        with self._lock:
+            for task_id in task_ids:
+                task = self.tasks.get(task_id)
+                if not task:
+                    results[task_id] = "任务不存在"
+                elif task.status == TaskStatus.RUNNING:
+                    results[task_id] = "无法删除运行中的任务"
+                else:
+                    del self.tasks[task_id]
+                    results[task_id] = None
+            deleted = {task_id for task_id, error in results.items() if error is None}
+            if deleted:
+                # 逐个 list.remove() 在大队列上是 O(n²)
+                self.task_order = [tid for tid in self.task_order if tid not in deleted]
+        deleted = [task_id for task_id, error in results.items() if error is None]
+        if deleted:
+            self.logger.info(f"批量删除任务: {len(deleted)} 个")
+            self._journal_event(events.TASK_DELETED, deleted)
+        for task_id in deleted:
+            self._notify(events.TASK_DELETED, task_id)
+        return results
+    
+    def requeue_tasks(self, task_ids: List[str]) -> Dict[str, Any]:
+        """
+        按历史记录重新排队：以相同名称、命令和备注创建新的待执行任务
+        
+        Args:
+            task_ids: 历史任务ID列表
+        
+        Returns:
+            {历史任务ID: 新任务或错误信息(str)}
+        """
+        results: Dict[str, Any] = {}
+        specs = []
+        records = {}
+        for record in self.history_manager.get_many(task_ids):
+            records.setdefault(record.get("id"), record)  # 最新在前，重复 ID 取最新一条
+        for task_id in task_ids:
+            record = records.get(task_id)
+            if record is None:
+                results[task_id] = "历史记录不存在"
+            else:
+                specs.append((task_id, {
+                    "name": record.get("name"),
+                    "command": record.get("command"),
+                    "note": record.get("note"),
+                    "raw_log": bool(record.get("raw_log")),
+                }))
+        created = self.add_tasks([spec for _, spec in specs])
+        for (task_id, _), task in zip(specs, created):
+            results[task_id] = task
+        return results
     
     def reorder_tasks(self, new_order: List[str]) -> bool:
         """
@@ -495,22 +807,24 @@ class TaskManager:
             # 保留运行中任务的位置，重排待执行任务
             running_ids = [t.id for t in self.get_running_tasks()]
             self.task_order = running_ids + new_order
-            return True
+        self._publish(events.TASKS_REORDERED)
+        return True
     
-    def get_busy_gpus(self) -> set:
+    def get_busy_gpus(self, running_tasks: List[Task] = None) -> set:
         """获取当前被占用的 GPU"""
         busy = set()
-        for task in self.get_running_tasks():
+        for task in running_tasks if running_tasks is not None else self.get_running_tasks():
             if task.gpu:
                 busy.update(task.gpu)
         return busy
     
-    def check_gpu_conflict(self, task_id: str) -> Optional[str]:
+    def check_gpu_conflict(self, task_id: str, running_tasks: List[Task] = None) -> Optional[str]:
         """
         检查 GPU 冲突
         
         Args:
             task_id: 要检查的任务ID
+            running_tasks: 运行中任务（批量检查时由调用方预先获取，避免每个任务都遍历一次）
         
         Returns:
             冲突描述，无冲突返回 None
@@ -519,12 +833,14 @@ class TaskManager:
         if not task or not task.gpu:
             return None
         
-        busy_gpus = self.get_busy_gpus()
+        if running_tasks is None:
+            running_tasks = self.get_running_tasks()
+        busy_gpus = self.get_busy_gpus(running_tasks)
         conflict = set(task.gpu) & busy_gpus
         
         if conflict:
             # 找到占用这些 GPU 的任务
-            for running_task in self.get_running_tasks():
+            for running_task in running_tasks:
                 if running_task.gpu and set(running_task.gpu) & conflict:
                     return f"GPU {','.join(map(str, conflict))} 正被「{running_task.name}」占用"
         
@@ -555,6 +871,11 @@ class TaskManager:
         if conflict:
             raise ValueError(conflict)
         
+        launch_start = time.perf_counter()
+        admitted = time.time()
+        task.mark("eligible", admitted)  # 手动运行：轮到即启动
+        task.mark("admitted", admitted)
+        
         # 创建日志文件
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_name = re.sub(r'[^\w\-]', '_', task.name)[:30]
@@ -563,35 +884,47 @@ class TaskManager:
         
         # 启动进程
         with self._lock:
+            # API 在线程池中调用，同一任务可能被并发启动
+            if task.status != TaskStatus.PENDING:
+                raise ValueError(f"任务状态无效: {task.status}")
             task.status = TaskStatus.RUNNING
             task.start_time = datetime.now()
             
-            log_file = open(task.log_file, 'w', encoding='utf-8')
-            
             # 设置环境变量确保 Python 子进程使用 UTF-8 和无缓冲输出
             env = os.environ.copy()
             env['PYTHONIOENCODING'] = 'utf-8'
             env['PYTHONUNBUFFERED'] = '1'  # 禁用输出缓冲，实时显示日志
             env['COLUMNS'] = '120'  # 限制终端宽度，使进度条等适配 WebUI 显示
             
-            # 使用 start_new_session=True 使任务进程独立于 WebUI 进程
-            # 这样 WebUI 重启不会终止正在运行的任务
-            task.process = subprocess.Popen(
-                task.command,
-                shell=True,
-                stdout=log_file,
-                stderr=subprocess.STDOUT,
-                cwd=str(self.config_dir),
-                text=True,
-                encoding='utf-8',
-                env=env,
-                start_new_session=True  # 创建新会话，进程独立
-            )
+            if self.output_pump and not task.raw_log:
+                self._start_with_pump(task, env)
+            else:
+                log_file = open(task.log_file, 'w', encoding='utf-8')
+                
+                # 使用 start_new_session=True 使任务进程独立于 WebUI 进程
+                # 这样 WebUI 重启不会终止正在运行的任务
+                task.process = subprocess.Popen(
+                    task.command,
+                    shell=True,
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                    cwd=str(self.config_dir),
+                    text=True,
+                    encoding='utf-8',
+                    env=env,
+                    start_new_session=True  # 创建新会话，进程独立
+                )
+                log_file.close()
+            task.mark("spawned")
             
             # 从待执行列表移除
             if task_id in self.task_order:
                 self.task_order.remove(task_id)
         
+        # 在内存中跟踪最近的输出
+        log_buffers.open(task.id, task.log_file,
+                         on_first_output=lambda timestamp: task.mark("first_output", timestamp))
+        
         # 调用启动回调（用于持久化 PID）
         if self.on_task_started:
             self.on_task_started(task.id, task.process.pid, task.log_file, task.name, task.command)
@@ -605,8 +938,78 @@ class TaskManager:
         monitor_thread.start()
         
         self.logger.info(f"启动任务: {task.name} (PID: {task.process.pid}, 独立进程)")
+        self._publish(events.TASK_STARTED, task.id, launch_seconds=time.perf_counter() - launch_start)
         return task
     
+    def run_tasks(self, task_ids: List[str]) -> Dict[str, Optional[str]]:
+        """
+        批量运行任务（按给定顺序启动，后启动的任务会与先启动的任务检查 GPU 冲突）
+        
+        Args:
+            task_ids: 任务ID列表
+        
+        Returns:
+            {任务ID: 错误信息}，成功的任务错误信息为 None
+        """
+        results = {}
+        for task_id in task_ids:
+            try:
+                self.run_task(task_id)
+                results[task_id] = None
+            except ValueError as e:
+                results[task_id] = str(e)
+        return results
+    
+    def _start_with_pump(self, task: Task, env: Dict[str, str]):
+        """
+        通过输出泵启动任务：任务输出写入管道，由输出泵压缩进度条帧后写入日志
+        
+        输出泵是独立进程（新会话），WebUI 重启时任务和输出泵都继续运行，
+        管道不会因 WebUI 退出而断开。停止任务时只需终止任务进程组，
+        输出泵读到 EOF 后写出剩余内容并自行退出。
+        """
+        open(task.log_file, 'w').close()
+        
+        task.process = subprocess.Popen(
+            task.command,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=str(self.config_dir),
+            env=env,
+            start_new_session=True
+        )
+        
+        pump_script = Path(__file__).parent / "pump.py"
+        try:
+            task.pump_process = subprocess.Popen(
+                [sys.executable, str(pump_script),
+                 "--log", task.log_file,
+                 "--interval", str(self.compact_interval)],
+                stdin=task.process.stdout,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                cwd=str(self.config_dir),
+                start_new_session=True
+            )
+        except Exception:
+            # 输出泵启动失败时终止任务，避免任务因管道无人读取而阻塞
+            task.process.kill()
+            task.process.wait()
+            raise
+        finally:
+            # 管道读端只由输出泵持有
+            task.process.stdout.close()
+    
+    def _wait_pump(self, task: Task, timeout: float = 10):
+        """等待输出泵写完剩余日志"""
+        if not task.pump_process:
+            return
+        try:
+            task.pump_process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.logger.warning(f"输出泵未按时退出: {task.name}")
+    
     def _monitor_task(self, task: Task):
         """监控任务执行状态"""
         if not task.process:
@@ -614,6 +1017,9 @@ class TaskManager:
         
         return_code = task.process.wait()
         task.end_time = datetime.now()
+        task.mark("exited", task.end_time.timestamp())
+        self._wait_pump(task)
+        log_buffers.finish(task.id)
         
         # 处理 None 退出码的情况（理论上不应该发生，但做防御性处理）
         if return_code is None:
@@ -635,9 +1041,11 @@ class TaskManager:
             self.logger.error(f"任务失败: {task.name} ({task.error_message})")
         
         # 发送通知
-        self._send_task_notification(task)
+        if self._send_task_notification(task):
+            task.mark("notified")
         
         # 添加到历史（持久化）
+        task.mark("persisted")
         self.history_manager.add(task.to_dict())
         
         # 调用完成回调（用于从持久化存储移除 PID）
@@ -648,6 +1056,9 @@ class TaskManager:
         with self._lock:
             if task.id in self.tasks:
                 del self.tasks[task.id]
+        
+        log_buffers.evict(task.id)
+        self._publish(events.TASK_FINISHED, task.id, status=task.status.value)
     
     def stop_task(self, task_id: str) -> bool:
         """
@@ -660,35 +1071,108 @@ class TaskManager:
             是否成功停止
         """
         task = self.tasks.get(task_id)
-        if not task or task.status != TaskStatus.RUNNING:
-            return False
+        with self._lock:
+            # API 在线程池中调用，同一任务的并发停止请求只处理一次
+            if not task or task.status != TaskStatus.RUNNING or task_id in self._stopping:
+                return False
+            self._stopping.add(task_id)
+        
+        try:
+            return self._stop_running_task(task)
+        finally:
+            with self._lock:
+                self._stopping.discard(task_id)
+    
+    def stop_tasks(self, task_ids: List[str]) -> Dict[str, Optional[str]]:
+        """
+        批量停止任务：先向所有任务发送 SIGTERM，再逐个等待退出
+        
+        各任务的 5 秒 SIGTERM 等待时间相互重叠，停止 N 个任务不再需要 N × 5 秒。
         
+        Args:
+            task_ids: 任务ID列表
+        
+        Returns:
+            {任务ID: 错误信息}，成功的任务错误信息为 None
+        """
+        results = {}
+        tasks = []
+        with self._lock:
+            for task_id in task_ids:
+                task = self.tasks.get(task_id)
+                if not task or task.status != TaskStatus.RUNNING or task_id in self._stopping:
+                    results[task_id] = "任务不存在或未在运行"
+                else:
+                    self._stopping.add(task_id)
+                    results[task_id] = None
+                    tasks.append(task)
+        
+        try:
+            signalled = [(task, self._terminate(task)) for task in tasks]
+            # 所有任务共用同一个 SIGTERM 等待期限
+            deadline = time.monotonic() + 5
+            for task, pgid in signalled:
+                if not self._stop_running_task(task, pgid, max(deadline - time.monotonic(), 0)):
+                    results[task.id] = "任务不存在或未在运行"
+        finally:
+            with self._lock:
+                self._stopping.difference_update(task.id for task in tasks)
+        return results
+    
+    def _terminate(self, task: Task) -> Optional[int]:
+        """向任务进程组发送 SIGTERM，返回进程组 ID（进程已结束时返回 None）"""
+        if not task.process:
+            return None
+        import os
+        import signal
+        try:
+            # 使用进程组终止（因为启动时使用了 start_new_session=True）
+            # 这会终止主进程及其所有子进程
+            pgid = os.getpgid(task.process.pid)
+            os.killpg(pgid, signal.SIGTERM)
+            return pgid
+        except (ProcessLookupError, OSError) as e:
+            # 进程可能已经结束
+            self.logger.warning(f"停止任务进程时出错: {e}")
+            return None
+    
+    def _stop_running_task(self, task: Task, pgid: Optional[int] = None, timeout: float = 5) -> bool:
+        """
+        终止任务进程并移入历史
+        
+        Args:
+            task: 运行中任务
+            pgid: 已发送 SIGTERM 的进程组 ID（批量停止时），为 None 时在此发送
+            timeout: 等待 SIGTERM 生效的时间，超时后 SIGKILL
+        """
         if task.process:
             import os
             import signal
             
-            try:
-                # 使用进程组终止（因为启动时使用了 start_new_session=True）
-                # 这会终止主进程及其所有子进程
-                pgid = os.getpgid(task.process.pid)
-                os.killpg(pgid, signal.SIGTERM)
-                
+            if pgid is None:
+                pgid = self._terminate(task)
+            if pgid is not None:
                 try:
-                    task.process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    # 如果 SIGTERM 没有效果，使用 SIGKILL
-                    os.killpg(pgid, signal.SIGKILL)
-                    task.process.wait(timeout=3)
-                    
-            except (ProcessLookupError, OSError) as e:
-                # 进程可能已经结束
-                self.logger.warning(f"停止任务进程时出错: {e}")
+                    try:
+                        task.process.wait(timeout=timeout)
+                    except subprocess.TimeoutExpired:
+                        # 如果 SIGTERM 没有效果，使用 SIGKILL
+                        os.killpg(pgid, signal.SIGKILL)
+                        task.process.wait(timeout=3)
+                except (ProcessLookupError, OSError, subprocess.TimeoutExpired) as e:
+                    # 进程可能已经结束
+                    self.logger.warning(f"停止任务进程时出错: {e}")
+            
+            task.mark("exited")
+            self._wait_pump(task)
+            log_buffers.finish(task.id)
             
             task.status = TaskStatus.STOPPED
             task.end_time = datetime.now()
             self.logger.info(f"停止任务: {task.name}")
             
             # 添加到历史（持久化）
+            task.mark("persisted")
             self.history_manager.add(task.to_dict())
             
             # 从任务列表移除
@@ -696,14 +1180,15 @@ class TaskManager:
                 if task.id in self.tasks:
                     del self.tasks[task.id]
             
+            log_buffers.evict(task.id)
+            self._publish(events.TASK_STOPPED, task.id, status=task.status.value)
             return True
         
         return False
     
     def stop_all(self):
         """停止所有运行中的任务"""
-        for task in list(self.get_running_tasks()):
-            self.stop_task(task.id)
+        self.stop_tasks([task.id for task in self.get_running_tasks()])
     
     def get_history(self, limit: int = 50) -> List[Dict[str, Any]]:
         """
@@ -720,6 +1205,7 @@ class TaskManager:
     def clear_history(self):
         """清空执行历史"""
         self.history_manager.clear()
+        self._publish(events.HISTORY_CHANGED)
     
     def get_status(self) -> Dict[str, Any]:
         """获取当前状态摘要"""
@@ -742,6 +1228,7 @@ class TaskManager:
         self._queue_thread = threading.Thread(target=self._run_queue, daemon=True)
         self._queue_thread.start()
         self.logger.info("队列自动执行已启动")
+        self._publish(events.QUEUE_STARTED)
     
     def stop_queue(self):
         """停止队列自动执行（完成当前任务后停止）"""
@@ -752,16 +1239,27 @@ class TaskManager:
         """队列执行线程"""
         import time
         
+        # 队列空出的时间（队首任务从此时起可以运行，见 Task.phases 的 eligible）
+        slot_free_since = time.time()
+        # 队首任务需要等待结束的任务（包括刚由队列启动、可能已在间隔内结束的任务）
+        waited: Dict[str, Task] = {}
+        
         try:
             while not self._queue_stop_flag:
                 # 等待当前任务完成
-                while self.get_running_tasks():
+                running = self.get_running_tasks()
+                while running:
                     if self._queue_stop_flag:
                         break
+                    waited.update((task.id, task) for task in running)
                     time.sleep(1)
+                    running = self.get_running_tasks()
                 
                 if self._queue_stop_flag:
                     break
+                for task in waited.values():
+                    slot_free_since = max(slot_free_since, task.phases.get("exited", 0))
+                waited.clear()
                 
                 # 获取下一个待执行任务
                 pending = self.get_pending_tasks()
@@ -770,10 +1268,12 @@ class TaskManager:
                     break
                 
                 next_task = pending[0]
+                next_task.mark("eligible", max(slot_free_since, next_task.phases.get("enqueued", 0)))
                 
                 # 检查 GPU 冲突
                 conflict = self.check_gpu_conflict(next_task.id)
                 if conflict:
+                    next_task.mark("gpu_blocked")
                     self.logger.warning(f"等待 GPU: {conflict}")
                     time.sleep(5)
                     continue
@@ -781,6 +1281,7 @@ class TaskManager:
                 # 运行任务
                 try:
                     self.run_task(next_task.id)
+                    waited[next_task.id] = next_task
                     self.logger.info(f"队列启动任务: {next_task.name}")
                 except Exception as e:
                     self.logger.error(f"队列执行失败: {e}")
@@ -793,13 +1294,17 @@ class TaskManager:
             self.queue_running = False
             self._queue_stop_flag = False
             self.logger.info("队列自动执行已停止")
+            self._publish(events.QUEUE_STOPPED)
     
-    def _send_task_notification(self, task: Task):
+    def _send_task_notification(self, task: Task) -> bool:
         """
         发送任务完成/失败通知
         
         Args:
             task: 任务对象
+        
+        Returns:
+            是否发送成功
         """
         try:
             from .notify import send_task_notification
@@ -812,14 +1317,20 @@ class TaskManager:
             # 获取工作区目录（从配置文件路径推断）
             workspace_dir = Path(self.config_path).parent if self.config_path else None
             
-            send_task_notification(
+            # 日志尾部优先从内存缓冲区获取
+            buffer = log_buffers.get(task.id)
+            log_tail = buffer.tail(10)[0].strip() if buffer else None
+            
+            return send_task_notification(
                 task_name=task.name,
                 status=task.status.value,
                 log_file=task.log_file,
                 duration=duration,
                 error_message=task.error_message,
-                workspace_dir=workspace_dir
+                workspace_dir=workspace_dir,
+                log_tail=log_tail
             )
         except Exception as e:
             self.logger.warning(f"发送通知失败: {e}")
+            return False
 
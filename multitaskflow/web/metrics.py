@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+运行指标（Prometheus 文本格式）
+
+指标在发生变化的地方增量维护（计数器加一、直方图落桶），/metrics 抓取时只格式化当前值：
+
+- 队列任务数和 GPU 占用：TaskMetrics 订阅事件总线，每个事件只调整受影响任务的计数
+- 任务时长、启动耗时：任务离开运行状态 / 启动事件时记录
+- WebSocket 连接数、日志推送量、通知发送、持久化写入耗时：在各自的代码路径中直接记录
+- 事件循环延迟：每次采样落入直方图；阻塞线程池、历史记录数：抓取时读取已有的统计计数（O(1)）
+"""
+
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .events import event_bus, Event
+from . import events
+
+logger = logging.getLogger("Metrics")
+
+
+# 指标名前缀
+PREFIX = "multitaskflow_"
+
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 直方图分桶（秒）
+TASK_DURATION_BUCKETS = (10, 60, 300, 600, 1800, 3600, 7200, 14400, 28800, 86400, 259200, 604800)
+LAUNCH_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+NOTIFICATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+WRITE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """指标基类：按标签值分组保存序列"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def remove(self, **labels):
+        """删除一个序列（例如队列被移除后）"""
+        with self._lock:
+            self._series.pop(self._key(labels), None)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = list(self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for key, value in sorted(series):
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """固定分桶的直方图（每个桶单独计数，输出时累加）"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LAUNCH_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [各桶计数..., +Inf 桶计数, 总和]
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """记录代码块的执行耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_series(self, key: Tuple[str, ...], series: List[float]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        # 抓取时读取已有统计的回调，返回 [(名称, 类型, 说明, [(标签字典, 值)])]
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LAUNCH_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """所有指标的 Prometheus 文本格式"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning(f"读取指标失败: {e}")
+                continue
+            for name, metric_type, help, samples in families:
+                name = PREFIX + name
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), [str(v) for v in labels.values()])} "
+                                 f"{_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+queue_tasks = registry.gauge("queue_tasks", "各队列的待执行 / 运行中任务数", ("queue", "state"))
+gpu_tasks = registry.gauge("gpu_tasks", "占用每张 GPU 的运行中任务数", ("gpu",))
+task_duration = registry.histogram("task_duration_seconds", "任务运行时长（按结束状态）", ("status",),
+                                   TASK_DURATION_BUCKETS)
+task_launch = registry.histogram("task_launch_seconds", "启动任务的耗时（创建日志文件、启动进程和监控线程）",
+                                 ("queue",), LAUNCH_BUCKETS)
+websocket_connections = registry.gauge("websocket_connections", "当前 WebSocket 连接数", ("endpoint",))
+log_stream_chars = registry.counter("log_stream_chars_total", "通过 WebSocket 推送的日志字符数")
+log_stream_frames = registry.counter("log_stream_frames_total", "通过 WebSocket 推送的日志帧数")
+log_stream_skipped = registry.counter("log_stream_skipped_lines_total", "客户端接收过慢被跳过的日志行数")
+notifications_in_flight = registry.gauge("notifications_in_flight", "正在发送的通知数")
+notifications = registry.counter("notifications_total", "通知发送次数（按结果）", ("result",))
+notification_seconds = registry.histogram("notification_seconds", "通知发送耗时", (), NOTIFICATION_BUCKETS)
+persist_seconds = registry.histogram("persist_write_seconds", "持久化写入耗时", ("store", "op"), WRITE_BUCKETS)
+loop_lag = registry.histogram("event_loop_lag_seconds", "事件循环延迟（每个采样间隔一次）", (), LOOP_LAG_BUCKETS)
+
+
+class TaskMetrics:
+    """
+    订阅事件总线，增量维护各队列的待执行 / 运行中任务数和 GPU 占用
+
+    每个任务事件只查看该任务的当前状态并调整计数；批量加载等不带任务 ID 的事件
+    重新统计该队列。任务离开运行状态时记录运行时长。
+    """
+
+    TRACKED = ("pending", "running")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue_manager = None
+        # 队列 ID -> {任务 ID: (状态, GPU 列表, 任务对象)}
+        self._tasks: Dict[str, Dict[str, Tuple[str, Tuple[int, ...], Any]]] = {}
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._gpus: Dict[int, int] = {}
+
+    def start(self, queue_manager):
+        """开始跟踪（统计已加载的队列）"""
+        self._queue_manager = queue_manager
+        event_bus.subscribe(self._on_event)
+        for queue_id in list(queue_manager.queues):
+            self._resync(queue_id)
+
+    def stop(self):
+        event_bus.unsubscribe(self._on_event)
+        with self._lock:
+            self._queue_manager = None
+            self._tasks.clear()
+            self._counts.clear()
+            self._gpus.clear()
+        queue_tasks.clear()
+        gpu_tasks.clear()
+
+    def _on_event(self, event: Event):
+        if event.queue_id is None or self._queue_manager is None:
+            return
+        if event.type == events.QUEUE_REMOVED:
+            self._drop(event.queue_id)
+            return
+        if event.type == events.TASK_STARTED and "launch_seconds" in event.data:
+            task_launch.observe(event.data["launch_seconds"], queue=event.queue_id)
+        if event.task_id is None:
+            if event.type in (events.TASKS_LOADED, events.QUEUE_ADDED):
+                self._resync(event.queue_id)
+            return
+        manager = self._queue_manager.get_queue(event.queue_id)
+        if manager is not None:
+            self._update(event.queue_id, event.task_id, manager.tasks.get(event.task_id))
+
+    def _entry(self, task) -> Optional[Tuple[str, Tuple[int, ...], Any]]:
+        if task is None or task.status.value not in self.TRACKED:
+            return None
+        return task.status.value, tuple(task.gpu or ()), task
+
+    def _update(self, queue_id: str, task_id: str, task):
+        with self._lock:
+            tasks = self._tasks.setdefault(queue_id, {})
+            old = tasks.pop(task_id, None)
+            new = self._entry(task)
+            if old is not None:
+                self._count(queue_id, old, -1)
+            if new is not None:
+                tasks[task_id] = new
+                self._count(queue_id, new, 1)
+        if old is not None and old[0] == "running" and (new is None or new[0] != "running"):
+            self._observe_duration(old[2])
+
+    def _resync(self, queue_id: str):
+        manager = self._queue_manager.get_queue(queue_id) if self._queue_manager else None
+        if manager is None:
+            return
+        with self._lock:
+            for entry in self._tasks.pop(queue_id, {}).values():
+                self._count(queue_id, entry, -1)
+            tasks = self._tasks[queue_id] = {}
+            for state in self.TRACKED:
+                self._counts.setdefault((queue_id, state), 0)
+                queue_tasks.set(self._counts[(queue_id, state)], queue=queue_id, state=state)
+            for task in list(manager.tasks.values()):
+                entry = self._entry(task)
+                if entry is not None:
+                    tasks[task.id] = entry
+                    self._count(queue_id, entry, 1)
+
+    def _drop(self, queue_id: str):
+        with self._lock:
+            for entry in self._tasks.pop(queue_id, {}).values():
+                self._count(queue_id, entry, -1)
+            for state in self.TRACKED:
+                self._counts.pop((queue_id, state), None)
+                queue_tasks.remove(queue=queue_id, state=state)
+
+    def _count(self, queue_id: str, entry: Tuple[str, Tuple[int, ...], Any], delta: int):
+        state, gpus, _ = entry
+        key = (queue_id, state)
+        self._counts[key] = self._counts.get(key, 0) + delta
+        queue_tasks.set(self._counts[key], queue=queue_id, state=state)
+        if state == "running":
+            for gpu in gpus:
+                self._gpus[gpu] = self._gpus.get(gpu, 0) + delta
+                gpu_tasks.set(self._gpus[gpu], gpu=gpu)
+
+    @staticmethod
+    def _observe_duration(task):
+        if task.start_time is None:
+            return
+        end = task.end_time.timestamp() if task.end_time else time.time()
+        task_duration.observe(max(end - task.start_time.timestamp(), 0.0), status=task.status.value)
+
+
+# 全局任务指标
+task_metrics = TaskMetrics()
+
+
+def _collect_runtime():
+    """事件循环、阻塞线程池和日志频道的已有统计"""
+    from .loopmon import loop_monitor
+    from .blocking import blocking_executor
+    from .mux import log_channels
+
+    pool = blocking_executor
+    yield ("event_loop_lag_max_seconds", "gauge", "启动以来的最大事件循环延迟", [({}, loop_monitor.max_lag)])
+    yield ("event_loop_stalls_total", "counter", "事件循环卡顿次数", [({}, loop_monitor.stalls)])
+    yield ("event_loop_blocked_stacks_total", "counter", "捕获到阻塞调用栈的事件循环卡顿次数",
+           [({}, loop_monitor.blocks)])
+    yield ("blocking_pool_active", "gauge", "阻塞线程池中执行中的操作数", [({}, pool.active)])
+    yield ("blocking_pool_queued", "gauge", "阻塞线程池中排队的操作数",
+           [({}, max(pool.submitted - pool.completed - pool.failed - pool.active, 0))])
+    yield ("blocking_pool_calls_total", "counter", "阻塞线程池完成的操作数（按结果）",
+           [({"result": "completed"}, pool.completed), ({"result": "failed"}, pool.failed)])
+    yield ("log_channels", "gauge", "有订阅者的日志频道数", [({}, len(log_channels.channels))])
+
+
+def _collect_queues():
+    """队列状态和历史记录数"""
+    queue_manager = task_metrics._queue_manager
+    if queue_manager is None:
+        return
+    info, running, history = [], [], []
+    for queue_id, manager in list(queue_manager.queues.items()):
+        name = queue_manager.queue_configs.get(queue_id, {}).get("name", queue_id)
+        info.append(({"queue": queue_id, "name": name}, 1))
+        running.append(({"queue": queue_id}, 1 if manager.queue_running else 0))
+        history.append(({"queue": queue_id}, manager.history_manager.count()))
+    yield ("queue_info", "gauge", "队列名称", info)
+    yield ("queue_auto_running", "gauge", "队列是否在自动执行", running)
+    yield ("history_records", "gauge", "历史记录数", history)
+
+
+registry.add_collector(_collect_runtime)
+registry.add_collector(_collect_queues)
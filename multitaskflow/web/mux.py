@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多路复用 WebSocket（/ws）
+
+每个浏览器只需一个连接，通过消息订阅/取消订阅多个频道：
+    status          所有队列的状态快照和增量（消息与 /ws/status 相同）
+    log:<task_id>   任务日志（消息与 /ws/logs/{task_id} 相同）
+
+客户端消息:
+    {"type": "subscribe", "channel": "status"}
+    {"type": "subscribe", "channel": "log:<task_id>", "since": <offset>}   since 可选
+    {"type": "unsubscribe", "channel": "..."}
+    {"type": "resync"}                                                     重新获取完整状态快照
+
+服务端消息都带 channel 字段，其余字段与单频道端点一致；
+另有 {"type": "unsubscribed", "channel": ...} 和 {"type": "error", "channel": ..., "message": ...}。
+
+资源共享:
+- 状态频道直接订阅 StatusHub，快照和增量的 JSON 文本由所有连接共享
+- 同一任务的日志频道（不论来自哪个连接）共享一个 LogChannel：只向日志缓冲区注册一个监听器，
+  新输出在事件循环中分发到各订阅者的发送队列，不为每个订阅者运行读取循环
+- 每个连接只有接收循环和一个发送协程，与订阅的频道数无关
+"""
+
+import json
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from .logbuffer import log_buffers, TaskLogBuffer
+from .metrics import websocket_connections
+from .ws import (
+    LogFrameSender, log_streamer, push_buffer_backlog,
+    CLEAR_LINE, FRAME_MAX_CHARS, FRAME_MAX_DELAY, MAX_HISTORY_LINES,
+)
+
+router = APIRouter()
+logger = logging.getLogger("WebSocketMux")
+
+
+# 单个连接最多订阅的日志频道数
+MAX_LOG_CHANNELS = 100
+
+# 状态频道名 / 日志频道前缀
+STATUS_CHANNEL = "status"
+LOG_CHANNEL_PREFIX = "log:"
+
+# 任务输出结束后等待任务状态更新的最长时间（秒）
+END_STATUS_TIMEOUT = 5.0
+END_STATUS_POLL = 0.1
+
+
+def _find_task(task_id: str):
+    from .state import get_queue_manager
+    try:
+        return get_queue_manager().find_task_in_all_queues(task_id)[0]
+    except RuntimeError:
+        return None
+
+
+class _LogSubscriber:
+    """日志频道中单个订阅者的状态"""
+    __slots__ = ("sender", "offset", "shown_frame", "held", "loader")
+
+    def __init__(self, sender: LogFrameSender, offset: int):
+        self.sender = sender
+        # 订阅时快照的行对齐偏移：不大于此偏移的通知中已完成的行已包含在快照里
+        self.offset = offset
+        self.shown_frame = ''
+        # 历史快照发送前（续传补读期间）暂存的新输出，发送后置为 None
+        self.held: Optional[List[Tuple[str, str, bool, int]]] = []
+        self.loader: Optional[asyncio.Task] = None
+
+
+class LogChannel:
+    """一个运行中任务的共享日志频道"""
+
+    def __init__(self, hub: "LogChannelHub", task_id: str, buffer: TaskLogBuffer):
+        self.hub = hub
+        self.task_id = task_id
+        self.buffer = buffer
+        self.subscribers: Dict[LogFrameSender, _LogSubscriber] = {}
+        self.closed = False
+
+        self._loop = asyncio.get_running_loop()
+        self._output_ended = False
+        self._end_timer: Optional[asyncio.TimerHandle] = None
+        self._end_deadline = 0.0
+
+        _, _, _, finished, _ = buffer.subscribe(self._listener, 1)
+        if finished:
+            self._output_ended = True
+
+    def _listener(self, completed: str, frame: str, final: bool, offset: int):
+        # 在跟踪线程中调用，转交给事件循环
+        self._loop.call_soon_threadsafe(self._on_output, completed, frame, final, offset)
+
+    def add(self, sender: LogFrameSender, task, since: Optional[int] = None):
+        """加入订阅者：发送历史快照（续传补读在线程池中进行），之后接收共享的增量"""
+        snapshot = self.buffer.snapshot(MAX_HISTORY_LINES)
+        sub = _LogSubscriber(sender, snapshot[4])
+        self.subscribers[sender] = sub
+        if snapshot[3]:
+            self._output_ended = True
+        sub.loader = self._loop.create_task(self._send_backlog(sub, task, snapshot, since))
+
+    async def _send_backlog(self, sub: _LogSubscriber, task, snapshot, since: Optional[int]):
+        try:
+            sub.shown_frame = await push_buffer_backlog(sub.sender, task, snapshot, since)
+        except Exception as e:
+            logger.error(f"发送历史日志失败 ({self.task_id}): {e}")
+        sub.loader = None
+        if self.subscribers.get(sub.sender) is not sub:
+            return
+        held, sub.held = sub.held, None
+        for args in held:
+            self._deliver(sub, *args)
+        if self._output_ended:
+            self._check_end()
+
+    def remove(self, sender: LogFrameSender):
+        sub = self.subscribers.pop(sender, None)
+        if sub is not None and sub.loader is not None:
+            sub.loader.cancel()
+        if not self.subscribers:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.buffer.unsubscribe(self._listener)
+        if self._end_timer is not None:
+            self._end_timer.cancel()
+            self._end_timer = None
+        for sub in self.subscribers.values():
+            if sub.loader is not None:
+                sub.loader.cancel()
+        self.subscribers.clear()
+        self.hub._discard(self)
+
+    def _on_output(self, completed: str, frame: str, final: bool, offset: int):
+        """在事件循环中把缓冲区的新输出分发给所有订阅者"""
+        if self.closed:
+            return
+        for sub in list(self.subscribers.values()):
+            if sub.held is not None:
+                sub.held.append((completed, frame, final, offset))
+            else:
+                self._deliver(sub, completed, frame, final, offset)
+
+        if final:
+            self._output_ended = True
+            self._check_end()
+
+    def _deliver(self, sub: _LogSubscriber, completed: str, frame: str, final: bool, offset: int):
+        """把一次新输出发送给单个订阅者"""
+        # 快照已包含的行不再重复发送
+        content = completed if offset > sub.offset else ''
+        current = frame if offset >= sub.offset else ''
+        if final:
+            content += current
+            if content or sub.shown_frame:
+                sub.sender.push_log((CLEAR_LINE if sub.shown_frame else '') + content, offset=offset)
+            sub.shown_frame = ''
+            return
+
+        # 发送已完成的行（覆盖已显示的进度条帧）
+        if content:
+            sub.sender.push_log((CLEAR_LINE if sub.shown_frame else '') + content, offset=offset)
+            sub.shown_frame = ''
+
+        # 未完成的行：原地刷新显示最新内容
+        if current and current != sub.shown_frame:
+            sub.sender.push_log(CLEAR_LINE + current, progress=True, offset=offset)
+            sub.shown_frame = current
+
+    def _check_end(self):
+        """输出已结束：等任务状态更新后向所有订阅者发送 end 消息"""
+        if self._end_timer is not None:
+            self._end_timer.cancel()
+        self._end_timer = None
+        if self.closed:
+            return
+        if any(sub.held is not None for sub in self.subscribers.values()):
+            # 有订阅者的历史快照尚未发送，发送后再调用
+            return
+        task = _find_task(self.task_id)
+        now = self._loop.time()
+        if not self._end_deadline:
+            self._end_deadline = now + END_STATUS_TIMEOUT
+        if task is not None and task.status.value == "running" and now < self._end_deadline:
+            self._end_timer = self._loop.call_later(END_STATUS_POLL, self._check_end)
+            return
+
+        message = {
+            "type": "end",
+            "status": task.status.value if task else "unknown",
+            "message": "任务已结束"
+        }
+        for sub in list(self.subscribers.values()):
+            sub.sender.push_message(message)
+        self.close()
+
+
+class LogChannelHub:
+    """所有连接共享的日志频道（每个运行中任务最多一个）"""
+
+    def __init__(self):
+        self.channels: Dict[str, LogChannel] = {}
+
+    def join(self, task_id: str, sender: LogFrameSender, since: Optional[int] = None) -> bool:
+        """
+        订阅任务日志
+
+        Returns:
+            是否已处理；任务没有日志缓冲区（未运行）时返回 False，由调用方单独推送
+        """
+        task = _find_task(task_id)
+        if task is None:
+            sender.push_message({"type": "error", "message": "任务不存在"})
+            return True
+
+        buffer = log_buffers.get(task_id)
+        if buffer is None:
+            return False
+
+        channel = self.channels.get(task_id)
+        if channel is None or channel.closed or channel.buffer is not buffer:
+            channel = LogChannel(self, task_id, buffer)
+            self.channels[task_id] = channel
+        channel.add(sender, task, since)
+        return True
+
+    def leave(self, task_id: str, sender: LogFrameSender):
+        channel = self.channels.get(task_id)
+        if channel is not None:
+            channel.remove(sender)
+
+    def _discard(self, channel: LogChannel):
+        if self.channels.get(channel.task_id) is channel:
+            del self.channels[channel.task_id]
+
+    def stats(self) -> Dict[str, int]:
+        channels = list(self.channels.values())
+        return {
+            "channels": len(channels),
+            "subscribers": sum(len(c.subscribers) for c in channels),
+        }
+
+
+# 全局日志频道
+log_channels = LogChannelHub()
+
+
+class _StatusInbox(asyncio.Queue):
+    """状态频道的消息队列：入队时唤醒连接的发送协程"""
+
+    def __init__(self, on_put, maxsize: int):
+        super().__init__(maxsize=maxsize)
+        self._on_put = on_put
+
+    def put_nowait(self, item):
+        super().put_nowait(item)
+        self._on_put()
+
+
+class MuxConnection:
+    """单个多路复用连接"""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.log_senders: Dict[str, LogFrameSender] = {}
+        # 不属于任何频道的控制消息（unsubscribed / error）
+        self._control = LogFrameSender(None, on_ready=self._wake)
+        # 没有日志缓冲区的任务（已结束或尚未运行）使用单独的推送协程
+        self._fallback_tasks: Dict[str, asyncio.Task] = {}
+        self._status_inbox: Optional[_StatusInbox] = None
+        self._event = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def _wake(self):
+        self._event.set()
+
+    # ============ 订阅 ============
+
+    def subscribe(self, channel: str, since: Optional[int] = None):
+        if channel == STATUS_CHANNEL:
+            self._subscribe_status()
+        elif channel.startswith(LOG_CHANNEL_PREFIX) and len(channel) > len(LOG_CHANNEL_PREFIX):
+            self._subscribe_log(channel, since)
+        else:
+            self._send_error(channel, "未知频道")
+
+    def unsubscribe(self, channel: str):
+        if channel == STATUS_CHANNEL:
+            if self._status_inbox is not None:
+                from .status import status_hub
+                status_hub.unsubscribe(self._status_inbox)
+                self._status_inbox = None
+        elif channel in self.log_senders:
+            self._drop_log(channel)
+        else:
+            return
+        self._send_control({"channel": channel, "type": "unsubscribed"})
+
+    def _subscribe_status(self):
+        from .status import status_hub, SUBSCRIBER_QUEUE_SIZE
+        if self._status_inbox is None:
+            self._status_inbox = _StatusInbox(self._wake, SUBSCRIBER_QUEUE_SIZE)
+            status_hub.subscribe(self._status_inbox)
+        # 订阅（或重复订阅）时发送完整快照
+        status_hub.request_resync(self._status_inbox)
+
+    def _subscribe_log(self, channel: str, since: Optional[int]):
+        if channel in self.log_senders:
+            self._drop_log(channel)
+        elif len(self.log_senders) >= MAX_LOG_CHANNELS:
+            self._send_error(channel, f"最多订阅 {MAX_LOG_CHANNELS} 个日志频道")
+            return
+
+        task_id = channel[len(LOG_CHANNEL_PREFIX):]
+        sender = LogFrameSender(None, channel=channel, on_ready=self._wake)
+        self.log_senders[channel] = sender
+        if not log_channels.join(task_id, sender, since):
+            self._fallback_tasks[channel] = asyncio.create_task(
+                log_streamer.stream_log(task_id, sender, since)
+            )
+
+    def _drop_log(self, channel: str):
+        sender = self.log_senders.pop(channel)
+        sender.closed = True
+        log_channels.leave(channel[len(LOG_CHANNEL_PREFIX):], sender)
+        task = self._fallback_tasks.pop(channel, None)
+        if task is not None:
+            task.cancel()
+
+    # ============ 发送 ============
+
+    def _send_control(self, message: Dict[str, Any]):
+        self._control.push_message(message)
+
+    def _send_error(self, channel: Any, message: str):
+        self._send_control({"channel": channel, "type": "error", "message": message})
+
+    def _has_urgent(self) -> bool:
+        """是否有不需要等待合并的内容（状态消息、控制消息或已满一帧的日志）"""
+        if self._status_inbox is not None and not self._status_inbox.empty():
+            return True
+        if self._control.pending:
+            return True
+        queued = 0
+        for sender in self.log_senders.values():
+            if sender.pending_messages:
+                return True
+            queued += sender.queued_chars
+        return queued >= FRAME_MAX_CHARS
+
+    async def _send_pending(self):
+        from .status import status_hub, RESYNC
+
+        for message in self._control.drain():
+            await self.websocket.send_json(message)
+
+        inbox = self._status_inbox
+        while inbox is not None and not inbox.empty():
+            item = inbox.get_nowait()
+            if item is RESYNC:
+                item = status_hub.snapshot_text()
+            # 共享的 JSON 文本只在开头插入 channel 字段，不重新序列化
+            await self.websocket.send_text('{"channel": "status", ' + item[1:])
+
+        for channel, sender in list(self.log_senders.items()):
+            if not sender.pending:
+                continue
+            for frame in sender.drain():
+                await self.websocket.send_json(frame)
+            # 已结束的无缓冲推送协程
+            task = self._fallback_tasks.get(channel)
+            if task is not None and task.done():
+                self._fallback_tasks.pop(channel, None)
+
+    async def _run_writer(self):
+        """连接的唯一发送协程"""
+        try:
+            while not self.closed:
+                await self._event.wait()
+                self._event.clear()
+                if self.closed:
+                    break
+                # 合并等待：只有少量日志时稍等片刻，和后续内容一起发送
+                if not self._has_urgent():
+                    await asyncio.sleep(FRAME_MAX_DELAY)
+                    self._event.clear()
+                await self._send_pending()
+        except (WebSocketDisconnect, RuntimeError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"多路复用发送错误: {e}")
+        finally:
+            self.closed = True
+            self._control.closed = True
+            for sender in self.log_senders.values():
+                sender.closed = True
+
+    def start(self):
+        self._writer = asyncio.create_task(self._run_writer())
+
+    def close(self):
+        """断开连接：释放所有订阅"""
+        self.closed = True
+        self._event.set()
+        for channel in list(self.log_senders):
+            self._drop_log(channel)
+        if self._status_inbox is not None:
+            from .status import status_hub
+            status_hub.unsubscribe(self._status_inbox)
+            self._status_inbox = None
+        if self._writer is not None:
+            self._writer.cancel()
+
+    # ============ 接收 ============
+
+    def handle(self, message: Any):
+        """处理客户端消息"""
+        if not isinstance(message, dict):
+            self._send_error(None, "消息格式错误")
+            return
+        msg_type = message.get("type")
+        channel = message.get("channel")
+
+        if msg_type == "resync":
+            if self._status_inbox is not None:
+                from .status import status_hub
+                status_hub.request_resync(self._status_inbox)
+            return
+        if msg_type not in ("subscribe", "unsubscribe") or not isinstance(channel, str):
+            self._send_error(channel, "消息格式错误")
+            return
+
+        if msg_type == "unsubscribe":
+            self.unsubscribe(channel)
+            return
+
+        since = message.get("since")
+        if since is not None and (not isinstance(since, int) or isinstance(since, bool)):
+            since = None
+        self.subscribe(channel, since)
+
+
+@router.websocket("/ws")
+async def websocket_mux(websocket: WebSocket):
+    """
+    多路复用 WebSocket 端点（状态频道 + 任意多个日志频道）
+    """
+    await websocket.accept()
+    websocket_connections.inc(endpoint="mux")
+    connection = MuxConnection(websocket)
+    connection.start()
+    try:
+        while not connection.closed:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+            except ValueError:
+                connection.handle(None)
+                continue
+            connection.handle(message)
+    except (WebSocketDisconnect, RuntimeError, ConnectionError):
+        pass
+    except Exception as e:
+        logger.error(f"多路复用连接错误: {e}")
+    finally:
+        connection.close()
+        websocket_connections.dec(endpoint="mux")
@@ -33,18 +33,17 @@ def get_pushplus_token(workspace_dir: Path = None) -> Optional[str]:
     Returns:
         Token 字符串，如果未配置则返回 None
     """
-    # 1. 尝试从工作区设置读取
+    # 1. 尝试从工作区设置读取（WebUI 运行时直接使用内存中的设置）
     if workspace_dir:
-        workspace_file = workspace_dir / ".workspace.json"
-        if workspace_file.exists():
-            try:
-                import json
-                data = json.loads(workspace_file.read_text())
-                token = data.get("pushplus_token", "").strip()
-                if token:
-                    return token
-            except Exception:
-                pass
+        from .workspace import find_store, read_workspace_file
+        store = find_store(workspace_dir)
+        if store is not None:
+            token = store.pushplus_token
+        else:
+            token = read_workspace_file(workspace_dir).get("pushplus_token", "")
+            token = token.strip() if isinstance(token, str) else ""
+        if token:
+            return token
     
     # 2. 尝试从环境变量读取
     try:
@@ -68,14 +67,17 @@ def get_last_n_lines(file_path: str, n: int = 10) -> str:
     Returns:
         最后 N 行内容
     """
-    if not file_path or not Path(file_path).exists():
+    from .logstore import log_exists, read_log_tail
+    
+    if not log_exists(file_path):
         return "(日志不可用)"
     
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            lines = f.readlines()
-            last_lines = lines[-n:] if len(lines) >= n else lines
-            return ''.join(last_lines).strip()
+        # 只读取末尾一段（归档日志只解压最后的块），足够容纳 N 行
+        content = read_log_tail(file_path, max(n, 1) * 4096)
+        lines = content.splitlines(keepends=True)
+        last_lines = lines[-n:] if len(lines) >= n else lines
+        return ''.join(last_lines).strip()
     except Exception as e:
         return f"(读取日志失败: {e})"
 
@@ -99,6 +101,21 @@ def send_pushplus(token: str, title: str, content: str) -> bool:
         "template": "html"  # 使用 HTML 模板
     }
     
+    from .metrics import notifications_in_flight, notifications, notification_seconds
+    notifications_in_flight.inc()
+    start = time.perf_counter()
+    success = False
+    try:
+        success = _post_with_retries(data)
+    finally:
+        notifications_in_flight.dec()
+        notification_seconds.observe(time.perf_counter() - start)
+        notifications.inc(result="sent" if success else "failed")
+    return success
+
+
+def _post_with_retries(data: dict) -> bool:
+    """发送 PushPlus 请求，失败或受频率限制时指数退避重试"""
     max_retries = 3
     base_wait_time = 2
     
@@ -139,7 +156,8 @@ def send_task_notification(
     log_file: str = None,
     duration: float = None,
     error_message: str = None,
-    workspace_dir: Path = None
+    workspace_dir: Path = None,
+    log_tail: str = None
 ) -> bool:
     """
     发送任务完成/失败通知
@@ -151,6 +169,7 @@ def send_task_notification(
         duration: 运行时长（秒）
         error_message: 错误信息
         workspace_dir: 工作区目录
+        log_tail: 日志尾部（调用方已从内存缓冲区获取时传入，不再读取日志文件）
         
     Returns:
         是否发送成功
@@ -180,7 +199,8 @@ def send_task_notification(
             duration_str = f"{minutes}分钟"
     
     # 获取日志尾部
-    log_tail = get_last_n_lines(log_file, 10)
+    if log_tail is None:
+        log_tail = get_last_n_lines(log_file, 10)
     
     # 生成 HTML 内容
     title = f"{icon} {task_name} - {status_text}"
@@ -230,21 +250,15 @@ def save_pushplus_token(workspace_dir: Path, token: str) -> bool:
     Returns:
         是否保存成功
     """
-    import json
-    
-    workspace_file = workspace_dir / ".workspace.json"
+    from .workspace import find_store, update_workspace_file
     
     try:
-        # 读取现有数据
-        data = {}
-        if workspace_file.exists():
-            data = json.loads(workspace_file.read_text())
-        
-        # 更新 token
-        data["pushplus_token"] = token.strip()
-        
-        # 保存
-        workspace_file.write_text(json.dumps(data, indent=2, ensure_ascii=False))
+        # WebUI 运行时交给 WorkspaceStore 合并写入，避免与队列状态写入互相覆盖
+        store = find_store(workspace_dir)
+        if store is not None:
+            store.pushplus_token = token
+        else:
+            update_workspace_file(workspace_dir, pushplus_token=token.strip())
         logger.info("PushPlus Token 已保存到工作区")
         return True
     except Exception as e:
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+运行中服务的性能分析
+
+- SamplingProfiler：采样式 CPU 分析。独立线程按固定间隔读取所有线程的调用栈
+  （sys._current_frames），不修改被分析的代码，也不需要重启服务。
+  结果可导出为折叠调用栈（flamegraph.pl / speedscope 可直接读取）或 pstats 文件
+  （pstats / snakeviz 可读取，调用次数为采样次数，时间按采样间隔估计）。
+- AllocationTracer：基于 tracemalloc 的内存分配快照，可与基线快照对比找出增长的分配位置。
+
+两者都只在调用期间工作：未分析时没有采样线程，tracemalloc 也不开启，不影响服务性能。
+"""
+
+import os
+import sys
+import time
+import marshal
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("Profiler")
+
+
+# 默认采样间隔（秒）
+DEFAULT_INTERVAL = 0.005
+
+# 单次分析的最长时间（秒）
+MAX_SECONDS = 120
+
+# tracemalloc 默认保存的调用栈深度
+DEFAULT_TRACE_FRAMES = 1
+
+# 快照统计的分组方式
+SNAPSHOT_GROUPS = ("lineno", "filename", "traceback")
+
+# 函数标识: (文件名, 首行行号, 函数名)，与 pstats 的键相同
+FrameKey = Tuple[str, int, str]
+
+
+def _short_path(filename: str) -> str:
+    """去掉 sys.path 中最长的匹配前缀（site-packages/... → 包内相对路径）"""
+    best = ""
+    for entry in sys.path:
+        if entry and filename.startswith(entry) and len(entry) > len(best):
+            best = entry
+    return filename[len(best):].lstrip(os.sep) if best else filename
+
+
+class SamplingProfiler:
+    """采样式 CPU 分析器（一次性使用：start → stop → 导出）"""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, thread: Optional[str] = None):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            thread: 只采样名称包含该字符串的线程（如 MainThread 为事件循环线程）
+        """
+        self.interval = interval
+        self.thread = thread
+
+        # (线程名, 调用栈（外层 → 内层）) -> 采样次数 / 累计秒数
+        self._counts: Counter = Counter()
+        self._seconds: Dict[Tuple[str, Tuple[FrameKey, ...]], float] = {}
+        self._keys: Dict[Any, FrameKey] = {}
+        self._names: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止采样（等待采样线程退出，最多一个采样间隔）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.started_at is not None:
+            self.elapsed = time.perf_counter() - self.started_at
+
+    def _key(self, code) -> FrameKey:
+        key = self._keys.get(code)
+        if key is None:
+            key = self._keys[code] = (code.co_filename, code.co_firstlineno, code.co_name)
+        return key
+
+    def _thread_name(self, ident: int) -> str:
+        name = self._names.get(ident)
+        if name is None:
+            self._names = {t.ident: t.name for t in threading.enumerate()}
+            name = self._names.setdefault(ident, f"Thread-{ident}")
+        return name
+
+    def _run(self):
+        me = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            # 按实际间隔计时（采样线程可能因 GIL 被推迟）
+            weight = now - last
+            last = now
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                name = self._thread_name(ident)
+                if self.thread and self.thread not in name:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._key(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                sample = (name, tuple(stack))
+                self._counts[sample] += 1
+                self._seconds[sample] = self._seconds.get(sample, 0.0) + weight
+            del frames
+            self.samples += 1
+
+    # ============ 导出 ============
+
+    def collapsed(self) -> str:
+        """
+        折叠调用栈文本：每行 ``线程;外层函数;...;内层函数 采样次数``，按采样次数降序
+
+        函数格式为 ``函数名 (文件:行号)``，与 py-spy 的输出一致。
+        """
+        labels: Dict[FrameKey, str] = {}
+        lines = []
+        for (name, stack), count in self._counts.most_common():
+            parts = [name]
+            for key in stack:
+                label = labels.get(key)
+                if label is None:
+                    label = labels[key] = f"{key[2]} ({_short_path(key[0])}:{key[1]})".replace(";", ":")
+                parts.append(label)
+            lines.append(f"{';'.join(parts)} {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def pstats(self) -> bytes:
+        """
+        pstats 格式（marshal 序列化，与 cProfile.Profile.dump_stats() 的文件相同）
+
+        调用次数为该函数出现在调用栈中的采样次数（递归只计一次），
+        tottime / cumtime 为位于栈顶 / 位于栈中的采样累计时间。
+        """
+        # 函数 -> [调用次数, 调用次数, tottime, cumtime, {调用方: [同上]}]
+        stats: Dict[FrameKey, list] = {}
+        for sample, count in self._counts.items():
+            stack = sample[1]
+            seconds = self._seconds[sample]
+            seen = set()
+            for index, key in enumerate(stack):
+                entry = stats.get(key)
+                if entry is None:
+                    entry = stats[key] = [0, 0, 0.0, 0.0, {}]
+                leaf = index == len(stack) - 1
+                if leaf:
+                    entry[2] += seconds
+                if key in seen:
+                    continue
+                seen.add(key)
+                entry[0] += count
+                entry[1] += count
+                entry[3] += seconds
+                if index:
+                    edge = entry[4].setdefault(stack[index - 1], [0, 0, 0.0, 0.0])
+                    edge[0] += count
+                    edge[1] += count
+                    edge[2] += seconds if leaf else 0.0
+                    edge[3] += seconds
+        return marshal.dumps({
+            key: (cc, nc, tt, ct, {caller: tuple(edge) for caller, edge in callers.items()})
+            for key, (cc, nc, tt, ct, callers) in stats.items()
+        })
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "stacks": len(self._counts),
+            "seconds": round(self.elapsed, 3),
+            "interval_ms": self.interval * 1000,
+            "threads": sorted({name for name, _ in self._counts}),
+        }
+
+
+class AllocationTracer:
+    """tracemalloc 快照与基线对比"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self.baseline_time: Optional[float] = None
+
+    def start(self, frames: int = DEFAULT_TRACE_FRAMES) -> Dict[str, Any]:
+        """开始跟踪内存分配，并以当前状态为基线（已在跟踪时只重置基线）"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                logger.info(f"开始跟踪内存分配（调用栈深度 {frames}）")
+            self._take_baseline()
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """停止跟踪并释放跟踪数据"""
+        with self._lock:
+            self._baseline = None
+            self.baseline_time = None
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+                logger.info("停止跟踪内存分配")
+        return self.status()
+
+    def _take_baseline(self):
+        self._baseline = self._snapshot()
+        self.baseline_time = time.time()
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "traced_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            # tracemalloc 自身占用的内存
+            "overhead_kb": round(tracemalloc.get_tracemalloc_memory() / 1024, 1),
+            "baseline_time": self.baseline_time,
+        }
+
+    def snapshot(self, group_by: str = "lineno", limit: int = 30, diff: bool = True,
+                 rebase: bool = False) -> Dict[str, Any]:
+        """
+        获取当前内存分配统计
+
+        Args:
+            group_by: lineno / filename / traceback
+            limit: 返回的条目数（按大小或增长量降序）
+            diff: 与基线快照对比（返回增长量）
+            rebase: 以本次快照作为新的基线（下次对比只看此后的增长）
+
+        Raises:
+            RuntimeError: 未开始跟踪
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("未开始跟踪内存分配")
+            snapshot = self._snapshot()
+            if diff and self._baseline is not None:
+                stats = snapshot.compare_to(self._baseline, group_by)
+                entries = [self._entry(stat, group_by, stat.size_diff, stat.count_diff) for stat in stats[:limit]]
+                total_diff = sum(stat.size_diff for stat in stats)
+            else:
+                stats = snapshot.statistics(group_by)
+                entries = [self._entry(stat, group_by) for stat in stats[:limit]]
+                total_diff = None
+            total = sum(stat.size for stat in stats)
+            if rebase:
+                self._baseline = snapshot
+                self.baseline_time = time.time()
+
+        result = self.status()
+        result.update({
+            "group_by": group_by,
+            "diff": total_diff is not None,
+            "total_kb": round(total / 1024, 1),
+            "total_diff_kb": round(total_diff / 1024, 1) if total_diff is not None else None,
+            "stats": entries,
+        })
+        return result
+
+    @staticmethod
+    def _entry(stat, group_by: str, size_diff: int = None, count_diff: int = None) -> Dict[str, Any]:
+        frames = [f"{_short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback]
+        if group_by == "filename":
+            frames = [_short_path(stat.traceback[0].filename)]
+        entry: Dict[str, Any] = {
+            "location": frames[0] if group_by != "traceback" else frames,
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count,
+        }
+        if size_diff is not None:
+            entry["size_diff_kb"] = round(size_diff / 1024, 1)
+            entry["count_diff"] = count_diff
+        return entry
+
+
+# 全局内存分配跟踪
+allocation_tracer = AllocationTracer()
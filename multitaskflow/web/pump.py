@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+任务输出泵
+
+位于任务进程的输出管道和日志文件之间，写入前压缩进度条帧：
+同一行中连续的 \\r 帧按时间间隔只保留最后一帧，其余被覆盖的帧直接丢弃。
+压缩后的日志经进度条折叠后与原始输出完全一致。
+
+输出泵以独立进程运行（新会话），与任务进程一样不受 WebUI 重启影响。
+只依赖标准库，可直接按文件路径执行：
+
+    python pump.py --log task.log --interval 1.0 < pipe
+"""
+
+import os
+import sys
+import time
+import codecs
+import select
+import argparse
+from typing import List, Optional
+
+
+# 读取块大小
+READ_SIZE = 64 * 1024
+
+# 默认压缩间隔（秒）：同一进度条行最多每隔这么久写入一帧
+DEFAULT_COMPACT_INTERVAL = 1.0
+
+
+def _is_blank(text: str) -> bool:
+    return not text or text.isspace()
+
+
+class ProgressCompactor:
+    """
+    写入时进度条压缩器
+
+    - 行中第一个 \\r 之前的内容直接写出（普通输出不受影响，也不延迟）
+    - 进入进度条行后，每隔 interval 秒最多写出一帧，中间的帧只保留最新一个
+    - 行结束时保证写出该行最后一个非空帧，折叠结果与原始输出一致
+    """
+
+    def __init__(self, interval: float = DEFAULT_COMPACT_INTERVAL):
+        self.interval = interval
+        # 当前行是否已进入进度条模式（出现过 \r）
+        self._in_cr = False
+        # 尚未写出的最新非空帧
+        self._pending: Optional[str] = None
+        # 当前帧（最后一个 \r 之后）已接收的内容
+        self._frame_parts: List[str] = []
+        self._last_emit = 0.0
+
+        # 统计信息
+        self.frames_in = 0
+        self.frames_out = 0
+
+    def feed(self, text: str, now: float) -> str:
+        """输入一段文本，返回应写入日志的内容"""
+        out = []
+        pos = 0
+        n = len(text)
+        while pos < n:
+            cr = text.find('\r', pos)
+            nl = text.find('\n', pos)
+            if cr < 0 and nl < 0:
+                segment = text[pos:]
+                if self._in_cr:
+                    self._frame_parts.append(segment)
+                else:
+                    out.append(segment)
+                break
+
+            if nl < 0 or (0 <= cr < nl):
+                end, delim = cr, '\r'
+            else:
+                end, delim = nl, '\n'
+            segment = text[pos:end]
+            pos = end + 1
+
+            if not self._in_cr:
+                out.append(segment)
+                out.append(delim)
+                if delim == '\r':
+                    # 行中第一帧：直接写出并进入进度条模式
+                    self._in_cr = True
+                    self._last_emit = now
+                    self.frames_in += 1
+                    self.frames_out += 1
+                continue
+
+            if self._frame_parts:
+                self._frame_parts.append(segment)
+                segment = ''.join(self._frame_parts)
+                self._frame_parts = []
+
+            if delim == '\r':
+                self.frames_in += 1
+                if _is_blank(segment):
+                    continue
+                if now - self._last_emit >= self.interval:
+                    out.append(segment)
+                    out.append('\r')
+                    self._last_emit = now
+                    self._pending = None
+                    self.frames_out += 1
+                else:
+                    self._pending = segment
+            else:
+                # 行结束：最后一帧为空时补写最新的非空帧
+                if _is_blank(segment) and self._pending is not None:
+                    out.append(self._pending)
+                    out.append('\r')
+                    self.frames_out += 1
+                out.append(segment)
+                out.append('\n')
+                self.frames_in += 1
+                self.frames_out += 1
+                self._in_cr = False
+                self._pending = None
+
+        return ''.join(out)
+
+    def poll(self, now: float) -> str:
+        """空闲时调用：到达间隔后写出被暂存的最新帧"""
+        if self._pending is not None and now - self._last_emit >= self.interval:
+            frame = self._pending
+            self._pending = None
+            self._last_emit = now
+            self.frames_out += 1
+            return frame + '\r'
+        return ''
+
+    def finish(self) -> str:
+        """输入结束，写出所有暂存内容"""
+        out = []
+        if self._pending is not None:
+            out.append(self._pending)
+            out.append('\r')
+        out.extend(self._frame_parts)
+        self._pending = None
+        self._frame_parts = []
+        self._in_cr = False
+        return ''.join(out)
+
+
+def run_pump(source_fd: int, log_path: str, interval: float = DEFAULT_COMPACT_INTERVAL) -> int:
+    """
+    从 source_fd 读取输出，压缩进度条帧后写入日志文件，直到 EOF
+
+    Returns:
+        写入日志的字节数
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    compactor = ProgressCompactor(interval)
+    written = 0
+
+    with open(log_path, 'ab', buffering=0) as log:
+        def write(text: str):
+            nonlocal written
+            if text:
+                data = text.encode('utf-8')
+                log.write(data)
+                written += len(data)
+
+        while True:
+            # 等待输出，超时用于按间隔写出暂存的进度条帧
+            ready, _, _ = select.select([source_fd], [], [], interval if interval > 0 else None)
+            now = time.monotonic()
+            if not ready:
+                write(compactor.poll(now))
+                continue
+            try:
+                data = os.read(source_fd, READ_SIZE)
+            except InterruptedError:
+                continue
+            if not data:
+                break
+            write(compactor.feed(decoder.decode(data), now))
+            write(compactor.poll(now))
+
+        write(compactor.feed(decoder.decode(b'', final=True), time.monotonic()))
+        write(compactor.finish())
+
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MultiTaskFlow 任务输出泵")
+    parser.add_argument("--log", required=True, help="日志文件路径")
+    parser.add_argument("--interval", type=float, default=DEFAULT_COMPACT_INTERVAL,
+                        help="进度条帧写入间隔（秒）")
+    args = parser.parse_args(argv)
+
+    run_pump(sys.stdin.fileno(), args.log, args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,16 +9,21 @@
 支持任务进程独立：WebUI 重启不影响运行中的任务。
 """
 
-import json
 import uuid
 import logging
 import threading
+import time
 import psutil
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
 from .manager import TaskManager, Task, TaskStatus
+from .logstore import LogArchiver, DEFAULT_ARCHIVE_AGE_HOURS, log_exists, read_log_tail
+from .logbuffer import log_buffers
+from .workspace import WorkspaceStore
+from . import events
+from .events import event_bus
 
 logger = logging.getLogger("QueueManager")
 
@@ -48,27 +53,46 @@ class QueueManager:
         self.running_tasks: Dict[str, Dict[str, Any]] = {}
         self._lock = threading.Lock()
         
+        # 工作空间文件的唯一写入方（合并写入、原子替换、保留通知等设置项）
+        self.workspace = WorkspaceStore(self.workspace_dir, self._workspace_snapshot)
+        
+        # 队列列表的版本号（添加/移除队列时递增，各队列内部状态另有版本号）
+        self.state_version = int(time.time() * 1000)
+        
+        # 日志归档设置（小时，<= 0 表示不压缩）
+        self.log_archive_age_hours = DEFAULT_ARCHIVE_AGE_HOURS
+        
         # 确保工作空间目录存在
         self.workspace_dir.mkdir(parents=True, exist_ok=True)
         
         # 加载工作空间配置（包括恢复运行中任务）
         self._load_workspace()
         
+        # 后台日志归档器（由服务生命周期启动/停止）
+        self.log_archiver = LogArchiver(
+            get_log_dirs=lambda: [queue.log_dir for queue in list(self.queues.values())],
+            get_active_logs=self._get_active_log_files,
+            archive_age_hours=self.log_archive_age_hours,
+        )
+        
         logger.info(f"队列管理器初始化完成，工作空间: {self.workspace_dir}")
     
     def _load_workspace(self):
         """从 .workspace.json 加载队列配置和运行中任务"""
-        if not self.workspace_file.exists():
+        exists = self.workspace_file.exists()
+        data = self.workspace.load()
+        if not exists:
             logger.info("工作空间配置文件不存在，创建新配置")
             self._save_workspace()
+            self.workspace.flush()
             return
         
         try:
-            with open(self.workspace_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
             # 加载运行中任务状态
             self.running_tasks = data.get('running_tasks', {})
+            self.log_archive_age_hours = float(
+                data.get('log_archive_age_hours', DEFAULT_ARCHIVE_AGE_HOURS)
+            )
             
             for queue_config in data.get('queues', []):
                 queue_id = queue_config.get('id')
@@ -107,9 +131,7 @@ class QueueManager:
     def _load_queue(self, queue_id: str, config: Dict[str, Any]):
         """加载单个队列"""
         yaml_path = config['yaml_path']
-        # 历史文件在 YAML 所在目录的 logs/.history.json
-        yaml_dir = Path(yaml_path).parent
-        history_file = yaml_dir / "logs" / ".history.json"
+        # 历史数据库在 YAML 所在目录的 logs/.history_<yaml名>.db（由 TaskManager 决定）
         
         # 创建回调函数（闭包捕获 queue_id）
         def on_task_started(task_id, pid, log_file, task_name, command):
@@ -120,32 +142,43 @@ class QueueManager:
         
         manager = TaskManager(
             yaml_path, 
-            str(history_file),
             on_task_started=on_task_started,
-            on_task_finished=on_task_finished
+            on_task_finished=on_task_finished,
+            output_pump=config.get('output_pump', False),
+            compact_interval=config.get('compact_interval', 1.0),
+            queue_id=queue_id
         )
         self.queues[queue_id] = manager
         self.queue_configs[queue_id] = config
     
-    def _save_workspace(self):
-        """保存工作空间配置到 .workspace.json（包括运行中任务和队列状态）"""
+    def _publish(self, event_type: str, queue_id: str):
+        """记录队列列表变化（递增版本号）并发布事件"""
+        self.state_version += 1
+        event_bus.publish(event_type, queue_id=queue_id)
+    
+    def _workspace_snapshot(self) -> Dict[str, Any]:
+        """工作空间状态快照（由 WorkspaceStore 在写入时调用）"""
         # 更新队列配置中的运行状态
-        for queue_id, config in self.queue_configs.items():
-            if queue_id in self.queues:
-                config['queue_running'] = self.queues[queue_id].queue_running
+        for queue_id, config in list(self.queue_configs.items()):
+            queue = self.queues.get(queue_id)
+            if queue is not None:
+                config['queue_running'] = queue.queue_running
         
-        data = {
+        return {
             "version": "1.1",
             "updated_at": datetime.now().isoformat(),
             "queues": list(self.queue_configs.values()),
-            "running_tasks": self.running_tasks
+            "running_tasks": dict(self.running_tasks),
+            "log_archive_age_hours": self.log_archive_age_hours
         }
+    
+    def _save_workspace(self):
+        """
+        标记工作空间需要保存（包括运行中任务和队列状态）
         
-        try:
-            with open(self.workspace_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存工作空间配置失败: {e}")
+        只设置 dirty 标记，不阻塞调用方；WorkspaceStore 把一个写入间隔内的多次标记合并为一次原子写入。
+        """
+        self.workspace.mark_dirty()
     
     def _on_task_started(self, queue_id: str, task_id: str, pid: int, log_file: str, task_name: str, command: str):
         """任务启动回调：持久化 PID 和命令"""
@@ -170,6 +203,15 @@ class QueueManager:
                 self._save_workspace()
                 logger.info(f"任务 PID 已移除: {task_name}")
     
+    def _get_active_log_files(self) -> set:
+        """获取运行中任务的日志路径（归档时跳过）"""
+        active = {info.get('log_file') for info in list(self.running_tasks.values())}
+        for queue in list(self.queues.values()):
+            for task in queue.get_running_tasks():
+                active.add(task.log_file)
+        active.discard(None)
+        return active
+    
     def _restore_running_tasks(self):
         """恢复运行中任务的监控"""
         if not self.running_tasks:
@@ -222,7 +264,8 @@ class QueueManager:
             command=command,
             status=TaskStatus.RUNNING,
             log_file=log_file,
-            note="(WebUI 重启后恢复的任务)"
+            note="(WebUI 重启后恢复的任务)",
+            phases={},  # 重启前的阶段时间未保存
         )
         task.start_time = datetime.now()
         
@@ -232,6 +275,11 @@ class QueueManager:
         
         # 将任务添加到队列
         queue.tasks[task_id] = task
+        queue._publish(events.TASK_STARTED, task_id, restored=True)
+        
+        # 在内存中跟踪最近的输出（读入重启前已有的日志）
+        if log_file:
+            log_buffers.open(task_id, log_file)
         
         # 启动 PID 监控线程
         monitor_thread = threading.Thread(
@@ -270,22 +318,12 @@ class QueueManager:
             False: 失败（找到失败标记）
             None: 无法确定
         """
-        if not log_file:
-            return None
-        
-        log_path = Path(log_file)
-        if not log_path.exists():
+        if not log_exists(log_file):
             return None
         
         try:
-            # 只读取最后 100KB 的日志（避免读取过大的文件）
-            file_size = log_path.stat().st_size
-            read_size = min(file_size, 100 * 1024)
-            
-            with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
-                if file_size > read_size:
-                    f.seek(file_size - read_size)
-                content = f.read()
+            # 只读取最后 100KB 的日志（避免读取过大的文件，归档日志只解压末尾块）
+            content = read_log_tail(log_file, 100 * 1024)
             
             # 先检查失败标记（失败优先）
             for marker in self.FAILURE_MARKERS:
@@ -306,8 +344,6 @@ class QueueManager:
     
     def _monitor_pid(self, queue: TaskManager, task: Task, pid: int):
         """通过 PID 监控进程状态，结合日志分析判断任务结果"""
-        import time
-        
         return_code = None
         process_ended = False
         
@@ -339,6 +375,8 @@ class QueueManager:
         
         # 更新任务状态
         task.end_time = datetime.now()
+        task.mark("exited", task.end_time.timestamp())
+        log_buffers.finish(task.id)
         
         # 智能判断任务状态
         if return_code == 0:
@@ -372,9 +410,11 @@ class QueueManager:
                 queue.logger.info(f"任务完成: {task.name} (进程已结束)")
         
         # 发送通知
-        self._send_task_notification(queue, task)
+        if self._send_task_notification(queue, task):
+            task.mark("notified")
         
         # 添加到历史
+        task.mark("persisted")
         queue.history_manager.add(task.to_dict())
         
         # 从任务列表移除
@@ -384,6 +424,9 @@ class QueueManager:
         
         # 从持久化存储移除
         self._on_task_finished(task.id)
+        
+        log_buffers.evict(task.id)
+        queue._publish(events.TASK_FINISHED, task.id, status=task.status.value)
     
     def _generate_queue_id(self) -> str:
         """生成队列 ID"""
@@ -391,13 +434,14 @@ class QueueManager:
     
     # ============ 队列管理 ============
     
-    def add_queue(self, name: str, yaml_path: str) -> Dict[str, Any]:
+    def add_queue(self, name: str, yaml_path: str, output_pump: bool = False) -> Dict[str, Any]:
         """
         添加新队列
         
         Args:
             name: 队列名称
             yaml_path: YAML 配置文件路径
+            output_pump: 是否通过输出泵写任务日志（写入时压缩进度条帧）
             
         Returns:
             队列配置信息
@@ -418,7 +462,8 @@ class QueueManager:
             "id": queue_id,
             "name": name,
             "yaml_path": yaml_path,
-            "created_at": datetime.now().isoformat()
+            "created_at": datetime.now().isoformat(),
+            "output_pump": output_pump
         }
         
         # 加载队列
@@ -426,6 +471,7 @@ class QueueManager:
         
         # 保存配置
         self._save_workspace()
+        self._publish(events.QUEUE_ADDED, queue_id)
         
         logger.info(f"添加队列: {name} ({yaml_path})")
         return config
@@ -448,12 +494,14 @@ class QueueManager:
         queue.stop_queue()
         queue.stop_all()
         
-        # 移除
+        # 移除（保留队列日志，重新添加同一 YAML 时可恢复待执行任务）
         del self.queues[queue_id]
         del self.queue_configs[queue_id]
+        queue.journal.close()
         
         # 保存配置
         self._save_workspace()
+        self._publish(events.QUEUE_REMOVED, queue_id)
         
         logger.info(f"移除队列: {queue_id}")
         return True
@@ -505,11 +553,11 @@ class QueueManager:
         Returns:
             (task_dict, queue) 元组，如果未找到返回 (None, None)
         """
-        for queue_id, queue in self.queues.items():
-            # 获取所有历史记录（不限制数量）
-            for task_dict in queue.get_history(limit=10000):
-                if task_dict.get('id') == task_id:
-                    return task_dict, queue
+        for queue in list(self.queues.values()):
+            # 历史数据库按任务 ID 建有索引
+            task_dict = queue.history_manager.get(task_id)
+            if task_dict is not None:
+                return task_dict, queue
         return None, None
     
     # ============ 跨队列 GPU 检测 ============
@@ -585,13 +633,16 @@ class QueueManager:
         config = self.add_queue(name, yaml_path)
         return config['id']
     
-    def _send_task_notification(self, queue: TaskManager, task: Task):
+    def _send_task_notification(self, queue: TaskManager, task: Task) -> bool:
         """
         发送任务完成/失败通知
         
         Args:
             queue: 任务队列
             task: 任务对象
+        
+        Returns:
+            是否发送成功
         """
         try:
             from .notify import send_task_notification
@@ -601,14 +652,20 @@ class QueueManager:
             if task.start_time and task.end_time:
                 duration = (task.end_time - task.start_time).total_seconds()
             
+            # 日志尾部优先从内存缓冲区获取
+            buffer = log_buffers.get(task.id)
+            log_tail = buffer.tail(10)[0].strip() if buffer else None
+            
             # 使用工作区目录
-            send_task_notification(
+            return send_task_notification(
                 task_name=task.name,
                 status=task.status.value,
                 log_file=task.log_file,
                 duration=duration,
                 error_message=task.error_message,
-                workspace_dir=self.workspace_dir
+                workspace_dir=self.workspace_dir,
+                log_tail=log_tail
             )
         except Exception as e:
             logger.warning(f"发送通知失败: {e}")
+            return False
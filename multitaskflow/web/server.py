@@ -14,9 +14,9 @@ from pathlib import Path
 from typing import Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 import uvicorn
 
 # 添加父目录到路径
@@ -58,27 +58,64 @@ async def lifespan(app: FastAPI):
             # YAML 已存在于工作空间中，忽略
             pass
     
+    # 启动后台日志归档
+    queue_manager.log_archiver.start()
+    
+    # 运行指标：跟踪各队列的任务数和 GPU 占用
+    from .metrics import task_metrics
+    task_metrics.start(queue_manager)
+    
+    # 主机资源采样
+    from .hostmon import host_sampler
+    host_sampler.start(queue_manager)
+    
+    # 启动状态推送（订阅事件总线）
+    from .status import status_hub
+    await status_hub.start()
+    
+    # 监控事件循环延迟（超过卡顿阈值时记录阻塞位置的调用栈）
+    from .loopmon import loop_monitor
+    stall_threshold = getattr(app.state, 'stall_threshold', None)
+    if stall_threshold:
+        loop_monitor.stall_threshold = stall_threshold
+    loop_monitor.start()
+    
     yield
     
+    await loop_monitor.stop()
+    await status_hub.stop()
+    task_metrics.stop()
+    host_sampler.stop()
+    
     # 关闭时只停止队列调度，不终止运行中的任务进程
     # 任务进程是独立进程，WebUI 重启后可恢复监控
     try:
         queue_manager = get_queue_manager()
+        queue_manager.log_archiver.stop()
+        # 先写入尚未保存的工作空间变化：保留队列的运行状态，重启后自动恢复
+        queue_manager.workspace.close()
         for queue in queue_manager.queues.values():
             queue.stop_queue()  # 停止队列自动执行
             # 不再调用 stop_all()，让任务进程继续运行
+            queue.journal.close()  # 写入尚未落盘的队列日志记录
     except RuntimeError:
         pass
     clear_state()
+    
+    from .blocking import blocking_executor
+    blocking_executor.shutdown()
 
 
-def create_app(config_path: str = None, workspace_dir: str = None) -> FastAPI:
+def create_app(config_path: str = None, workspace_dir: str = None, profiling: bool = False,
+               stall_threshold: float = None) -> FastAPI:
     """
     创建 FastAPI 应用实例
     
     Args:
         config_path: 任务配置文件路径（单队列模式）
         workspace_dir: 工作空间目录（多队列模式）
+        profiling: 启用性能分析接口（/api/debug/*）
+        stall_threshold: 事件循环卡顿阈值（秒），超过时记录阻塞位置的调用栈
     
     Returns:
         FastAPI 应用实例
@@ -95,22 +132,39 @@ def create_app(config_path: str = None, workspace_dir: str = None) -> FastAPI:
         app.state.config_path = config_path
     if workspace_dir:
         app.state.workspace_dir = workspace_dir
+    app.state.profiling = profiling
+    if stall_threshold:
+        app.state.stall_threshold = stall_threshold
     
     # 延迟导入 API 路由（避免循环导入）
     from .api import tasks as tasks_api
+    from .api import bulk as bulk_api
     from .api import execute as execute_api
     from .api import queues as queues_api
     from .api import auth as auth_api
     from .api import notification as notification_api
+    from .api import system as system_api
+    from .api import analytics as analytics_api
+    from .api import simulate as simulate_api
+    from .api import debug as debug_api
+    from .api import host as host_api
     from . import ws as ws_api
+    from . import mux as mux_api
     
     # 注册 API 路由
     app.include_router(auth_api.router, prefix="/api", tags=["auth"])
     app.include_router(tasks_api.router, prefix="/api", tags=["tasks"])
+    app.include_router(bulk_api.router, prefix="/api", tags=["tasks"])
     app.include_router(execute_api.router, prefix="/api", tags=["execute"])
     app.include_router(queues_api.router, prefix="/api", tags=["queues"])
     app.include_router(notification_api.router, prefix="/api", tags=["notification"])
+    app.include_router(system_api.router, prefix="/api", tags=["system"])
+    app.include_router(analytics_api.router, prefix="/api", tags=["analytics"])
+    app.include_router(simulate_api.router, prefix="/api", tags=["analytics"])
+    app.include_router(host_api.router, prefix="/api", tags=["system"])
+    app.include_router(debug_api.router, prefix="/api", tags=["debug"])
     app.include_router(ws_api.router, tags=["websocket"])
+    app.include_router(mux_api.router, tags=["websocket"])
     
     # 静态文件 - 优先使用 dist 目录（Vite 构建输出）
     static_dir = Path(__file__).parent / "static"
@@ -141,6 +195,16 @@ def create_app(config_path: str = None, workspace_dir: str = None) -> FastAPI:
         """健康检查"""
         return {"status": "ok"}
     
+    @app.get("/metrics")
+    async def metrics(_=Depends(auth_api.require_auth)):
+        """
+        运行指标（Prometheus 文本格式）
+        
+        启用认证时，抓取请求需要携带 session_token Cookie。
+        """
+        from .metrics import registry, CONTENT_TYPE
+        return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+    
     return app
 
 
@@ -149,7 +213,9 @@ def run_server(
     workspace_dir: str = None,
     host: str = "0.0.0.0",
     port: int = 8080,
-    reload: bool = False
+    reload: bool = False,
+    profiling: bool = False,
+    stall_threshold: float = None
 ):
     """
     启动 Web 服务器
@@ -160,8 +226,10 @@ def run_server(
         host: 服务器地址
         port: 服务器端口
         reload: 是否启用热重载
+        profiling: 启用性能分析接口
+        stall_threshold: 事件循环卡顿阈值（秒）
     """
-    app = create_app(config_path, workspace_dir)
+    app = create_app(config_path, workspace_dir, profiling, stall_threshold)
     
     if config_path:
         mode = "单队列模式 (自动加载 YAML)"
@@ -178,6 +246,8 @@ def run_server(
     print(f"  模式: {mode}")
     print(f"  访问地址: http://{host}:{port}")
     print(f"  {path_info}")
+    if profiling:
+        print("  性能分析接口已启用: /api/debug/*")
     print(f"{'='*60}\n")
     
     uvicorn.run(
@@ -198,6 +268,8 @@ if __name__ == "__main__":
     parser.add_argument("--host", default="0.0.0.0", help="服务器地址")
     parser.add_argument("--port", type=int, default=8080, help="服务器端口")
     parser.add_argument("--reload", action="store_true", help="启用热重载")
+    parser.add_argument("--profiling", action="store_true", help="启用性能分析接口（/api/debug/*）")
+    parser.add_argument("--stall-threshold", type=float, help="事件循环阻塞超过该毫秒数时记录调用栈（默认 100）")
     
     args = parser.parse_args()
     
@@ -205,4 +277,5 @@ if __name__ == "__main__":
         # 无参数时使用当前目录作为工作空间
         args.workspace = str(Path.cwd())
     
-    run_server(args.config, args.workspace, args.host, args.port, args.reload)
+    stall_threshold = args.stall_threshold / 1000 if args.stall_threshold else None
+    run_server(args.config, args.workspace, args.host, args.port, args.reload, args.profiling, stall_threshold)
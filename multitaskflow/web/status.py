@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+任务状态推送中心
+
+订阅事件总线，在状态变化时为每个受影响的队列重建一次快照，
+与上一版本比较生成增量，序列化一次后分发给所有 /ws/status 订阅者。
+
+消息格式:
+    {"type": "status_snapshot", "queues": {queue_id: {"version": v, ...快照}}}
+    {"type": "status_diff", "queue_id": ..., "version": v, "base_version": v - 1,
+     "changes": {"tasks": {task_id: 任务}, "removed": [task_id], "order": [...], 字段: 值}}
+    {"type": "queue_removed", "queue_id": ..., "version": v}
+
+队列快照:
+    {"name", "queue_running", "history_count", "busy_gpus",
+     "tasks": {task_id: 任务字典}, "order": [待执行任务 ID（按顺序）]}
+
+运行中任务的快照不包含 duration（每秒都在变化），客户端根据 start_time 计算。
+新出现的队列的第一条增量 base_version 为 0，changes 为完整快照。
+客户端发现 base_version 与本地版本不一致时发送 {"type": "resync"} 获取完整快照。
+
+兜底检查只比较各队列的 state_version（每次状态变化递增），
+只有版本与上次构建快照时不同（遗漏了事件）的队列才会重建。
+"""
+
+import json
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+from .events import event_bus, Event
+
+logger = logging.getLogger("StatusHub")
+
+
+# 事件合并窗口（秒）：窗口内的多个事件只重建一次快照
+DEBOUNCE_DELAY = 0.05
+
+# 兜底检查间隔（秒）：重建版本号变化但未收到事件的队列
+RESYNC_INTERVAL = 5.0
+
+# 每个订阅者的消息队列长度（超过后丢弃积压，改为发送完整快照）
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# 订阅者队列中的特殊消息：需要发送完整快照
+RESYNC = object()
+
+# 快照中忽略的任务字段
+_VOLATILE_FIELDS = ("duration",)
+
+
+def _task_state(task) -> Dict[str, Any]:
+    data = task.to_dict()
+    for key in _VOLATILE_FIELDS:
+        data.pop(key, None)
+    return data
+
+
+def build_queue_snapshot(manager, name: str) -> Dict[str, Any]:
+    """构建单个队列的状态快照"""
+    tasks = {}
+    # 任务监控线程可能同时修改字典，复制后再遍历
+    for task in list(manager.tasks.values()):
+        tasks[task.id] = _task_state(task)
+    order = [tid for tid in list(manager.task_order)
+             if tid in tasks and tasks[tid]["status"] == "pending"]
+    return {
+        "name": name,
+        "queue_running": manager.queue_running,
+        "history_count": manager.history_manager.count(),
+        "busy_gpus": sorted(manager.get_busy_gpus()),
+        "tasks": tasks,
+        "order": order,
+    }
+
+
+def diff_queue_snapshot(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    比较两个队列快照
+
+    Returns:
+        增量（无变化时为空字典）
+    """
+    changes: Dict[str, Any] = {}
+    for key, value in new.items():
+        if key in ("tasks", "order"):
+            continue
+        if old.get(key) != value:
+            changes[key] = value
+
+    old_tasks = old.get("tasks", {})
+    new_tasks = new["tasks"]
+    upserts = {tid: t for tid, t in new_tasks.items() if old_tasks.get(tid) != t}
+    removed = [tid for tid in old_tasks if tid not in new_tasks]
+    if upserts:
+        changes["tasks"] = upserts
+    if removed:
+        changes["removed"] = removed
+    if old.get("order") != new["order"]:
+        changes["order"] = new["order"]
+    return changes
+
+
+class StatusHub:
+    """状态快照和增量的唯一构建者，所有订阅者共享同一份序列化结果"""
+
+    def __init__(self, debounce: float = DEBOUNCE_DELAY, resync_interval: float = RESYNC_INTERVAL):
+        self.debounce = debounce
+        self.resync_interval = resync_interval
+
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        # 构建快照时各队列的 state_version（兜底检查用）
+        self._built_versions: Dict[str, int] = {}
+        self._snapshot_text: Optional[str] = None
+        self._dirty: Set[str] = set()
+        self._dirty_all = False
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._resync_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+
+        # 统计信息
+        self.builds = 0
+        self.diffs_sent = 0
+        self.resyncs = 0
+
+    # ============ 生命周期 ============
+
+    async def start(self):
+        """在事件循环中启动（订阅事件总线）"""
+        self._loop = asyncio.get_running_loop()
+        event_bus.subscribe(self._on_event, self._loop)
+        self._dirty_all = True
+        self._flush()
+        self._resync_task = asyncio.create_task(self._resync_loop())
+
+    async def stop(self):
+        event_bus.unsubscribe(self._on_event)
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._resync_task:
+            self._resync_task.cancel()
+            self._resync_task = None
+        self._loop = None
+
+    # ============ 订阅 ============
+
+    def subscribe(self, queue: Optional[asyncio.Queue] = None) -> asyncio.Queue:
+        """
+        订阅状态消息（队列元素为 JSON 文本或 RESYNC）
+
+        Args:
+            queue: 使用调用方提供的队列（应有长度上限）；为 None 时新建
+        """
+        if queue is None:
+            queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def request_resync(self, queue: asyncio.Queue):
+        """丢弃订阅者积压的消息，改为发送完整快照"""
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC)
+
+    def snapshot_text(self) -> str:
+        """所有队列的完整快照（JSON 文本，状态变化后首次请求时构建）"""
+        if self._snapshot_text is None:
+            self._snapshot_text = json.dumps({
+                "type": "status_snapshot",
+                "queues": {
+                    qid: {"version": self._versions[qid], **snap}
+                    for qid, snap in self._snapshots.items()
+                },
+            }, ensure_ascii=False)
+        return self._snapshot_text
+
+    def versions(self) -> Dict[str, int]:
+        return dict(self._versions)
+
+    # ============ 事件处理 ============
+
+    def _on_event(self, event: Event):
+        if event.queue_id:
+            self._dirty.add(event.queue_id)
+        else:
+            self._dirty_all = True
+        if self._flush_handle is None and self._loop is not None:
+            self._flush_handle = self._loop.call_later(self.debounce, self._flush)
+
+    async def _resync_loop(self):
+        while True:
+            await asyncio.sleep(self.resync_interval)
+            if self._subscribers:
+                self._check_versions()
+
+    def _check_versions(self):
+        """兜底检查：只重建版本号与快照不一致的队列"""
+        try:
+            from .state import get_queue_manager
+            queues = get_queue_manager().queues
+        except RuntimeError:
+            return
+        stale = {qid for qid, manager in list(queues.items())
+                 if self._built_versions.get(qid) != manager.state_version}
+        stale.update(qid for qid in self._snapshots if qid not in queues)
+        if stale:
+            self.resyncs += len(stale)
+            self._dirty.update(stale)
+            self._flush()
+
+    def _broadcast(self, message: Dict[str, Any]):
+        text = json.dumps(message, ensure_ascii=False)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(text)
+            except asyncio.QueueFull:
+                self.request_resync(queue)
+
+    def _flush(self):
+        """重建受影响队列的快照并广播增量"""
+        self._flush_handle = None
+        try:
+            from .state import get_queue_manager
+            queue_manager = get_queue_manager()
+        except RuntimeError:
+            return
+
+        dirty = set(queue_manager.queues) | set(self._snapshots) if self._dirty_all else set(self._dirty)
+        self._dirty.clear()
+        self._dirty_all = False
+
+        for queue_id in dirty:
+            manager = queue_manager.queues.get(queue_id)
+            old = self._snapshots.get(queue_id)
+
+            if manager is None:
+                self._built_versions.pop(queue_id, None)
+                if old is not None:
+                    del self._snapshots[queue_id]
+                    version = self._versions.pop(queue_id) + 1
+                    self._snapshot_text = None
+                    self._broadcast({"type": "queue_removed", "queue_id": queue_id, "version": version})
+                continue
+
+            name = queue_manager.queue_configs.get(queue_id, {}).get('name', queue_id)
+            # 先读取版本号：构建期间的变化会在下次检查时重建
+            state_version = manager.state_version
+            try:
+                new = build_queue_snapshot(manager, name)
+            except RuntimeError:
+                # 字典在遍历时被修改，稍后重试
+                self._dirty.add(queue_id)
+                continue
+            self.builds += 1
+            self._built_versions[queue_id] = state_version
+
+            changes = diff_queue_snapshot(old or {}, new)
+            if old is not None and not changes:
+                continue
+
+            base_version = self._versions.get(queue_id, 0)
+            self._versions[queue_id] = base_version + 1
+            self._snapshots[queue_id] = new
+            self._snapshot_text = None
+            self.diffs_sent += 1
+            self._broadcast({
+                "type": "status_diff",
+                "queue_id": queue_id,
+                "version": base_version + 1,
+                "base_version": base_version,
+                "changes": changes if old is not None else new,
+            })
+
+        if self._dirty and self._flush_handle is None and self._loop is not None:
+            self._flush_handle = self._loop.call_later(self.debounce, self._flush)
+
+
+# 全局状态推送中心
+status_hub = StatusHub()
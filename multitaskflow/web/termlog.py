@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+终端输出规整模块
+
+把包含回车符 (\\r) 的终端输出（tqdm 等进度条）规整为按行的日志：
+每行只保留最后一个非空的"帧"，保留 ANSI 颜色代码由 xterm.js 渲染。
+
+ProgressBarCollapser 是有状态的增量实现：
+- 按块输入，块之间保存未完成行的状态，跨块的 \\r 帧也能正确处理
+- 线性时间，使用 str.find/rfind 逐行定位，不为每行构造列表
+- 无论如何切分输入，输出都完全相同（设置 max_partial 且未完成行超长时除外）
+"""
+
+from collections import deque
+from typing import Iterable, List, Optional, Tuple
+
+
+def _is_blank(text: str) -> bool:
+    return not text or text.isspace()
+
+
+class ProgressBarCollapser:
+    """
+    增量进度条折叠器
+
+    用法:
+        collapser = ProgressBarCollapser()
+        for chunk in chunks:
+            out.write(collapser.feed(chunk))
+        out.write(collapser.flush())
+    """
+
+    def __init__(self, max_partial: Optional[int] = None):
+        """
+        Args:
+            max_partial: 块之间保留的未完成行的最大字符数（超出时只保留最后部分），
+                None 表示不限制。跟踪持续输出但不换行的任务时用于限制内存
+        """
+        self.max_partial = max_partial
+        # 当前未完成行中，最后一个 \r 之后的内容（当前帧，可能跨块）
+        self._frame_parts: List[str] = []
+        # 当前行中最后一个已完成的非空帧
+        self._last_frame = ''
+        # 当前行是否出现过 \r
+        self._has_cr = False
+
+    @property
+    def in_progress_line(self) -> bool:
+        """当前未完成行是否为进度条（包含 \\r）"""
+        return self._has_cr
+
+    def current_frame(self) -> str:
+        """
+        当前未完成进度条行的最新非空帧（用于实时显示）
+
+        Returns:
+            最新帧，当前行不是进度条时返回空字符串
+        """
+        if not self._has_cr:
+            return ''
+        tail = ''.join(self._frame_parts)
+        return tail if not _is_blank(tail) else self._last_frame
+
+    def partial_line(self) -> str:
+        """当前未完成行规整后的内容（不含换行）"""
+        if self._has_cr:
+            return self.current_frame()
+        return ''.join(self._frame_parts)
+
+    def _last_nonblank_between(self, chunk: str, start: int, end: int) -> str:
+        """
+        在 chunk[start:end] 中查找最后一个非空帧（帧以 \\r 分隔）
+
+        chunk[start] 之前紧邻的是一个 \\r（或行首），返回 '' 表示全为空帧。
+        """
+        while True:
+            cr = chunk.rfind('\r', start, end)
+            frame = chunk[cr + 1:end] if cr >= 0 else chunk[start:end]
+            if not _is_blank(frame):
+                return frame
+            if cr < 0:
+                return ''
+            end = cr
+
+    def _consume_cr_segment(self, chunk: str, start: int, end: int, first_cr: int) -> str:
+        """
+        处理 chunk[start:end] 中包含 \\r 的片段，更新当前行状态
+
+        Returns:
+            片段最后一个 \\r 之后的内容（新的当前帧）
+        """
+        # 第一个 \r 之前的部分补全了上一个（可能跨块的）帧
+        head = chunk[start:first_cr]
+        if self._frame_parts:
+            self._frame_parts.append(head)
+            head = ''.join(self._frame_parts)
+            self._frame_parts = []
+        if not _is_blank(head):
+            self._last_frame = head
+
+        # 块内完整的帧中取最后一个非空帧
+        last_cr = chunk.rfind('\r', first_cr, end)
+        if last_cr > first_cr:
+            frame = self._last_nonblank_between(chunk, first_cr + 1, last_cr)
+            if frame:
+                self._last_frame = frame
+
+        self._has_cr = True
+        return chunk[last_cr + 1:end]
+
+    def _finish_line(self, tail: str) -> str:
+        """结束当前行，返回规整后的行内容（进度条行全为空帧时返回空串）"""
+        if self._frame_parts:
+            self._frame_parts.append(tail)
+            tail = ''.join(self._frame_parts)
+        if not self._has_cr:
+            line = tail
+        elif not _is_blank(tail):
+            line = tail
+        else:
+            line = self._last_frame
+        self._frame_parts = []
+        self._last_frame = ''
+        self._has_cr = False
+        return line
+
+    def feed(self, chunk: str) -> str:
+        """
+        输入一块文本，返回其中已完成的行（每行以 \\n 结尾）
+
+        未完成的行保留在内部状态中，等待后续输入或 flush()。
+        """
+        out = []
+        pos = 0
+        n = len(chunk)
+        next_cr = chunk.find('\r')
+
+        while pos < n:
+            if 0 <= next_cr < pos:
+                next_cr = chunk.find('\r', pos)
+            nl = chunk.find('\n', pos)
+
+            if nl < 0:
+                # 剩余部分是未完成的行
+                if next_cr >= 0:
+                    self._frame_parts = [self._consume_cr_segment(chunk, pos, n, next_cr)]
+                else:
+                    self._frame_parts.append(chunk[pos:])
+                break
+
+            if next_cr < 0 or next_cr > nl:
+                # 这一行剩余部分没有 \r
+                if not self._frame_parts and not self._has_cr:
+                    # 快速路径：批量输出到下一个含 \r 的行之前
+                    if next_cr < 0:
+                        end = chunk.rfind('\n', pos) + 1
+                    else:
+                        end = chunk.rfind('\n', pos, next_cr) + 1
+                    out.append(chunk[pos:end])
+                    pos = end
+                    continue
+                tail = chunk[pos:nl]
+            else:
+                tail = self._consume_cr_segment(chunk, pos, nl, next_cr)
+
+            had_cr = self._has_cr
+            line = self._finish_line(tail)
+            # 进度条行全部为空帧时整行丢弃
+            if line or not had_cr:
+                out.append(line)
+                out.append('\n')
+            pos = nl + 1
+
+        if self.max_partial is not None:
+            self._limit_partial()
+        return ''.join(out)
+
+    def _limit_partial(self):
+        """合并未完成行的片段，超过 max_partial 时只保留最后部分"""
+        limit = self.max_partial
+        if len(self._frame_parts) > 1 or (self._frame_parts and len(self._frame_parts[0]) > limit):
+            tail = ''.join(self._frame_parts)
+            self._frame_parts = [tail[-limit:] if len(tail) > limit else tail]
+        if len(self._last_frame) > limit:
+            self._last_frame = self._last_frame[-limit:]
+
+    def flush(self) -> str:
+        """结束输入，返回最后一个未完成行的规整结果（不含换行）"""
+        if not self._frame_parts and not self._has_cr:
+            return ''
+        return self._finish_line('')
+
+    def reset(self):
+        """丢弃内部状态"""
+        self._frame_parts = []
+        self._last_frame = ''
+        self._has_cr = False
+
+
+def collapse_progress(content: str) -> str:
+    """一次性规整完整文本"""
+    collapser = ProgressBarCollapser()
+    return collapser.feed(content) + collapser.flush()
+
+
+def collapse_tail(chunks: Iterable[str], max_lines: int,
+                  collapser: Optional[ProgressBarCollapser] = None) -> Tuple[str, int]:
+    """
+    流式规整文本块并只保留最后 max_lines 行
+
+    内存占用与保留的行数成正比，与输入总量无关。
+    行数按 ``text.split('\\n')`` 的语义计算（末尾换行后的空串也算一行）。
+
+    Args:
+        chunks: 文本块迭代器
+        max_lines: 保留的最大行数，<= 0 表示全部保留
+        collapser: 外部传入的折叠器；传入时不结束最后的未完成行，
+            调用方可继续用它处理后续输入（如跟踪运行中任务的日志）
+
+    Returns:
+        (保留的文本, 总行数)
+    """
+    finish = collapser is None
+    if collapser is None:
+        collapser = ProgressBarCollapser()
+    kept = deque()  # (text, newline_count)
+    kept_newlines = 0
+    total_newlines = 0
+
+    def add(text: str):
+        nonlocal kept_newlines, total_newlines
+        if not text:
+            return
+        count = text.count('\n')
+        kept.append((text, count))
+        kept_newlines += count
+        total_newlines += count
+        if max_lines > 0:
+            # 丢弃完全落在保留范围之外的旧块
+            while len(kept) > 1 and kept_newlines - kept[0][1] >= max_lines:
+                kept_newlines -= kept.popleft()[1]
+
+    for chunk in chunks:
+        add(collapser.feed(chunk))
+    if finish:
+        add(collapser.flush())
+
+    text = ''.join(t for t, _ in kept)
+    total_lines = total_newlines + 1
+    if max_lines <= 0 or total_lines <= max_lines:
+        return text, total_lines
+
+    # 在保留的文本中再跳过多余的行
+    skip = kept_newlines + 1 - max_lines
+    pos = 0
+    for _ in range(skip):
+        pos = text.find('\n', pos) + 1
+    return text[pos:], total_lines
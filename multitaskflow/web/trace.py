@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+GPU 占用时间线导出
+
+把一个时间窗口内的执行历史和运行中任务转换为 Chrome trace-event JSON
+（chrome://tracing 或 https://ui.perfetto.dev 打开）：
+
+- 进程「GPU」下每张 GPU 一条轨道，进程「队列」下每个队列一条轨道
+- 同一轨道上时间重叠的任务分到多条并行子轨道（lane），保证每条轨道上的事件不交叠
+- otherData.utilization 汇总每张 GPU 的忙碌时长、利用率和最长的空闲间隙
+"""
+
+import heapq
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 轨道所属的 trace 进程
+GPU_PID = 1
+QUEUE_PID = 2
+
+# 同一轨道最多的并行子轨道数（tid = 轨道序号 × LANE_STRIDE + 子轨道序号）
+LANE_STRIDE = 100
+
+# 利用率汇总中列出的最长空闲间隙数
+TOP_IDLE_GAPS = 5
+
+
+class TraceTask:
+    """时间线上的一个任务区间（时间为 Unix 时间戳，秒）"""
+
+    __slots__ = ("id", "name", "status", "command", "gpu", "queue_id", "start", "end")
+
+    def __init__(self, id: str, name: str, status: str, command: Optional[str],
+                 gpu: Optional[List[int]], queue_id: str, start: float, end: float):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.command = command
+        self.gpu = gpu or []
+        self.queue_id = queue_id
+        self.start = start
+        self.end = end
+
+
+def _assign_lanes(tasks: List[TraceTask]) -> List[Tuple[int, TraceTask]]:
+    """区间划分：按开始时间把任务分到最少的互不重叠子轨道"""
+    free: List[Tuple[float, int]] = []  # (子轨道结束时间, 子轨道序号)
+    lanes = 0
+    result = []
+    for task in sorted(tasks, key=lambda t: (t.start, t.end)):
+        if free and free[0][0] <= task.start:
+            _, lane = heapq.heappop(free)
+        else:
+            lane = lanes
+            lanes += 1
+        heapq.heappush(free, (task.end, lane))
+        result.append((min(lane, LANE_STRIDE - 1), task))
+    return result
+
+
+def _merge_intervals(intervals: Iterable[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    merged: List[List[float]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(timespec="seconds")
+
+
+def gpu_utilization(tasks: Iterable[TraceTask], window_start: float, window_end: float,
+                    gpus: Iterable[int] = ()) -> Dict[str, Any]:
+    """
+    每张 GPU 在窗口内的利用率
+
+    Args:
+        tasks: 任务区间
+        window_start / window_end: 窗口（Unix 时间戳）
+        gpus: 额外包含的 GPU（窗口内完全空闲的 GPU 也列出）
+
+    Returns:
+        {"window_seconds", "utilization", "busy_gpu_average", "gpus": {GPU: {...}}}
+    """
+    window = max(window_end - window_start, 0.0)
+    intervals: Dict[int, List[Tuple[float, float]]] = {gpu: [] for gpu in gpus}
+    counts: Dict[int, int] = {gpu: 0 for gpu in gpus}
+    for task in tasks:
+        start, end = max(task.start, window_start), min(task.end, window_end)
+        if end <= start:
+            continue
+        for gpu in task.gpu:
+            intervals.setdefault(gpu, []).append((start, end))
+            counts[gpu] = counts.get(gpu, 0) + 1
+
+    result = {}
+    total_busy = 0.0
+    for gpu in sorted(intervals):
+        busy_intervals = _merge_intervals(intervals[gpu])
+        busy = sum(end - start for start, end in busy_intervals)
+        total_busy += busy
+
+        gaps = []
+        cursor = window_start
+        for start, end in busy_intervals:
+            if start > cursor:
+                gaps.append((cursor, start))
+            cursor = end
+        if window_end > cursor:
+            gaps.append((cursor, window_end))
+        gaps.sort(key=lambda gap: gap[1] - gap[0], reverse=True)
+
+        result[str(gpu)] = {
+            "tasks": counts.get(gpu, 0),
+            "busy_seconds": round(busy, 1),
+            "idle_seconds": round(window - busy, 1),
+            "utilization": round(busy / window, 4) if window else None,
+            "idle_gaps": len(gaps),
+            "longest_idle": [
+                {"start": _iso(start), "end": _iso(end), "seconds": round(end - start, 1)}
+                for start, end in gaps[:TOP_IDLE_GAPS]
+            ],
+        }
+
+    return {
+        "window_seconds": round(window, 1),
+        "utilization": round(total_busy / (window * len(result)), 4) if window and result else None,
+        "busy_gpu_average": round(total_busy / window, 2) if window else None,
+        "gpus": result,
+    }
+
+
+def _thread_metadata(pid: int, tid: int, name: str, sort_index: int) -> List[Dict[str, Any]]:
+    return [
+        {"ph": "M", "name": "thread_name", "pid": pid, "tid": tid, "args": {"name": name}},
+        {"ph": "M", "name": "thread_sort_index", "pid": pid, "tid": tid, "args": {"sort_index": sort_index}},
+    ]
+
+
+def _slice(task: TraceTask, pid: int, tid: int, queue_name: str,
+           window_start: float, window_end: float) -> Dict[str, Any]:
+    start, end = max(task.start, window_start), min(task.end, window_end)
+    return {
+        "ph": "X",
+        "name": task.name,
+        "cat": task.status,
+        "pid": pid,
+        "tid": tid,
+        "ts": int(start * 1_000_000),
+        "dur": max(int((end - start) * 1_000_000), 1),
+        "args": {
+            "id": task.id,
+            "queue": queue_name,
+            "status": task.status,
+            "gpu": task.gpu,
+            "command": task.command,
+        },
+    }
+
+
+def build_trace(tasks: List[TraceTask], queue_names: Dict[str, str],
+                window_start: float, window_end: float, gpus: Iterable[int] = ()) -> Dict[str, Any]:
+    """
+    生成 Chrome trace-event JSON（对象格式）
+
+    Args:
+        tasks: 窗口内的任务区间（运行中任务的 end 为当前时间）
+        queue_names: 队列 ID -> 队列名称（决定队列轨道顺序）
+        window_start / window_end: 窗口（Unix 时间戳）；超出窗口的部分被截掉
+        gpus: 额外包含的 GPU
+
+    Returns:
+        {"traceEvents": [...], "displayTimeUnit": "ms", "otherData": {"utilization": ...}}
+    """
+    tasks = [t for t in tasks if min(t.end, window_end) > max(t.start, window_start)]
+    gpus = set(gpus)
+    events: List[Dict[str, Any]] = [
+        {"ph": "M", "name": "process_name", "pid": GPU_PID, "args": {"name": "GPU"}},
+        {"ph": "M", "name": "process_sort_index", "pid": GPU_PID, "args": {"sort_index": 0}},
+        {"ph": "M", "name": "process_name", "pid": QUEUE_PID, "args": {"name": "队列"}},
+        {"ph": "M", "name": "process_sort_index", "pid": QUEUE_PID, "args": {"sort_index": 1}},
+    ]
+
+    # GPU 轨道
+    by_gpu: Dict[int, List[TraceTask]] = {gpu: [] for gpu in gpus}
+    for task in tasks:
+        for gpu in task.gpu:
+            by_gpu.setdefault(gpu, []).append(task)
+    for gpu in sorted(by_gpu):
+        lanes = _assign_lanes(by_gpu[gpu])
+        for lane in range(max((lane for lane, _ in lanes), default=0) + 1):
+            tid = gpu * LANE_STRIDE + lane
+            name = f"GPU {gpu}" if lane == 0 else f"GPU {gpu} #{lane + 1}"
+            events.extend(_thread_metadata(GPU_PID, tid, name, tid))
+        for lane, task in lanes:
+            events.append(_slice(task, GPU_PID, gpu * LANE_STRIDE + lane,
+                                 queue_names.get(task.queue_id, task.queue_id), window_start, window_end))
+
+    # 队列轨道
+    by_queue: Dict[str, List[TraceTask]] = {queue_id: [] for queue_id in queue_names}
+    for task in tasks:
+        by_queue.setdefault(task.queue_id, []).append(task)
+    for index, (queue_id, queue_tasks) in enumerate(by_queue.items()):
+        queue_name = queue_names.get(queue_id, queue_id)
+        lanes = _assign_lanes(queue_tasks)
+        for lane in range(max((lane for lane, _ in lanes), default=0) + 1):
+            tid = index * LANE_STRIDE + lane
+            name = queue_name if lane == 0 else f"{queue_name} #{lane + 1}"
+            events.extend(_thread_metadata(QUEUE_PID, tid, name, tid))
+        for lane, task in lanes:
+            events.append(_slice(task, QUEUE_PID, index * LANE_STRIDE + lane, queue_name,
+                                 window_start, window_end))
+
+    return {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {
+            "window_start": _iso(window_start),
+            "window_end": _iso(window_end),
+            "tasks": len(tasks),
+            "utilization": gpu_utilization(tasks, window_start, window_end, gpus),
+        },
+    }
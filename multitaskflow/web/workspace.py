@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+工作空间持久化
+
+WorkspaceStore 是 .workspace.json 的唯一写入方：
+- 队列配置、运行中任务等状态由 QueueManager 提供快照，设置项（通知 Token 等）由本模块保存
+- 状态变化只标记 dirty，后台线程把一个间隔内的多次标记合并为一次写入
+- 写入先写临时文件再 os.replace()，中途崩溃不会留下半个文件
+- 关闭时立即写入未保存的变化
+
+未运行 WebUI 时（如 notify 被单独调用），通过 find_store() 找不到 store，
+调用方退回到 read_workspace_file() / update_workspace_file()。
+"""
+
+import os
+import json
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import persist_seconds
+
+logger = logging.getLogger("Workspace")
+
+WORKSPACE_FILENAME = ".workspace.json"
+
+# 两次写入之间的最小间隔（秒）
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# 由 QueueManager 快照生成的键，其余键都视为设置项原样保留
+STATE_KEYS = ("version", "updated_at", "queues", "running_tasks", "log_archive_age_hours")
+
+# 已打开的 store: 工作空间目录 -> WorkspaceStore
+_stores: Dict[Path, "WorkspaceStore"] = {}
+_stores_lock = threading.Lock()
+
+
+def atomic_write_json(path: Path, data: Dict[str, Any]):
+    """原子写入 JSON 文件（临时文件 + fsync + os.replace）"""
+    fd, tmp = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def read_workspace_file(workspace_dir: Path) -> Dict[str, Any]:
+    """读取工作空间文件（不存在或损坏时返回空字典）"""
+    workspace_file = Path(workspace_dir) / WORKSPACE_FILENAME
+    if not workspace_file.exists():
+        return {}
+    try:
+        data = json.loads(workspace_file.read_text(encoding='utf-8'))
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        logger.warning(f"读取工作空间配置失败: {e}")
+        return {}
+
+
+def update_workspace_file(workspace_dir: Path, **values):
+    """在没有 WorkspaceStore 时直接修改工作空间文件（读-改-原子写）"""
+    data = read_workspace_file(workspace_dir)
+    data.update(values)
+    atomic_write_json(Path(workspace_dir) / WORKSPACE_FILENAME, data)
+
+
+def find_store(workspace_dir: Optional[Path]) -> Optional["WorkspaceStore"]:
+    """查找指定工作空间目录已打开的 store"""
+    if workspace_dir is None:
+        return None
+    with _stores_lock:
+        return _stores.get(Path(workspace_dir).resolve())
+
+
+class WorkspaceStore:
+    """工作空间文件的写后合并持久化"""
+
+    def __init__(self, workspace_dir: Path, snapshot: Callable[[], Dict[str, Any]],
+                 interval: float = DEFAULT_FLUSH_INTERVAL):
+        """
+        Args:
+            workspace_dir: 工作空间目录
+            snapshot: 返回当前状态（STATE_KEYS 中的键）的函数，在写入线程中调用
+            interval: 两次写入之间的最小间隔（秒）
+        """
+        self.workspace_dir = Path(workspace_dir).resolve()
+        self.path = self.workspace_dir / WORKSPACE_FILENAME
+        self.interval = interval
+        self._snapshot = snapshot
+        self._settings: Dict[str, Any] = {}
+
+        self._lock = threading.Lock()          # 保护 dirty 标记和设置项
+        self._write_lock = threading.Lock()    # 串行化文件写入
+        self._dirty = False
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.writes = 0
+
+    # ============ 生命周期 ============
+
+    def load(self) -> Dict[str, Any]:
+        """
+        读取工作空间文件并注册 store
+
+        Returns:
+            文件内容（文件不存在时为空字典）
+        """
+        data = read_workspace_file(self.workspace_dir)
+        with self._lock:
+            self._settings = {k: v for k, v in data.items() if k not in STATE_KEYS}
+        with _stores_lock:
+            _stores[self.workspace_dir] = self
+        return data
+
+    def close(self):
+        """停止后台写入线程并写入未保存的变化"""
+        with self._lock:
+            self._closed = True
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        with _stores_lock:
+            if _stores.get(self.workspace_dir) is self:
+                del _stores[self.workspace_dir]
+
+    # ============ 写入 ============
+
+    def mark_dirty(self):
+        """
+        标记状态已变化，由后台线程在下一个写入间隔内保存
+
+        关闭后（服务退出过程中仍有任务启动或结束）直接同步写入，不丢失 PID 变化。
+        """
+        with self._lock:
+            self._dirty = True
+            closed = self._closed
+            if not closed and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="WorkspaceStore", daemon=True)
+                self._thread.start()
+        if closed:
+            self.flush()
+        else:
+            self._wakeup.set()
+
+    def flush(self) -> bool:
+        """
+        立即写入未保存的变化
+
+        Returns:
+            是否执行了写入
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                # 先清除标记：写入过程中的新变化会触发下一次写入
+                self._dirty = False
+                settings = dict(self._settings)
+            try:
+                data = dict(settings)
+                data.update(self._snapshot())
+                with persist_seconds.time(store="workspace", op="write"):
+                    atomic_write_json(self.path, data)
+                self.writes += 1
+                return True
+            except Exception as e:
+                logger.error(f"保存工作空间配置失败: {e}")
+                with self._lock:
+                    self._dirty = True
+                return False
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stop_event.is_set():
+                return
+            self.flush()
+            # 间隔内的后续标记合并到下一次写入；关闭时 close() 会写入剩余变化
+            self._stop_event.wait(self.interval)
+
+    # ============ 设置项 ============
+
+    def get_setting(self, key: str, default: Any = None) -> Any:
+        """读取设置项"""
+        with self._lock:
+            return self._settings.get(key, default)
+
+    def update_settings(self, **values):
+        """修改设置项（合并写入）"""
+        with self._lock:
+            self._settings.update(values)
+        self.mark_dirty()
+
+    @property
+    def pushplus_token(self) -> str:
+        """PushPlus Token（未设置时为空字符串）"""
+        token = self.get_setting("pushplus_token", "")
+        return token.strip() if isinstance(token, str) else ""
+
+    @pushplus_token.setter
+    def pushplus_token(self, token: str):
+        self.update_settings(pushplus_token=(token or "").strip())
+
+    @property
+    def notification_enabled(self) -> bool:
+        """是否启用任务通知"""
+        return bool(self.get_setting("notification_enabled", True))
+
+    @notification_enabled.setter
+    def notification_enabled(self, enabled: bool):
+        self.update_settings(notification_enabled=bool(enabled))
+
+    def stats(self) -> Dict[str, Any]:
+        """写入统计"""
+        with self._lock:
+            return {"writes": self.writes, "dirty": self._dirty, "interval": self.interval}
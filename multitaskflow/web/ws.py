@@ -8,13 +8,18 @@ WebSocket 处理模块
 """
 
 import asyncio
+import codecs
 import os
-from pathlib import Path
-from typing import Dict, Set
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 import logging
 
-from .state import get_task_manager
+from .logstore import log_exists, log_size, iter_log_bytes, read_log_bytes
+from .logbuffer import log_buffers, TaskLogBuffer, MAX_PARTIAL_CHARS
+from .blocking import run_blocking
+from .termlog import ProgressBarCollapser, collapse_progress, collapse_tail
+from .metrics import websocket_connections, log_stream_chars, log_stream_frames, log_stream_skipped
 
 router = APIRouter()
 logger = logging.getLogger("WebSocket")
@@ -22,38 +27,323 @@ logger = logging.getLogger("WebSocket")
 
 def clean_progress_bar_output(content: str) -> str:
     """
-    清理日志输出中的回车符 (\\r)，保留 ANSI 颜色代码让 xterm.js 渲染
+    清理日志输出中的回车符 (\r)，保留 ANSI 颜色代码让 xterm.js 渲染
     
-    进度条使用 \\r 回到行首覆盖显示，我们需要：
-    1. 找到连续的 \\r 分隔的内容块（没有 \\n 分隔）
-    2. 只保留每个块的最后一帧
-    3. 确保输出有正确的换行
+    进度条使用 \r 回到行首覆盖显示，每行只保留最后一个非空的帧。
+    对完整文本的一次性处理；流式场景请直接使用 ProgressBarCollapser。
     """
     if '\r' not in content:
         return content
+    return collapse_progress(content)
+
+
+# ============ 日志帧合并与背压 ============
+
+# 单帧最大字符数（超过后立即发送，不再等待合并）
+FRAME_MAX_CHARS = 64 * 1024
+
+# 合并等待时间（秒）：在此时间内到达的日志合并为一帧
+FRAME_MAX_DELAY = 0.2
+
+# 发送队列高水位（字符数）：超过后开始丢弃，慢速客户端不会无限堆积
+SEND_HIGH_WATER = 1024 * 1024
+
+# 清除当前行（用于进度条帧原地刷新）
+CLEAR_LINE = '\r\x1b[2K'
+
+# WebSocket 连接时发送的历史日志行数
+MAX_HISTORY_LINES = 500
+
+# 断线续传时从磁盘补发的最大字节数（超过则按新连接发送历史日志）
+MAX_RESUME_BYTES = 8 * 1024 * 1024
+
+# 轮询日志文件时单次最多读取的字节数（在线程池中读取）
+POLL_READ_BYTES = 1024 * 1024
+
+
+class LogFrameSender:
+    """
+    单个 WebSocket 连接的日志发送队列
     
-    result = []
-    lines = content.split('\n')
+    - 生产者（日志读取循环）只入队，不等待网络
+    - 发送协程把队列中的日志合并为帧，受大小和时间预算限制
+    - 队列超过高水位时：先丢弃被后续内容覆盖的进度条帧，
+      仍然超限则丢弃最旧的日志并在下一帧插入"已跳过 N 行"提示
+    - 日志帧携带 offset 游标（已发送的完整行在日志文件中的结束字节偏移），
+      客户端断线重连时通过 ?since=<offset> 只获取缺失的部分
     
-    for line in lines:
-        if '\r' not in line:
-            result.append(line)
-        else:
-            # 这一行包含多个被 \r 分隔的"帧"
-            parts = line.split('\r')
-            
-            # 处理策略：只保留最后一个非空的帧
-            # \r 的语义是"回到行首"，所以最后一个帧是最终显示的内容
-            last_non_empty = ''
-            for part in reversed(parts):
-                if part.strip():
-                    last_non_empty = part
+    多路复用连接（/ws）中每个日志频道一个发送队列，不调用 start()，
+    由连接的发送协程通过 on_ready 回调得知有新内容，再用 drain() 取出帧。
+    """
+    
+    def __init__(
+        self,
+        websocket: Optional[WebSocket],
+        max_frame_chars: int = FRAME_MAX_CHARS,
+        max_delay: float = FRAME_MAX_DELAY,
+        high_water: int = SEND_HIGH_WATER,
+        channel: Optional[str] = None,
+        on_ready: Optional[Callable[[], None]] = None,
+    ):
+        self.websocket = websocket
+        self.max_frame_chars = max_frame_chars
+        self.max_delay = max_delay
+        self.high_water = high_water
+        # 多路复用连接中的频道名（帧中携带 channel 字段）
+        self.channel = channel
+        self._on_ready = on_ready
+        
+        # 元素: (kind, payload, progress, offset)，kind 为 "log" 或 "msg"
+        self._queue: Deque[Tuple[str, Any, bool, Optional[int]]] = deque()
+        self._queued_chars = 0
+        self._skipped_lines = 0
+        self._event = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+        
+        # 连接已断开（发送失败）
+        self.closed = False
+        
+        # 统计信息
+        self.frames_sent = 0
+        self.chars_sent = 0
+        self.lines_skipped = 0
+        self.max_queued_chars = 0
+    
+    def start(self):
+        """启动发送协程"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    @property
+    def queued_chars(self) -> int:
+        return self._queued_chars
+    
+    @property
+    def pending(self) -> bool:
+        """队列中是否有待发送的内容"""
+        return bool(self._queue)
+    
+    @property
+    def pending_messages(self) -> bool:
+        """队列中是否有控制消息（控制消息不等待合并）"""
+        return any(item[0] == "msg" for item in self._queue)
+    
+    def _wakeup(self):
+        self._event.set()
+        if self._on_ready is not None:
+            self._on_ready()
+    
+    def push_log(self, content: str, progress: bool = False, offset: Optional[int] = None):
+        """
+        日志内容入队
+        
+        Args:
+            content: 日志文本
+            progress: 是否为进度条帧（会被后续内容覆盖，可安全丢弃）
+            offset: 发送这段内容后客户端所处的日志字节偏移（续传游标）
+        """
+        if self.closed or not content:
+            return
+        self._queue.append(("log", content, progress, offset))
+        self._queued_chars += len(content)
+        if self._queued_chars > self.high_water:
+            self._shed()
+        self.max_queued_chars = max(self.max_queued_chars, self._queued_chars)
+        self._wakeup()
+    
+    def push_message(self, message: Dict[str, Any]):
+        """控制消息入队（init/end/error 等，不会被丢弃）"""
+        if self.closed:
+            return
+        self._queue.append(("msg", message, False, None))
+        self._wakeup()
+    
+    def _shed(self):
+        """队列超过高水位时丢弃内容"""
+        # 1. 丢弃中间的进度条帧：后面还有日志的进度帧必然会被覆盖
+        kept: Deque[Tuple[str, Any, bool, Optional[int]]] = deque()
+        has_later_log = False
+        for item in reversed(self._queue):
+            kind, payload, progress, _ = item
+            if kind == "log":
+                if progress and has_later_log:
+                    self._queued_chars -= len(payload)
+                    continue
+                has_later_log = True
+            kept.appendleft(item)
+        self._queue = kept
+        
+        if self._queued_chars <= self.high_water:
+            return
+        
+        # 2. 仍然超限：从最旧的日志开始丢弃，直到降到高水位的一半
+        target = self.high_water // 2
+        kept = deque()
+        for item in self._queue:
+            kind, payload, progress, _ = item
+            if kind == "log" and self._queued_chars > target:
+                self._queued_chars -= len(payload)
+                if not progress:
+                    skipped = payload.count('\n')
+                    self._skipped_lines += skipped
+                    self.lines_skipped += skipped
+                    log_stream_skipped.inc(skipped)
+                continue
+            kept.append(item)
+        self._queue = kept
+    
+    def _next_frame(self) -> Dict[str, Any]:
+        """从队列头部取出一帧"""
+        kind, payload, _, _ = self._queue[0]
+        if kind == "msg":
+            self._queue.popleft()
+            return payload
+        
+        parts = []
+        size = 0
+        offset = None
+        while self._queue and self._queue[0][0] == "log" and size < self.max_frame_chars:
+            _, content, progress, item_offset = self._queue.popleft()
+            self._queued_chars -= len(content)
+            if item_offset is not None:
+                offset = item_offset
+            # 同一帧内后面还有日志时，进度条帧已被覆盖，直接跳过
+            if progress and self._queue and self._queue[0][0] == "log":
+                continue
+            parts.append(content)
+            size += len(content)
+        
+        frame: Dict[str, Any] = {"type": "log"}
+        if self._skipped_lines:
+            parts.insert(0, f"{CLEAR_LINE}\x1b[33m... 客户端接收过慢，已跳过 {self._skipped_lines} 行日志 ...\x1b[0m\n")
+            frame["skipped"] = self._skipped_lines
+            self._skipped_lines = 0
+        frame["content"] = ''.join(parts)
+        if offset is not None:
+            frame["offset"] = offset
+        return frame
+    
+    def drain(self) -> List[Dict[str, Any]]:
+        """取出队列中所有待发送的帧（多路复用连接中带 channel 字段）"""
+        frames = []
+        while self._queue:
+            frame = self._next_frame()
+            if frame.get("type") == "log" and not frame.get("content"):
+                continue
+            if self.channel is not None:
+                frame = {"channel": self.channel, **frame}
+            frames.append(frame)
+            self.frames_sent += 1
+            self.chars_sent += len(frame.get("content", ""))
+        if frames:
+            log_stream_frames.inc(len(frames))
+            log_stream_chars.inc(sum(len(frame.get("content", "")) for frame in frames))
+        return frames
+    
+    async def _run(self):
+        """发送协程"""
+        try:
+            while True:
+                await self._event.wait()
+                self._event.clear()
+                
+                if not self._queue:
+                    if self._closing:
+                        break
+                    continue
+                
+                # 合并等待：不足一帧的日志稍等片刻，和后续内容一起发送
+                if (self._queue[0][0] == "log" and not self._closing
+                        and self._queued_chars < self.max_frame_chars and self.max_delay > 0):
+                    await asyncio.sleep(self.max_delay)
+                
+                for frame in self.drain():
+                    await self.websocket.send_json(frame)
+                
+                if self._closing:
                     break
-            
-            if last_non_empty:
-                result.append(last_non_empty)
+        except (WebSocketDisconnect, RuntimeError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"日志发送错误: {e}")
+        finally:
+            self.closed = True
+            self._queue.clear()
+            self._queued_chars = 0
     
-    return '\n'.join(result)
+    async def close(self, timeout: float = 5.0):
+        """发送完队列中剩余内容后关闭"""
+        self._closing = True
+        self._event.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self._task.cancel()
+
+
+def _collapse_missed(log_file: str, start: int, end: int) -> str:
+    """读取并规整断线期间完成的行（在线程池中执行）"""
+    # 补发内容以换行结尾，按 split 语义多保留一行
+    missed, total = collapse_tail(
+        [read_log_bytes(log_file, start, end).decode('utf-8', errors='replace')],
+        MAX_HISTORY_LINES + 1
+    )
+    if total > MAX_HISTORY_LINES + 1:
+        missed = f"... (断线期间的前 {total - MAX_HISTORY_LINES - 1} 行已省略)\n" + missed
+    return missed
+
+
+async def push_buffer_backlog(sender: LogFrameSender, task, snapshot: Tuple[str, int, str, bool, int],
+                              since: Optional[int] = None) -> str:
+    """
+    发送日志缓冲区快照：init 消息、历史日志（续传时只补发断线期间完成的行）和当前未完成行
+    
+    续传时只从磁盘补读游标到快照位置之间缺失的完整行（在线程池中读取和规整），
+    缺口过大或游标无效时按新连接处理。补读期间缓冲区的新输出由调用方暂存，
+    本函数返回后再按顺序发送。
+    
+    Args:
+        sender: 发送队列
+        task: 任务
+        snapshot: TaskLogBuffer.subscribe() / snapshot() 的返回值
+        since: 断线续传游标
+    
+    Returns:
+        已显示的进度条帧（输出已结束时为空）
+    """
+    backlog, total_lines, frame, finished, offset = snapshot
+    resumed = since is not None and 0 <= since <= offset and offset - since <= MAX_RESUME_BYTES
+    # 只补发断线期间完成的行（游标和缓冲区位置都是行对齐的）
+    missed = ''
+    if resumed and since < offset:
+        missed = await run_blocking(_collapse_missed, task.log_file, since, offset)
+    
+    sender.push_message({
+        "type": "init",
+        "log_file": str(task.log_file),
+        "task_name": task.name,
+        "offset": since if resumed else 0,
+        "resumed": resumed
+    })
+    
+    if resumed:
+        # 客户端可能还显示着断线前的进度条帧
+        sender.push_log(CLEAR_LINE + missed, offset=offset)
+    else:
+        if total_lines > MAX_HISTORY_LINES:
+            backlog = f"... (前 {total_lines - MAX_HISTORY_LINES} 行已省略，可使用复制命令查看完整日志)\n" + backlog
+        sender.push_log(backlog, offset=offset)
+    
+    if finished:
+        # 输出已结束：未完成的行即最后一行
+        sender.push_log(frame, offset=offset)
+        return ''
+    if frame:
+        sender.push_log(CLEAR_LINE + frame, progress=True, offset=offset)
+    return frame
 
 
 class LogStreamer:
@@ -62,10 +352,6 @@ class LogStreamer:
     def __init__(self):
         # task_id -> set of websocket connections
         self.connections: Dict[str, Set[WebSocket]] = {}
-        # task_id -> last read position
-        self.file_positions: Dict[str, int] = {}
-        # task_id -> 不完整行的缓冲区（等待下次读取补全）
-        self.line_buffers: Dict[str, str] = {}
     
     async def connect(self, task_id: str, websocket: WebSocket):
         """建立连接"""
@@ -75,10 +361,6 @@ class LogStreamer:
             self.connections[task_id] = set()
         self.connections[task_id].add(websocket)
         
-        # 初始化文件位置
-        if task_id not in self.file_positions:
-            self.file_positions[task_id] = 0
-        
         logger.info(f"WebSocket 连接: task={task_id}")
     
     def disconnect(self, task_id: str, websocket: WebSocket):
@@ -87,21 +369,25 @@ class LogStreamer:
             self.connections[task_id].discard(websocket)
             if not self.connections[task_id]:
                 del self.connections[task_id]
-                # 清理文件位置记录和行缓冲区
-                self.file_positions.pop(task_id, None)
-                self.line_buffers.pop(task_id, None)
         
         logger.info(f"WebSocket 断开: task={task_id}")
     
-    async def stream_log(self, task_id: str, websocket: WebSocket):
-        """持续推送日志内容"""
+    async def stream_log(self, task_id: str, sender: LogFrameSender, since: Optional[int] = None):
+        """
+        持续推送日志内容（通过发送队列，不直接等待网络）
+        
+        Args:
+            task_id: 任务ID
+            sender: 连接的发送队列
+            since: 断线续传游标（上次收到的 offset），只发送此后的内容
+        """
         try:
             from .state import get_queue_manager
             
             queue_manager = get_queue_manager()
             
             if queue_manager is None:
-                await websocket.send_json({
+                sender.push_message({
                     "type": "error",
                     "message": "请先添加任务队列"
                 })
@@ -111,130 +397,224 @@ class LogStreamer:
             task, manager = queue_manager.find_task_in_all_queues(task_id)
             
             if not task:
-                await websocket.send_json({
+                sender.push_message({
                     "type": "error",
                     "message": "任务不存在"
                 })
                 return
             
+            # 运行中的任务：从内存缓冲区获取历史并订阅新输出，不读取日志文件
+            buffer = log_buffers.get(task_id)
+            if buffer is not None:
+                await self._stream_from_buffer(task_id, task, buffer, sender, since)
+                return
+            
             # 检查是否有日志文件
-            if not task.log_file or not Path(task.log_file).exists():
-                await websocket.send_json({
+            if not log_exists(task.log_file):
+                sender.push_message({
                     "type": "info",
                     "message": "等待日志文件生成..."
                 })
                 # 等待日志文件
                 for _ in range(30):  # 最多等待 30 秒
                     await asyncio.sleep(1)
+                    if sender.closed:
+                        return
                     task, _ = queue_manager.find_task_in_all_queues(task_id)
-                    if task and task.log_file and Path(task.log_file).exists():
+                    if task and log_exists(task.log_file):
                         break
                 else:
-                    await websocket.send_json({
+                    sender.push_message({
                         "type": "error",
                         "message": "日志文件未生成"
                     })
                     return
             
-            log_path = Path(task.log_file)
-            # 每个连接独立的读取位置和行缓冲区（不共享）
-            last_pos = 0
-            line_buffer = ''
+            log_file = task.log_file
+            # 每个连接独立的读取位置和折叠器（不共享）
+            # 按字节偏移读取，增量解码避免多字节字符被读取边界截断
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            collapser = ProgressBarCollapser(MAX_PARTIAL_CHARS)
+            
+            # 断线续传：游标有效时从游标处开始读取，不再重发历史日志
+            resumed = since is not None and 0 <= since <= await run_blocking(log_size, log_file)
+            last_pos = since if resumed else 0
+            # 最后一个已完成行之后的字节偏移（发送给客户端的游标）
+            line_pos = last_pos
+            
+            def advance(data: bytes):
+                """更新读取位置和行对齐的游标"""
+                nonlocal last_pos, line_pos
+                newline = data.rfind(b'\n')
+                if newline >= 0:
+                    line_pos = last_pos + newline + 1
+                last_pos += len(data)
             
             # 发送初始化信息（包含日志文件路径）
-            await websocket.send_json({
+            sender.push_message({
                 "type": "init",
                 "log_file": str(task.log_file),
-                "task_name": task.name
+                "task_name": task.name,
+                "offset": last_pos,
+                "resumed": resumed
             })
             
             # 先发送历史日志（只发送最后 N 行以加快加载）
-            MAX_HISTORY_LINES = 500
-            if log_path.exists():
-                with open(log_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
-                    content = f.read()
-                    if content:
-                        # 清理回车符但保留ANSI颜色
-                        cleaned = clean_progress_bar_output(content)
-                        # 只保留最后 N 行
-                        lines = cleaned.split('\n')
-                        if len(lines) > MAX_HISTORY_LINES:
-                            cleaned = f"... (前 {len(lines) - MAX_HISTORY_LINES} 行已省略，可使用复制命令查看完整日志)\n" + '\n'.join(lines[-MAX_HISTORY_LINES:])
-                        
-                        await websocket.send_json({
-                            "type": "log",
-                            "content": cleaned
-                        })
-                    last_pos = f.tell()
+            # 流式折叠，内存只与保留的行数有关；未完成的行留在折叠器中继续跟踪
+            def backlog_chunks():
+                for chunk in iter_log_bytes(log_file, start=last_pos, chunk_size=1024 * 1024):
+                    advance(chunk)
+                    yield decoder.decode(chunk)
+            
+            # 大日志的历史读取放到线程池，不阻塞事件循环
+            cleaned, total_lines = await run_blocking(collapse_tail, backlog_chunks(), MAX_HISTORY_LINES, collapser)
+            if cleaned:
+                if total_lines > MAX_HISTORY_LINES:
+                    cleaned = f"... (前 {total_lines - MAX_HISTORY_LINES} 行已省略，可使用复制命令查看完整日志)\n" + cleaned
+                # 续传时客户端可能还显示着断线前的进度条帧
+                sender.push_log((CLEAR_LINE if resumed else '') + cleaned, offset=line_pos)
+            shown_frame = collapser.current_frame()
+            if shown_frame:
+                sender.push_log(CLEAR_LINE + shown_frame, progress=True, offset=line_pos)
             
             # 持续读取新内容
-            while True:
+            while not sender.closed:
                 task, _ = queue_manager.find_task_in_all_queues(task_id)
                 
                 # 任务结束检查
                 if not task or task.status.value not in ("running",):
-                    # 读取剩余日志
-                    if log_path.exists():
-                        with open(log_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
-                            f.seek(last_pos)
-                            remaining = f.read()
-                            # 合并缓冲区中的内容
-                            final_content = line_buffer + remaining
-                            if final_content:
-                                await websocket.send_json({
-                                    "type": "log",
-                                    "content": clean_progress_bar_output(final_content)
-                                })
+                    # 分块读取剩余日志并结束未完成的行
+                    while not sender.closed:
+                        remaining_bytes = await run_blocking(read_log_bytes, log_file, last_pos,
+                                                             last_pos + POLL_READ_BYTES)
+                        if not remaining_bytes:
+                            break
+                        advance(remaining_bytes)
+                        completed = collapser.feed(decoder.decode(remaining_bytes))
+                        if completed:
+                            sender.push_log((CLEAR_LINE if shown_frame else '') + completed, offset=line_pos)
+                            shown_frame = ''
+                    final_content = collapser.feed(decoder.decode(b'', final=True)) + collapser.flush()
+                    if final_content or shown_frame:
+                        sender.push_log((CLEAR_LINE if shown_frame else '') + final_content, offset=last_pos)
                     
-                    await websocket.send_json({
+                    sender.push_message({
                         "type": "end",
                         "status": task.status.value if task else "unknown",
                         "message": "任务已结束"
                     })
                     break
                 
-                # 读取新日志内容
-                if log_path.exists():
-                    with open(log_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
-                        f.seek(last_pos)
-                        new_content = f.read()
-                        if new_content:
-                            # 合并上次未完成的行
-                            full_content = line_buffer + new_content
-                            
-                            # 找到最后一个换行符，分离完整行和不完整行
-                            last_newline = full_content.rfind('\n')
-                            
-                            if last_newline >= 0:
-                                # 有完整行
-                                complete_lines = full_content[:last_newline + 1]
-                                line_buffer = full_content[last_newline + 1:]
-                                
-                                # 发送清理后的完整行
-                                if complete_lines:
-                                    await websocket.send_json({
-                                        "type": "log",
-                                        "content": clean_progress_bar_output(complete_lines)
-                                    })
-                            else:
-                                # 没有完整行，全部缓冲
-                                line_buffer = full_content
-                            
-                            last_pos = f.tell()
+                # 读取新日志内容（单次读取有上限，读满时不等待直接继续）
+                new_bytes = await run_blocking(read_log_bytes, log_file, last_pos, last_pos + POLL_READ_BYTES)
+                if new_bytes:
+                    advance(new_bytes)
+                    cleaned = collapser.feed(decoder.decode(new_bytes))
+                    
+                    # 发送已完成的行（覆盖已显示的进度条帧）
+                    if cleaned:
+                        sender.push_log((CLEAR_LINE if shown_frame else '') + cleaned, offset=line_pos)
+                        shown_frame = ''
+                    
+                    # 未完成行中的进度条：原地刷新显示最新一帧
+                    frame = collapser.current_frame()
+                    if frame and frame != shown_frame:
+                        sender.push_log(CLEAR_LINE + frame, progress=True, offset=line_pos)
+                        shown_frame = frame
                 
-                await asyncio.sleep(0.5)  # 每 0.5 秒检查一次
+                if len(new_bytes) < POLL_READ_BYTES:
+                    await asyncio.sleep(0.5)  # 每 0.5 秒检查一次
                 
-        except WebSocketDisconnect:
-            pass
         except Exception as e:
             logger.error(f"日志流错误: {e}")
-            try:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": str(e)
-                })
-            except:
-                pass
+            sender.push_message({
+                "type": "error",
+                "message": str(e)
+            })
+    
+    async def _stream_from_buffer(self, task_id: str, task, buffer: TaskLogBuffer,
+                                  sender: LogFrameSender, since: Optional[int] = None):
+        """
+        从任务的内存缓冲区推送日志（历史快照 + 订阅增量）
+        """
+        from .state import get_queue_manager
+        
+        queue_manager = get_queue_manager()
+        loop = asyncio.get_running_loop()
+        ended = asyncio.Event()
+        shown_frame = ''
+        # 历史快照发送前（续传补读期间）暂存的新输出，发送后置为 None
+        held: Optional[List[Tuple[str, str, bool, int]]] = []
+        
+        def on_output(completed: str, frame: str, final: bool, offset: int):
+            """在事件循环中处理缓冲区的新输出"""
+            nonlocal shown_frame
+            if held is not None:
+                held.append((completed, frame, final, offset))
+                return
+            if final:
+                content = completed + frame
+                if content or shown_frame:
+                    sender.push_log((CLEAR_LINE if shown_frame else '') + content, offset=offset)
+                shown_frame = ''
+                ended.set()
+                return
+            
+            # 发送已完成的行（覆盖已显示的进度条帧）
+            if completed:
+                sender.push_log((CLEAR_LINE if shown_frame else '') + completed, offset=offset)
+                shown_frame = ''
+            
+            # 未完成的行：原地刷新显示最新内容
+            if frame and frame != shown_frame:
+                sender.push_log(CLEAR_LINE + frame, progress=True, offset=offset)
+                shown_frame = frame
+        
+        def listener(completed: str, frame: str, final: bool, offset: int):
+            # 在跟踪线程中调用，转交给事件循环
+            loop.call_soon_threadsafe(on_output, completed, frame, final, offset)
+        
+        snapshot = buffer.subscribe(listener, MAX_HISTORY_LINES)
+        try:
+            shown_frame = await push_buffer_backlog(sender, task, snapshot, since)
+            pending, held = held, None
+            for args in pending:
+                on_output(*args)
+            if snapshot[3]:
+                ended.set()
+            
+            while not sender.closed:
+                task, _ = queue_manager.find_task_in_all_queues(task_id)
+                running = task is not None and task.status.value == "running"
+                
+                if ended.is_set() or not running:
+                    if running:
+                        # 输出已读完，等待任务状态更新
+                        for _ in range(50):
+                            await asyncio.sleep(0.1)
+                            task, _ = queue_manager.find_task_in_all_queues(task_id)
+                            if not task or task.status.value != "running":
+                                break
+                    elif not ended.is_set():
+                        # 任务已结束，等待缓冲区读完剩余输出
+                        try:
+                            await asyncio.wait_for(ended.wait(), 5)
+                        except asyncio.TimeoutError:
+                            pass
+                    
+                    sender.push_message({
+                        "type": "end",
+                        "status": task.status.value if task else "unknown",
+                        "message": "任务已结束"
+                    })
+                    break
+                
+                try:
+                    await asyncio.wait_for(ended.wait(), 0.5)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            buffer.unsubscribe(listener)
 
 
 # 全局日志流管理器
@@ -242,60 +622,83 @@ log_streamer = LogStreamer()
 
 
 @router.websocket("/ws/logs/{task_id}")
-async def websocket_logs(websocket: WebSocket, task_id: str):
-    """任务日志 WebSocket 端点"""
+async def websocket_logs(websocket: WebSocket, task_id: str, since: Optional[int] = None):
+    """
+    任务日志 WebSocket 端点
+    
+    init/log 消息携带 offset 游标，断线重连时传入 ?since=<offset> 只接收缺失的内容。
+    """
     await log_streamer.connect(task_id, websocket)
+    websocket_connections.inc(endpoint="logs")
+    sender = LogFrameSender(websocket)
+    sender.start()
+    
+    async def watch_disconnect():
+        """客户端不发送消息；连接断开时标记发送队列关闭，空闲的读取循环随之退出"""
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+        except Exception:
+            pass
+        finally:
+            sender.closed = True
+    
+    watcher = asyncio.create_task(watch_disconnect())
     try:
-        await log_streamer.stream_log(task_id, websocket)
+        await log_streamer.stream_log(task_id, sender, since)
     finally:
+        watcher.cancel()
+        await sender.close()
         log_streamer.disconnect(task_id, websocket)
+        websocket_connections.dec(endpoint="logs")
 
 
 @router.websocket("/ws/status")
 async def websocket_status(websocket: WebSocket):
-    """任务状态 WebSocket 端点（广播所有任务状态变化）"""
+    """
+    任务状态 WebSocket 端点（所有队列）
+    
+    连接后先发送完整快照，之后只在状态变化时推送带版本号的增量。
+    快照和增量由 StatusHub 统一构建并序列化一次，所有连接共享；
+    客户端可发送 {"type": "resync"} 重新获取完整快照。
+    """
+    from .status import status_hub, RESYNC
+    
     await websocket.accept()
+    websocket_connections.inc(endpoint="status")
+    queue = status_hub.subscribe()
+    
+    async def receive_loop():
+        """处理客户端消息，连接断开时通知发送循环退出"""
+        try:
+            while True:
+                message = await websocket.receive_json()
+                if isinstance(message, dict) and message.get("type") == "resync":
+                    status_hub.request_resync(queue)
+        except Exception:
+            pass
+        finally:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
     
+    receiver = asyncio.create_task(receive_loop())
     try:
-        last_state = {}
-        
+        await websocket.send_text(status_hub.snapshot_text())
         while True:
-            try:
-                manager = get_task_manager()
-                
-                # 如果没有队列，返回空状态
-                if manager is None:
-                    current_state = {
-                        "pending": [],
-                        "running": [],
-                        "history_count": 0,
-                        "busy_gpus": []
-                    }
-                else:
-                    # 获取当前状态
-                    current_state = {
-                        "pending": [t.to_dict() for t in manager.get_pending_tasks()],
-                        "running": [t.to_dict() for t in manager.get_running_tasks()],
-                        "history_count": len(manager.history),
-                        "busy_gpus": list(manager.get_busy_gpus())
-                    }
-                
-                # 只在状态变化时推送
-                if current_state != last_state:
-                    await websocket.send_json({
-                        "type": "status_update",
-                        "data": current_state
-                    })
-                    last_state = current_state.copy()
-                
-                await asyncio.sleep(1)  # 每秒检查一次
-                
-            except RuntimeError:
-                # TaskManager 未初始化
-                await asyncio.sleep(1)
-                continue
-                
-    except WebSocketDisconnect:
+            item = await queue.get()
+            if item is None:
+                break
+            if item is RESYNC:
+                item = status_hub.snapshot_text()
+            await websocket.send_text(item)
+    except (WebSocketDisconnect, RuntimeError, ConnectionError):
         pass
     except Exception as e:
-        logger.error(f"状态 WebSocket 错误: {e}")
+        logger.error(f"状态推送错误: {e}")
+    finally:
+        status_hub.unsubscribe(queue)
+        receiver.cancel()
+        websocket_connections.dec(endpoint="status")
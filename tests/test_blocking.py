@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""阻塞操作线程池测试"""
+
+import asyncio
+import threading
+
+import pytest
+
+from multitaskflow.web.blocking import BlockingExecutor
+
+
+def test_run_returns_result_and_raises():
+    executor = BlockingExecutor(max_workers=2)
+
+    async def scenario():
+        assert await executor.run(sum, [1, 2, 3]) == 6
+        with pytest.raises(ZeroDivisionError):
+            await executor.run(lambda: 1 / 0)
+
+    asyncio.run(scenario())
+    stats = executor.stats()
+    assert (stats["submitted"], stats["completed"], stats["failed"]) == (2, 1, 1)
+    executor.shutdown()
+
+
+def test_shutdown_cancels_queued_calls():
+    executor = BlockingExecutor(max_workers=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    async def scenario():
+        running = asyncio.ensure_future(executor.run(block))
+        queued = [asyncio.ensure_future(executor.run(lambda: "never")) for _ in range(3)]
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        executor.shutdown()
+        release.set()
+        assert await running == "done"
+        for future in queued:
+            with pytest.raises(asyncio.CancelledError):
+                await future
+
+    asyncio.run(scenario())
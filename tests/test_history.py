@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""执行历史 SQLite 存储、旧版 JSON 迁移和统计聚合测试"""
+
+import json
+
+from multitaskflow.web.history import HistoryManager
+from multitaskflow.web.manager import TaskManager
+
+
+def _record(task_id, name="train", status="completed", duration=10.0, day="2024-05-01", gpu=None):
+    return {
+        "id": task_id, "name": name, "command": f"python {name}.py --seed {task_id}",
+        "status": status, "gpu": gpu, "start_time": f"{day} 10:00:00", "end_time": f"{day} 10:00:10",
+        "duration": duration, "error_message": None, "log_file": None, "note": None, "phases": None,
+    }
+
+
+def _write_legacy(logs_dir, records):
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    path = logs_dir / ".history.json"
+    path.write_text(json.dumps({"history": records}), encoding="utf-8")
+    return path
+
+
+def _queue(tmp_path, name):
+    config = tmp_path / f"{name}.yaml"
+    config.write_text("[]\n", encoding="utf-8")
+    manager = TaskManager(str(config))
+    manager.journal.close()
+    return manager
+
+
+def test_legacy_history_is_imported_once(tmp_path):
+    legacy = _write_legacy(tmp_path / "logs", [_record("a"), _record("b"), _record("c", status="failed")])
+
+    first = _queue(tmp_path, "first")
+    second = _queue(tmp_path, "second")
+    assert first.history_manager.count() == 3
+    assert second.history_manager.count() == 0
+    assert not legacy.exists()
+    assert legacy.with_name(".history.json.migrated").exists()
+
+    # 之后添加的队列也不会再导入
+    later = _queue(tmp_path, "later")
+    assert later.history_manager.count() == 0
+
+    # 重新打开已有数据库不会重复计入统计
+    first.history_manager.close()
+    reopened = HistoryManager(str(first.history_manager.db_file), legacy_file=str(legacy))
+    assert reopened.count() == 3
+    assert sum(row["count"] for row in reopened.aggregates()) == 3
+    reopened.close()
+
+
+def test_duplicate_ids_are_recorded_once(tmp_path):
+    history = HistoryManager(str(tmp_path / "history.db"))
+    history.add(_record("a"))
+    history.add(_record("a", status="stopped"))
+    history.add(_record("b"))
+
+    assert history.count() == 2
+    assert history.get("a")["status"] == "completed"
+    assert [record["id"] for record in history.get_many(["a", "missing", "b"])] == ["b", "a"]
+    assert sum(row["count"] for row in history.aggregates()) == 2
+    history.close()
+
+
+def test_aggregates_match_rebuild(tmp_path):
+    history = HistoryManager(str(tmp_path / "history.db"))
+    for i in range(20):
+        history.add(_record(f"t{i}", name="train" if i % 2 else "eval",
+                            status="failed" if i % 5 == 0 else "completed",
+                            duration=float(i * 7), day=f"2024-05-0{1 + i % 3}", gpu=[i % 2]))
+
+    rows = history.aggregates()
+    assert sum(row["count"] for row in rows) == 20
+    assert sum(row["count"] for row in history.aggregates(statuses=["failed"])) == 4
+    assert sum(row["count"] for row in history.aggregates(name="train")) == 10
+    assert sum(row["count"] for row in history.aggregates(since="2024-05-02", until="2024-05-03")) == 7
+    assert sum(row["count"] for row in history.aggregates(gpu=1)) == 10
+    for row in rows:
+        assert sum(row["bins"].values()) == row["timed"]
+
+    def normalized(items):
+        return sorted(json.dumps(item, sort_keys=True) for item in items)
+
+    with history._lock:
+        history._rebuild_stats()
+    assert normalized(history.aggregates()) == normalized(rows)
+    history.close()
+
+
+def test_clear_resets_aggregates(tmp_path):
+    history = HistoryManager(str(tmp_path / "history.db"))
+    history.add(_record("a"))
+    history.clear()
+
+    assert history.count() == 0
+    assert history.aggregates() == []
+    assert history.latency_aggregates() == []
+    history.close()
+
+
+def test_requeue_keeps_raw_log(tmp_path):
+    manager = _queue(tmp_path, "queue")
+    raw = manager.add_task("raw", "echo raw", raw_log=True)
+    plain = manager.add_task("plain", "echo plain")
+    for task in (raw, plain):
+        manager.history_manager.add(task.to_dict())
+
+    assert manager.history_manager.get(raw.id)["raw_log"] is True
+    results = manager.requeue_tasks([raw.id, plain.id])
+    assert results[raw.id].raw_log is True
+    assert results[plain.id].raw_log is False
+    manager.history_manager.close()
+
+
+def test_upgrade_backfills_raw_log(tmp_path):
+    db_file = tmp_path / "history.db"
+    history = HistoryManager(str(db_file))
+    history.add(_record("a"))
+    # 模拟升级前的数据库：记录中没有 raw_log，结构版本为 2
+    with history._conn:
+        history._conn.execute("UPDATE history SET data = ?", (json.dumps(_record("a")),))
+        history._conn.execute("PRAGMA user_version = 2")
+    rows = history.aggregates()
+    history.close()
+
+    upgraded = HistoryManager(str(db_file))
+    assert upgraded.get("a")["raw_log"] is False
+    assert upgraded._conn.execute("PRAGMA user_version").fetchone()[0] == 3
+    # 只补充字段，不重建统计
+    assert upgraded.aggregates() == rows
+    upgraded.close()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""待执行队列日志（journal）的重放、批量记录和压缩测试"""
+
+import json
+import time
+
+from multitaskflow.web import journal as journal_module
+from multitaskflow.web.journal import TaskJournal
+from multitaskflow.web.manager import TaskManager
+
+
+def _task(task_id, name=None):
+    return {"id": task_id, "name": name or task_id, "command": f"echo {task_id}",
+            "note": None, "raw_log": False, "phases": {}}
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def _manager(tmp_path, name="queue"):
+    config = tmp_path / f"{name}.yaml"
+    if not config.exists():
+        config.write_text("[]\n", encoding="utf-8")
+    return TaskManager(str(config))
+
+
+def test_replay_put_remove_order(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = TaskJournal(str(path), lambda: ([], []))
+    journal.put([_task("a"), _task("b"), _task("c")], new=True)
+    journal.put([_task("b", name="renamed")])
+    journal.remove(["a"])
+    journal.order(["c", "b"])
+    journal.put([_task("d")], new=True)
+    journal.close()
+
+    tasks, loaded_names = TaskJournal(str(path), lambda: ([], [])).replay()
+    assert [task["id"] for task in tasks] == ["c", "b", "d"]
+    assert tasks[1]["name"] == "renamed"
+    assert loaded_names == []
+
+
+def test_replay_legacy_single_records(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    records = [
+        {"op": "snapshot", "tasks": [_task("a")], "loaded_names": ["a"]},
+        {"op": "put", "task": _task("b")},
+        {"op": "remove", "id": "a"},
+    ]
+    path.write_text("".join(json.dumps(r) + "\n" for r in records) + '{"op": "put", "ta', encoding="utf-8")
+
+    journal = TaskJournal(str(path), lambda: ([], []))
+    tasks, loaded_names = journal.replay()
+    assert [task["id"] for task in tasks] == ["b"]
+    assert loaded_names == ["a"]
+    assert journal.stats()["records"] == 3
+
+
+def test_writes_happen_in_background(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = TaskJournal(str(path), lambda: ([], []), interval=60)
+    journal.put([_task("a")], new=True)
+    deadline = time.time() + 5
+    while journal.stats()["writes"] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(_lines(path)) == 1
+
+    # 写入间隔内的记录留在内存中，close() 时写入
+    journal.put([_task("b")], new=True)
+    assert journal.stats()["pending"] == 1
+    assert len(_lines(path)) == 1
+    journal.close()
+    assert [record["op"] for record in _lines(path)] == ["put", "put"]
+    assert journal.stats()["pending"] == 0
+
+
+def test_compaction_replaces_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal_module, "COMPACT_MIN_RECORDS", 10)
+    path = tmp_path / "journal.jsonl"
+    live = [_task("keep")]
+    journal = TaskJournal(str(path), lambda: (live, ["keep"]))
+    journal.put(live, new=True)
+    for i in range(20):
+        journal.put([_task(f"t{i}")], new=True)
+        journal.remove([f"t{i}"])
+    journal.close()
+
+    records = _lines(path)
+    assert records[0]["op"] == "snapshot"
+    assert len(records) < 10
+    tasks, loaded_names = TaskJournal(str(path), lambda: ([], [])).replay()
+    assert [task["id"] for task in tasks] == ["keep"]
+    assert loaded_names == ["keep"]
+
+
+def test_bulk_operations_write_one_record(tmp_path):
+    manager = _manager(tmp_path)
+    created = manager.add_tasks([{"name": f"t{i}", "command": f"echo {i}"} for i in range(50)])
+    ids = [task.id for task in created]
+    manager.update_tasks([{"id": task_id, "note": "n"} for task_id in ids[:10]])
+    manager.delete_tasks(ids[:20])
+    manager.journal.close()
+
+    records = _lines(manager.journal.path)
+    assert [record["op"] for record in records] == ["put", "put", "remove"]
+    assert len(records[0]["tasks"]) == 50
+    assert len(records[1]["tasks"]) == 10
+    assert sorted(records[2]["ids"]) == sorted(ids[:20])
+
+
+def test_manager_restores_pending_tasks(tmp_path):
+    manager = _manager(tmp_path)
+    first = manager.add_task("first", "echo 1")
+    second = manager.add_task("second", "echo 2")
+    third = manager.add_task("third", "echo 3", note="note")
+    manager.delete_task(first.id)
+    manager.reorder_tasks([third.id, second.id])
+    manager.journal.close()
+
+    restored = _manager(tmp_path)
+    assert [task.id for task in restored.get_pending_tasks()] == [third.id, second.id]
+    assert restored.tasks[third.id].note == "note"
+    restored.journal.close()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""分块 gzip 日志归档与透明读取测试"""
+
+import gzip
+import json
+import random
+
+import pytest
+
+from multitaskflow.web.logstore import (
+    compress_log, is_archived, iter_log_bytes, iter_log_text, log_size,
+    read_log_bytes, read_log_tail, resolve_log_path,
+)
+
+BLOCK_SIZE = 1000
+
+
+def _log_data():
+    rng = random.Random(42)
+    lines = [f"step {i} loss={rng.random():.6f} 进度 {'█' * (i % 7)}\r\n" for i in range(400)]
+    return "".join(lines).encode("utf-8")
+
+
+@pytest.fixture
+def archived(tmp_path):
+    """(原始日志路径, 原始数据)，日志已按 BLOCK_SIZE 分块归档"""
+    data = _log_data()
+    path = tmp_path / "task.log"
+    path.write_bytes(data)
+    compress_log(path, block_size=BLOCK_SIZE)
+    return str(path), data
+
+
+def test_archive_round_trip(archived):
+    log_file, data = archived
+    path = resolve_log_path(log_file)
+    assert is_archived(path)
+    assert path.with_name(path.name + ".idx").exists()
+    assert read_log_bytes(log_file) == data
+    # 多成员 gzip：标准工具可以直接解压
+    with gzip.open(path, "rb") as f:
+        assert f.read() == data
+    assert "".join(iter_log_text(log_file, chunk_size=7)) == data.decode("utf-8")
+
+
+def test_reads_straddling_block_boundaries(archived):
+    log_file, data = archived
+    size = len(data)
+    cases = [(0, 1), (BLOCK_SIZE - 1, BLOCK_SIZE + 1), (BLOCK_SIZE, 2 * BLOCK_SIZE),
+             (BLOCK_SIZE - 5, 3 * BLOCK_SIZE + 5), (size - 3, size), (size - 1, None), (10, size + 100)]
+    for start, end in cases:
+        expected = data[start:end]
+        assert read_log_bytes(log_file, start, end) == expected
+        assert b"".join(iter_log_bytes(log_file, start, end)) == expected
+    assert read_log_bytes(log_file, size, None) == b""
+    assert read_log_bytes(log_file, 500, 400) == b""
+
+
+def test_log_size_of_archived_log(archived):
+    log_file, data = archived
+    assert log_size(log_file) == len(data)
+    assert read_log_tail(log_file, 50) == data[-50:].decode("utf-8", errors="replace")
+
+
+@pytest.mark.parametrize("damage", ["missing", "corrupt", "stale"])
+def test_bad_index_falls_back_to_sequential_read(archived, damage):
+    log_file, data = archived
+    path = resolve_log_path(log_file)
+    index = path.with_name(path.name + ".idx")
+    if damage == "missing":
+        index.unlink()
+    elif damage == "corrupt":
+        index.write_text("{not json")
+    else:
+        # 与归档大小不匹配的索引不使用
+        content = json.loads(index.read_text())
+        content["comp_size"] += 1
+        index.write_text(json.dumps(content))
+
+    assert log_size(log_file) == len(data)
+    assert read_log_bytes(log_file) == data
+    start, end = BLOCK_SIZE - 3, 2 * BLOCK_SIZE + 3
+    assert read_log_bytes(log_file, start, end) == data[start:end]
+
+
+def test_plain_log_reads(tmp_path):
+    data = _log_data()
+    path = tmp_path / "plain.log"
+    path.write_bytes(data)
+    log_file = str(path)
+    assert not is_archived(resolve_log_path(log_file))
+    assert log_size(log_file) == len(data)
+    assert read_log_bytes(log_file, 123, 4567) == data[123:4567]
+    assert log_size(str(tmp_path / "missing.log")) == 0
+    assert read_log_bytes(str(tmp_path / "missing.log")) == b""
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""任务输出泵（写入时进度条压缩）测试"""
+
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from multitaskflow.web import pump
+from multitaskflow.web.manager import TaskManager, TaskStatus
+from multitaskflow.web.pump import ProgressCompactor, run_pump
+from multitaskflow.web.termlog import collapse_progress
+
+# 输出进度条的测试任务：普通行、多帧进度条（含空白帧）、未换行结尾
+PROGRESS_SCRIPT = r"""
+import sys, time
+print("start", flush=True)
+for i in range(200):
+    sys.stdout.write("\r %3d%%|%s|" % (i // 2, "#" * (i // 10)))
+    sys.stdout.flush()
+    if i % 50 == 0:
+        time.sleep(0.05)
+sys.stdout.write("\r   \r")
+print()
+print("中文输出 done", flush=True)
+sys.stdout.write("tail without newline")
+"""
+
+
+def _raw_output():
+    return subprocess.run([sys.executable, "-c", PROGRESS_SCRIPT], capture_output=True).stdout.decode("utf-8")
+
+
+def _compact(text, interval, rng):
+    compactor = ProgressCompactor(interval)
+    out, pos, now = [], 0, 0.0
+    while pos < len(text):
+        end = pos + rng.randint(1, 6)
+        now += rng.random()
+        out.append(compactor.feed(text[pos:end], now))
+        if rng.random() < 0.3:
+            now += rng.random()
+            out.append(compactor.poll(now))
+        pos = end
+    out.append(compactor.finish())
+    return "".join(out)
+
+
+def test_compacted_output_collapses_like_raw_output():
+    rng = random.Random(2)
+    alphabet = ["a", "b", " ", "\r", "\n", "\r\n", "x", "进"]
+    for _ in range(20000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        interval = rng.choice([0, 0.5, 1, 100])
+        compacted = _compact(text, interval, rng)
+        assert collapse_progress(compacted) == collapse_progress(text), (text, interval)
+
+
+def test_compactor_drops_overwritten_frames():
+    compactor = ProgressCompactor(interval=100)
+    frames = "".join(f"\r{i:3d}%" for i in range(100))
+    out = compactor.feed("epoch 1\n" + frames, 0.0) + compactor.feed("\n", 1.0) + compactor.finish()
+    assert out.startswith("epoch 1\n")
+    assert compactor.frames_out < 5 < compactor.frames_in
+    assert collapse_progress(out) == "epoch 1\n 99%\n"
+
+
+def test_run_pump_writes_until_eof(tmp_path):
+    raw = _raw_output()
+    log = tmp_path / "task.log"
+    read_fd, write_fd = os.pipe()
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(written=run_pump(read_fd, str(log), 0.05)))
+    thread.start()
+    data = raw.encode("utf-8")
+    # 多字节字符跨写入边界
+    for i in range(0, len(data), 7):
+        os.write(write_fd, data[i:i + 7])
+    os.close(write_fd)
+    thread.join(timeout=10)
+    os.close(read_fd)
+
+    assert not thread.is_alive()
+    content = log.read_bytes()
+    assert result["written"] == len(content)
+    assert len(content) < len(data)
+    assert collapse_progress(content.decode("utf-8")) == collapse_progress(raw)
+
+
+def test_pump_process_exits_on_eof(tmp_path):
+    log = tmp_path / "task.log"
+    process = subprocess.Popen([sys.executable, pump.__file__, "--log", str(log), "--interval", "0.1"],
+                               stdin=subprocess.PIPE)
+    process.stdin.write(b"line\n 10%\r 20%")
+    process.stdin.close()
+    assert process.wait(timeout=10) == 0
+    assert collapse_progress(log.read_bytes().decode("utf-8")) == "line\n 20%"
+
+
+def _manager(tmp_path):
+    config = tmp_path / "queue.yaml"
+    config.write_text("[]\n", encoding="utf-8")
+    (tmp_path / "progress.py").write_text(PROGRESS_SCRIPT, encoding="utf-8")
+    manager = TaskManager(str(config), output_pump=True, compact_interval=0.05)
+    manager.journal.close()
+    return manager
+
+
+def _wait_finished(task, timeout=20):
+    deadline = time.time() + timeout
+    while task.status == TaskStatus.RUNNING and time.time() < deadline:
+        time.sleep(0.05)
+    assert task.status != TaskStatus.RUNNING
+
+
+def _run(manager, raw_log=False):
+    task = manager.add_task("progress", f'"{sys.executable}" progress.py', raw_log=raw_log)
+    manager.run_task(task.id)
+    _wait_finished(task)
+    return task
+
+
+def test_manager_writes_compacted_log_through_pump(tmp_path):
+    manager = _manager(tmp_path)
+    task = _run(manager)
+    raw = _raw_output()
+
+    assert task.pump_process is not None
+    # 任务退出后输出泵读到 EOF 并退出
+    assert task.pump_process.poll() == 0
+    content = Path(task.log_file).read_bytes()
+    assert len(content) < len(raw.encode("utf-8"))
+    assert collapse_progress(content.decode("utf-8")) == collapse_progress(raw)
+
+
+def test_raw_log_bypasses_pump(tmp_path):
+    manager = _manager(tmp_path)
+    task = _run(manager, raw_log=True)
+
+    assert task.pump_process is None
+    assert Path(task.log_file).read_bytes().decode("utf-8") == _raw_output()
+
+
+def test_pump_exits_when_task_is_stopped(tmp_path):
+    manager = _manager(tmp_path)
+    task = manager.add_task("sleep", f'"{sys.executable}" -c "import time; print(1, flush=True); time.sleep(60)"')
+    manager.run_task(task.id)
+    time.sleep(0.5)
+    assert task.pump_process.poll() is None
+
+    manager.stop_task(task.id)
+    _wait_finished(task)
+    assert task.pump_process.wait(timeout=10) == 0
+    assert Path(task.log_file).read_bytes().decode("utf-8") == "1\n"
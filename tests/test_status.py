@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""状态推送中心（快照、增量、版本号和兜底检查）测试"""
+
+import asyncio
+import copy
+import json
+
+import pytest
+
+from multitaskflow.web import state
+from multitaskflow.web.events import event_bus
+from multitaskflow.web.queue_manager import QueueManager
+from multitaskflow.web.status import StatusHub
+
+
+def apply_diff(queues, message):
+    """按客户端的方式应用一条状态消息，返回是否需要 resync"""
+    queue_id = message["queue_id"]
+    if message["type"] == "queue_removed":
+        queues.pop(queue_id, None)
+        return False
+    current = queues.get(queue_id)
+    if message["base_version"] != (current["version"] if current else 0):
+        return True
+    changes = message["changes"]
+    if current is None:
+        queues[queue_id] = {"version": message["version"], **copy.deepcopy(changes)}
+        return False
+    for key, value in changes.items():
+        if key == "tasks":
+            current["tasks"].update(copy.deepcopy(value))
+        elif key == "removed":
+            for task_id in value:
+                current["tasks"].pop(task_id, None)
+        else:
+            current[key] = value
+    current["version"] = message["version"]
+    return False
+
+
+@pytest.fixture
+def queue_manager(tmp_path):
+    queue_manager = QueueManager(str(tmp_path))
+    for name in ("a", "b"):
+        config = tmp_path / f"{name}.yaml"
+        config.write_text("[]\n", encoding="utf-8")
+        queue_manager.add_queue(name, str(config))
+    state.set_queue_manager(queue_manager)
+    yield queue_manager
+    state.set_queue_manager(None)
+    for manager in queue_manager.queues.values():
+        manager.journal.close()
+
+
+async def _drain(inbox, queues, wait=0.1):
+    await asyncio.sleep(wait)
+    while not inbox.empty():
+        assert not apply_diff(queues, json.loads(inbox.get_nowait()))
+
+
+def _snapshot(hub):
+    return json.loads(hub.snapshot_text())["queues"]
+
+
+def test_diffs_and_versions_match_snapshots(queue_manager):
+    async def scenario():
+        hub = StatusHub(debounce=0.01, resync_interval=60)
+        await hub.start()
+        inbox = hub.subscribe()
+        queues = _snapshot(hub)
+        try:
+            first, second = [queue_manager.get_queue(qid) for qid in list(queue_manager.queues)]
+            tasks = [first.add_task(f"t{i}", f"echo {i}") for i in range(5)]
+            second.add_task("other", "echo other")
+            await _drain(inbox, queues)
+            assert queues == _snapshot(hub)
+
+            first.update_task(tasks[0].id, note="note")
+            first.delete_task(tasks[1].id)
+            first.reorder_tasks([t.id for t in reversed(tasks) if t is not tasks[1]])
+            await _drain(inbox, queues)
+            assert queues == _snapshot(hub)
+            assert queues[first.queue_id]["order"][0] == tasks[4].id
+            assert queues[first.queue_id]["tasks"][tasks[0].id]["note"] == "note"
+
+            queue_manager.remove_queue(second.queue_id)
+            await _drain(inbox, queues)
+            assert queues == _snapshot(hub)
+            assert list(queues) == [first.queue_id]
+            assert hub.versions() == {qid: q["version"] for qid, q in queues.items()}
+        finally:
+            await hub.stop()
+
+    asyncio.run(scenario())
+
+
+def test_resync_rebuilds_only_changed_queues(queue_manager):
+    async def scenario():
+        hub = StatusHub(debounce=0.01, resync_interval=0.05)
+        await hub.start()
+        inbox = hub.subscribe()
+        queues = _snapshot(hub)
+        try:
+            # 没有状态变化时兜底检查不重建快照
+            builds = hub.builds
+            await asyncio.sleep(0.3)
+            assert hub.builds == builds
+            assert hub.resyncs == 0
+
+            # 遗漏事件的变化由版本号检查发现，只重建该队列
+            manager = next(iter(queue_manager.queues.values()))
+            event_bus.unsubscribe(hub._on_event)
+            manager.add_task("missed", "echo missed")
+            event_bus.subscribe(hub._on_event, asyncio.get_running_loop())
+            await _drain(inbox, queues, wait=0.3)
+            assert hub.resyncs == 1
+            assert hub.builds == builds + 1
+            assert queues == _snapshot(hub)
+            assert any(t["name"] == "missed" for t in queues[manager.queue_id]["tasks"].values())
+        finally:
+            await hub.stop()
+
+    asyncio.run(scenario())
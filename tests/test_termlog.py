@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""进度条折叠（ProgressBarCollapser / collapse_tail）测试"""
+
+import random
+
+import pytest
+
+from multitaskflow.web.logbuffer import MAX_PARTIAL_CHARS
+from multitaskflow.web.termlog import ProgressBarCollapser, collapse_progress, collapse_tail
+
+
+def baseline_clean(content):
+    """改为增量实现之前 ws.clean_progress_bar_output 的逐行实现（对照用）"""
+    if '\r' not in content:
+        return content
+    result = []
+    for line in content.split('\n'):
+        if '\r' not in line:
+            result.append(line)
+        else:
+            last_non_empty = ''
+            for part in reversed(line.split('\r')):
+                if part.strip():
+                    last_non_empty = part
+                    break
+            if last_non_empty:
+                result.append(last_non_empty)
+    return '\n'.join(result)
+
+
+def _random_texts(count, seed=1):
+    rng = random.Random(seed)
+    alphabet = ['a', 'b', ' ', '\r', '\n', '\r\n', 'x', '\t', '进', '\x1b[32m']
+    for _ in range(count):
+        yield ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+
+
+def _feed_chunks(text, sizes, max_partial=None):
+    collapser = ProgressBarCollapser(max_partial)
+    out, pos, i = [], 0, 0
+    while pos < len(text):
+        size = sizes[i % len(sizes)]
+        out.append(collapser.feed(text[pos:pos + size]))
+        pos += size
+        i += 1
+    out.append(collapser.flush())
+    return ''.join(out)
+
+
+def _ends_with_blank_cr_line(text):
+    last = text.split('\n')[-1]
+    return '\r' in last and not last.strip()
+
+
+def test_output_independent_of_chunking():
+    rng = random.Random(7)
+    for text in _random_texts(3000):
+        expected = collapse_progress(text)
+        for _ in range(3):
+            sizes = [rng.randint(1, 6) for _ in range(5)]
+            assert _feed_chunks(text, sizes) == expected, (text, sizes)
+        assert _feed_chunks(text, [1]) == expected
+
+
+def test_cr_frame_split_across_reads():
+    collapser = ProgressBarCollapser()
+    assert collapser.feed("epoch 1\n 10%|█") == "epoch 1\n"
+    assert collapser.current_frame() == ''
+    assert collapser.feed("█   |\r 50%|███") == ""
+    assert collapser.in_progress_line
+    # 当前帧跟随最新输出（即使还不完整）
+    assert collapser.current_frame() == " 50%|███"
+    assert collapser.feed("██ |\r  ") == ""
+    # 空白帧不覆盖已显示的帧
+    assert collapser.current_frame() == " 50%|█████ |"
+    assert collapser.feed("\r100%|██████|\ndone\n") == "100%|██████|\ndone\n"
+    assert collapser.flush() == ""
+
+
+def test_matches_baseline():
+    for text in _random_texts(5000, seed=3):
+        if _ends_with_blank_cr_line(text):
+            continue
+        assert collapse_progress(text) == baseline_clean(text), text
+
+
+@pytest.mark.parametrize("text, expected, baseline", [
+    ("a\n \r", "a\n", "a"),
+    ("a\nb\r\r  \r", "a\nb", "a\nb"),
+    ("\r\r", "", ""),
+])
+def test_trailing_blank_progress_line(text, expected, baseline):
+    """
+    最后一行只有空白的 \\r 帧时整行丢弃，但保留前一行已输出的换行
+
+    旧实现按 split/join 处理，会连同前一行的换行一起去掉（行已完成却被改写）。
+    """
+    assert baseline_clean(text) == baseline
+    assert collapse_progress(text) == expected
+
+
+def test_partial_line_is_truncated():
+    limit = 100
+    collapser = ProgressBarCollapser(limit)
+    for i in range(50):
+        assert collapser.feed(f"{i:03d}" + "x" * 17) == ""
+        assert len(collapser.partial_line()) <= limit
+    partial = collapser.partial_line()
+    assert len(partial) == limit
+    assert partial.endswith("049" + "x" * 17)
+    line = collapser.feed("\n")
+    assert line == partial + "\n"
+
+    # 进度条帧同样受限
+    collapser = ProgressBarCollapser(limit)
+    collapser.feed("\r" + "y" * 500)
+    assert len(collapser.current_frame()) == limit
+    collapser.feed("\r")
+    assert len(collapser.current_frame()) == limit
+
+
+def test_log_buffer_partial_limit():
+    collapser = ProgressBarCollapser(MAX_PARTIAL_CHARS)
+    for _ in range(20):
+        collapser.feed("z" * 10000)
+    assert len(collapser.partial_line()) == MAX_PARTIAL_CHARS
+    assert len(collapser.feed("\n")) == MAX_PARTIAL_CHARS + 1
+
+
+def test_truncation_does_not_affect_short_lines():
+    for text in _random_texts(1000, seed=5):
+        assert _feed_chunks(text, [3], max_partial=1000) == collapse_progress(text)
+
+
+@pytest.mark.parametrize("max_lines", [1, 2, 3, 10, 0])
+def test_collapse_tail_matches_full_collapse(max_lines):
+    for text in _random_texts(1000, seed=9):
+        expected_lines = collapse_progress(text).split('\n')
+        chunks = [text[i:i + 4] for i in range(0, len(text), 4)]
+        tail, total = collapse_tail(chunks, max_lines)
+        assert total == len(expected_lines)
+        kept = expected_lines if max_lines <= 0 else expected_lines[-max_lines:]
+        assert tail == '\n'.join(kept)
+
+
+def test_collapse_tail_keeps_collapser_open():
+    collapser = ProgressBarCollapser()
+    tail, total = collapse_tail(["line 1\nline 2\n 30%\r 60%"], 10, collapser)
+    assert (tail, total) == ("line 1\nline 2\n", 3)
+    assert collapser.current_frame() == " 60%"
+    assert collapser.feed("\r100%\n") == "100%\n"